@@ -0,0 +1,124 @@
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError: # not available on Windows; reflinks then fall back to copies
+    fcntl = None
+
+from instrument import get_instrumentation, log
+from manifest import hash_file, remove_empty_dirs
+
+COPY_CHUNK = 1 << 20 # upper bound per copy_file_range call, keeps memory flat for huge files
+LINK_MODES = ("copy", "hardlink", "reflink", "symlink", "auto")
+FICLONE = 0x40049409 # from linux/fs.h: share the source's extents copy-on-write (btrfs, XFS, ...)
+
+def copy_file(src_path, dest_path):
+    # Copy one file without reading it into memory, preferring in-kernel copy paths.
+    # copy_file_range (Linux) avoids user space entirely; elsewhere fall back to fixed-size
+    # chunked reads. The source mtime is preserved so later syncs can compare it.
+    with open(src_path, 'rb') as fsrc, open(dest_path, 'wb') as fdst:
+        copied = False
+        if hasattr(os, "copy_file_range"):
+            try:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), COPY_CHUNK):
+                    pass
+                copied = True
+            except OSError: # e.g. unsupported filesystem or cross-device on older kernels
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+        if not copied:
+            shutil.copyfileobj(fsrc, fdst, COPY_CHUNK)
+    stat = os.stat(src_path)
+    os.utime(dest_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+def reflink_file(src_path, dest_path):
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src_path, 'rb') as fsrc, open(dest_path, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    stat = os.stat(src_path)
+    os.utime(dest_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+def place_file(src_path, dest_path, mode="copy"):
+    # Make dest_path a copy of src_path using mode, falling back to a real copy where the
+    # filesystem cannot link (another device, no reflink support, no permission).
+    # "auto" tries a reflink, then a hardlink. Returns the method that was used.
+    # Links share the source's data, so no bytes are written; reflinks stay independent
+    # copies if either side is edited later, hardlinks and symlinks do not.
+    if os.path.lexists(dest_path):
+        os.remove(dest_path) # never write through an old link into its source
+    methods = {"auto": ("reflink", "hardlink"), "copy": ()}.get(mode, (mode,))
+    for method in methods:
+        try:
+            if method == "hardlink":
+                os.link(src_path, dest_path)
+            elif method == "symlink":
+                os.symlink(os.path.relpath(src_path, os.path.dirname(dest_path)), dest_path)
+            else:
+                reflink_file(src_path, dest_path)
+            return method
+        except OSError:
+            if os.path.lexists(dest_path):
+                os.remove(dest_path)
+    copy_file(src_path, dest_path)
+    return "copy"
+
+def is_unchanged(src_stat, dest_path, src_path, checksum=False):
+    # Compare size and mtime, optionally confirming with a content hash
+    try:
+        dest_stat = os.stat(dest_path)
+    except FileNotFoundError:
+        return False
+    if dest_stat.st_size != src_stat.st_size:
+        return False
+    if checksum:
+        return hash_file(src_path) == hash_file(dest_path)
+    return dest_stat.st_mtime_ns == src_stat.st_mtime_ns
+
+def sync_tree(src_dir, dest_dir, previous=None, checksum=False, link_mode="copy"):
+    # Mirror src_dir into dest_dir copying (or with link_mode, linking, see place_file) only new or changed files.
+    # previous maps dest paths synced by an earlier run to their sources; any of them no longer
+    # present in src_dir is removed. Files in dest_dir that never came from src_dir (generated
+    # pages) are left alone. Returns (synced dest -> src mapping, stats).
+    stats = {"copied": 0, "unchanged": 0, "removed": 0}
+    synced = {}
+
+    def walk(src_path, dest_path):
+        if not os.path.isdir(dest_path):
+            if os.path.exists(dest_path):
+                os.remove(dest_path) # a file where the source now has a directory
+            log(f"Creating directory: {dest_path}")
+            os.mkdir(dest_path)
+        with os.scandir(src_path) as entries:
+            for entry in entries:
+                dest_item = os.path.join(dest_path, entry.name)
+                if entry.is_dir():
+                    walk(entry.path, dest_item)
+                    continue
+                synced[dest_item] = entry.path
+                # switching to or from symlink mode replaces the file even if it looks unchanged
+                if os.path.islink(dest_item) == (link_mode == "symlink") and is_unchanged(entry.stat(), dest_item, entry.path, checksum):
+                    stats["unchanged"] += 1
+                    continue
+                if os.path.isdir(dest_item) and not os.path.islink(dest_item):
+                    shutil.rmtree(dest_item)
+                method = place_file(entry.path, dest_item, link_mode)
+                stats["copied"] += 1
+                if method == "copy":
+                    get_instrumentation().count("static bytes copied", entry.stat().st_size)
+                    log(f"Copied file: {entry.path} -> {dest_item}")
+                else:
+                    get_instrumentation().count(f"static files {method}ed")
+                    log(f"Linked file ({method}): {entry.path} -> {dest_item}")
+
+    walk(src_dir, dest_dir)
+
+    for dest_item in sorted(set(previous or ()) - set(synced)):
+        if os.path.isfile(dest_item) or os.path.islink(dest_item): # a symlink whose source is gone is not a file
+            os.remove(dest_item)
+            remove_empty_dirs(os.path.dirname(dest_item), dest_dir)
+            stats["removed"] += 1
+            log(f"Deleting file: {dest_item}")
+    return synced, stats
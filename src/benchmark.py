@@ -0,0 +1,464 @@
+# Build benchmarks on a synthetic content tree.
+# Usage: python3 src/benchmark.py jobs --pages 2000 --max-jobs 8
+#        python3 src/benchmark.py inline --sentences 200 --plain 0.8
+#        python3 src/benchmark.py memory --pages 500 --against HEAD~1
+#        python3 src/benchmark.py serialize --pages 500 --against HEAD~1
+#        python3 src/benchmark.py build --pages 2000 --depth 3 --mix paragraph=20,code=4 --output bench.json
+import argparse
+import contextlib
+import gc
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import tracemalloc
+
+from assets import sync_tree
+from block_markdown import BlockType, block_lines_to_block_type, block_to_html_node, iter_blocks, markdown_lines, markdown_to_html_node
+from htmlnode import HTMLNode
+from main import find_markdown_files, generate_pages
+from template import compile_template
+from textnode import TextNode, TextType, scan_inline, split_nodes_delimiter, split_nodes_image, split_nodes_link, text_to_textnodes
+
+TEMPLATE = """<!doctype html>
+<html>
+  <head>
+    <title>{{ Title }}</title>
+    <link href="/index.css" rel="stylesheet" />
+  </head>
+  <body>
+    <article>{{ Content }}</article>
+  </body>
+</html>"""
+
+WORDS = ("hobbit", "ring", "shire", "elf", "mountain", "river", "song", "road", "fellowship", "tower", "forest", "king")
+
+def sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+# Blocks per page for each kind of content; link/image are per paragraph
+DEFAULT_MIX = {"paragraph": 5, "list": 2, "code": 1, "quote": 1, "link": 1, "image": 0}
+
+def parse_mix(text):
+    # "paragraph=20,list=5,code=2" -> DEFAULT_MIX with those counts replaced
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, text.split(",")):
+        name, _, count = item.partition("=")
+        if name not in mix:
+            raise ValueError(f"Unknown mix entry '{name}', expected one of {', '.join(mix)}")
+        mix[name] = int(count)
+    return mix
+
+def synthetic_paragraph(rng, index, sentences=4, links=1, images=0):
+    parts = [sentence(rng) for _ in range(sentences)]
+    parts.append(f"See **bold {index}** and _italic_ with `code`.")
+    parts.extend(f"[link](/page{rng.randint(0, index + 1)})" for _ in range(links))
+    parts.extend(f"![image](/images/{rng.randint(0, 99)}.png)" for _ in range(images))
+    return " ".join(parts)
+
+def synthetic_page(rng, index, mix=None):
+    # One page with the block counts given by mix (every block type the parser supports by default)
+    mix = mix or DEFAULT_MIX
+    blocks = [f"# Page {index}"]
+    for _ in range(mix["paragraph"]):
+        blocks.append(synthetic_paragraph(rng, index, rng.randint(3, 8), mix["link"], mix["image"]))
+    for list_index in range(mix["list"]):
+        if list_index % 2:
+            blocks.append("\n".join(f"{n}. {sentence(rng, 4)}" for n in range(1, 11)))
+        else:
+            blocks.append("\n".join(f"- {sentence(rng, 5)} [link](/page{rng.randint(0, index + 1)})" for _ in range(10)))
+    for _ in range(mix["code"]):
+        blocks.append("```\n" + "\n".join(f"def f{n}(x): return x * {n}" for n in range(20)) + "\n```")
+    for _ in range(mix["quote"]):
+        blocks.append(f"> {sentence(rng)}\n> ![image](/images/{index}.png)")
+    return "\n\n".join(blocks) + "\n"
+
+def corpus_paths(content_dir, pages, depth=2, fanout=100):
+    # Markdown path for every page, nested `depth` directories deep with `fanout` entries per level
+    for index in range(pages):
+        parts = []
+        remaining = index // fanout
+        for level in range(depth - 1):
+            parts.append(f"section{remaining % fanout}")
+            remaining //= fanout
+        parts.reverse()
+        yield index, os.path.join(content_dir, *parts, f"page{index}", "index.md")
+
+def generate_corpus(content_dir, pages=1000, depth=2, fanout=100, mix=None, seed=0):
+    # Write a deterministic content tree of `pages` Markdown files
+    rng = random.Random(seed)
+    for index, path in corpus_paths(content_dir, pages, depth, fanout):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            file.write(synthetic_page(rng, index, mix))
+
+def generate_assets(static_dir, files=50, size=64 * 1024, seed=0):
+    # Write `files` random binary assets of `size` bytes
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(static_dir, "images"), exist_ok=True)
+    for index in range(files):
+        with open(os.path.join(static_dir, "images", f"{index}.png"), 'wb') as file:
+            file.write(rng.randbytes(size))
+
+def worker_counts(max_jobs):
+    # 1, 2, 4, ... up to and including max_jobs
+    counts = []
+    jobs = 1
+    while jobs < max_jobs:
+        counts.append(jobs)
+        jobs *= 2
+    counts.append(max_jobs)
+    return counts
+
+def bench_jobs(pages=1000, max_jobs=None, repeat=3):
+    # Time page generation for 1..max_jobs workers; returns {jobs: best seconds}
+    max_jobs = max_jobs or os.cpu_count() or 1
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        content_dir = os.path.join(root, "content")
+        template_path = os.path.join(root, "template.html")
+        generate_corpus(content_dir, pages)
+        with open(template_path, 'w') as file:
+            file.write(TEMPLATE)
+
+        for jobs in worker_counts(max_jobs):
+            timings = []
+            for _ in range(repeat):
+                dest_dir = os.path.join(root, "docs")
+                shutil.rmtree(dest_dir, ignore_errors=True)
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull): # per-file logging would dominate the timing
+                    pages_found = find_markdown_files(content_dir, dest_dir)
+                    start = time.perf_counter()
+                    failures = generate_pages("/", pages_found, template_path, jobs)
+                    timings.append(time.perf_counter() - start)
+                if failures:
+                    raise RuntimeError(f"benchmark corpus failed to build: {failures[:3]}")
+            results[jobs] = min(timings)
+    return results
+
+def split_pipeline(text):
+    # The five-pass inline pipeline text_to_textnodes used before the single-pass scanner
+    nodes = [TextNode(text.replace("\n", " "), TextType.TEXT)]
+    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
+    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
+    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
+    return split_nodes_link(split_nodes_image(nodes))
+
+def long_paragraph(rng, sentences):
+    parts = []
+    for index in range(sentences):
+        parts.append(sentence(rng))
+        markup = index % 5
+        if markup == 0:
+            parts.append(f"**{rng.choice(WORDS)}**")
+        elif markup == 1:
+            parts.append(f"_{rng.choice(WORDS)}_")
+        elif markup == 2:
+            parts.append(f"`{rng.choice(WORDS)}()`")
+        elif markup == 3:
+            parts.append(f"[{rng.choice(WORDS)}](/{rng.choice(WORDS)})")
+        else:
+            parts.append(f"![{rng.choice(WORDS)}](/images/{index}.png)")
+    return " ".join(parts)
+
+def plain_paragraph(rng, sentences):
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+def bench_inline(sentences=200, paragraphs=50, repeat=5, plain=0.0):
+    # Time the old split pipeline, the bare single-pass scanner and text_to_textnodes (scanner
+    # plus the plain-text prescan); plain is the share of paragraphs without any markup.
+    # Returns {name: best seconds}
+    rng = random.Random(0)
+    plain_count = round(paragraphs * plain)
+    corpus = [plain_paragraph(rng, sentences) for _ in range(plain_count)]
+    corpus.extend(long_paragraph(rng, sentences) for _ in range(paragraphs - plain_count))
+    results = {}
+    scanner = lambda text: scan_inline(text.replace("\n", " "))
+    for name, function in (("split pipeline", split_pipeline), ("single pass", scanner), ("with prescan", text_to_textnodes)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for paragraph in corpus:
+                function(paragraph)
+            timings.append(time.perf_counter() - start)
+        results[name] = min(timings)
+    return results
+
+def count_nodes(root):
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+def bench_memory(pages=500, src_dir=None):
+    # Keep the node trees of `pages` synthetic pages alive and report traced bytes per node
+    # (HTMLNode trees and TextNode streams) plus the process's peak RSS. With src_dir the
+    # parser and node classes are those of another checkout's src/ (see export_revision).
+    markdown_to_html_node_, text_to_textnodes_ = markdown_to_html_node, text_to_textnodes
+    if src_dir is not None:
+        block_markdown, textnode = import_tree(src_dir, ("block_markdown", "textnode"))
+        markdown_to_html_node_, text_to_textnodes_ = block_markdown.markdown_to_html_node, textnode.text_to_textnodes
+    rng = random.Random(0)
+    corpus = [synthetic_page(rng, index) for index in range(pages)]
+    paragraphs = [long_paragraph(rng, 50) for _ in range(pages)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    trees = [markdown_to_html_node_(markdown) for markdown in corpus]
+    tree_bytes = tracemalloc.get_traced_memory()[0] - before
+    before = tracemalloc.get_traced_memory()[0]
+    streams = [text_to_textnodes_(paragraph) for paragraph in paragraphs]
+    stream_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    html_nodes = sum(count_nodes(tree) for tree in trees)
+    text_nodes = sum(len(stream) for stream in streams)
+    return {
+        "html_nodes": html_nodes,
+        "bytes_per_html_node": tree_bytes / html_nodes,
+        "text_nodes": text_nodes,
+        "bytes_per_text_node": stream_bytes / text_nodes,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+def import_tree(src_dir, names):
+    # Import names from src_dir in place of the working tree's modules, along with every module
+    # of this directory they import
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if name != "__main__" and path and os.path.dirname(os.path.abspath(path)) == here:
+            del sys.modules[name]
+    sys.path.insert(0, src_dir)
+    return [importlib.import_module(name) for name in names]
+
+def export_revision(revision, root):
+    # Write src/ as it was at a git revision under root; returns its path
+    archive = subprocess.run(["git", "archive", "--format=tar", revision, "src"], capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(root)
+    return os.path.join(root, "src")
+
+def compare_memory(pages=500, revision="HEAD"):
+    # bench_memory for the working tree and for the tree at a git revision, each in a fresh
+    # process so both peak RSS figures start from zero; returns {name: results}
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        src_dir = export_revision(revision, root)
+        for name, extra in ((revision, ["--src", src_dir]), ("working tree", [])):
+            command = [sys.executable, os.path.abspath(__file__), "memory", "--pages", str(pages), "--json", *extra]
+            results[name] = json.loads(subprocess.run(command, capture_output=True, text=True, check=True).stdout)
+    return results
+
+def load_revision(module, revision):
+    # Import src/<module>.py as it was at a git revision, under another name
+    source = subprocess.run(["git", "show", f"{revision}:src/{module}.py"], capture_output=True, text=True, check=True).stdout
+    namespace = {"__name__": f"{module}_{revision}"}
+    exec(compile(source, f"{revision}:src/{module}.py", "exec"), namespace)
+    return namespace
+
+def rebuild_tree(node, classes):
+    # Copy of a tree made of the node classes in classes (class name -> class)
+    copy = object.__new__(classes[type(node).__name__])
+    copy.tag, copy.value, copy.props = node.tag, node.value, node.props
+    copy.children = [rebuild_tree(child, classes) for child in node.children]
+    return copy
+
+def bench_serialize(pages=500, revision="HEAD", repeat=10):
+    # Serialize the trees of `pages` synthetic pages with the working tree's HTMLNode and with the
+    # one at a git revision, runs interleaved; returns ({name: best seconds}, same output)
+    rng = random.Random(0)
+    trees = [markdown_to_html_node(synthetic_page(rng, index)) for index in range(pages)]
+    other = load_revision("htmlnode", revision)
+    other_trees = [rebuild_tree(tree, other) for tree in trees]
+    variants = ((revision, other_trees), ("working tree", trees))
+    results = {}
+    gc_was_enabled = gc.isenabled()
+    gc.disable() # collections triggered by one variant's garbage would land on the other's timing
+    try:
+        for _ in range(repeat):
+            for name, variant_trees in variants:
+                seconds, _ = best_time(lambda: [tree.to_html() for tree in variant_trees], 1)
+                results[name] = min(seconds, results.get(name, seconds))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    same = [tree.to_html() for tree in trees] == [tree.to_html() for tree in other_trees]
+    return results, same
+
+def inline_texts(lines, block_type):
+    # The inline text block_to_html_node hands to text_to_textnodes for one block
+    if block_type == BlockType.HEADING:
+        return ["\n".join(lines)[len(lines[0].split(" ")[0]) + 1:]]
+    if block_type == BlockType.PARAGRAPH:
+        return ["\n".join(lines)]
+    if block_type == BlockType.QUOTE:
+        return ["\n".join(line[2:] for line in lines)]
+    if block_type == BlockType.UNORDERED_LIST:
+        return [line[2:] for line in lines]
+    if block_type == BlockType.ORDERED_LIST:
+        return [line[line.index(". ") + 2:] for line in lines]
+    return [] # code blocks are not tokenized
+
+def best_time(function, repeat):
+    # Run function `repeat` times; return (best seconds, result of the last run)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def bench_build(pages=1000, depth=2, fanout=100, mix=None, assets=50, asset_size=64 * 1024, repeat=3):
+    # Time each build stage on its own over a synthetic site; returns a JSON-ready report.
+    # Building the tree tokenizes inline text again, so "tree build" reports the remainder
+    # after subtracting the separately timed "inline tokenize" stage.
+    mix = mix or DEFAULT_MIX
+    stages = {}
+    with tempfile.TemporaryDirectory() as root:
+        content_dir = os.path.join(root, "content")
+        static_dir = os.path.join(root, "static")
+        dest_dir = os.path.join(root, "docs")
+        generate_corpus(content_dir, pages, depth, fanout, mix)
+        generate_assets(static_dir, assets, asset_size)
+        paths = [path for _, path in corpus_paths(content_dir, pages, depth, fanout)]
+        dest_paths = [os.path.join(dest_dir, os.path.relpath(path, content_dir)[:-3] + ".html") for path in paths]
+        template = compile_template(TEMPLATE)
+
+        def copy_assets():
+            shutil.rmtree(dest_dir, ignore_errors=True)
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                sync_tree(static_dir, dest_dir)
+
+        def read():
+            texts = []
+            for path in paths:
+                with open(path, 'r') as file:
+                    texts.append(file.read())
+            return texts
+
+        stages["asset copy"], _ = best_time(copy_assets, repeat)
+        stages["read"], texts = best_time(read, repeat)
+        stages["block split"], documents = best_time(
+            lambda: [[(lines, block_lines_to_block_type(lines)) for lines in iter_blocks(markdown_lines(text))] for text in texts], repeat)
+        stages["inline tokenize"], _ = best_time(
+            lambda: [text_to_textnodes(inline) for blocks in documents for lines, block_type in blocks for inline in inline_texts(lines, block_type)], repeat)
+        build_time, trees = best_time(
+            lambda: [HTMLNode("div", None, [block_to_html_node(lines, block_type) for lines, block_type in blocks]) for blocks in documents], repeat)
+        stages["tree build"] = max(0.0, build_time - stages["inline tokenize"])
+        stages["serialize"], bodies = best_time(lambda: [tree.to_html() for tree in trees], repeat)
+        stages["template"], outputs = best_time(lambda: [template.render({"Title": "Page", "Content": body}) for body in bodies], repeat)
+
+        for path in dest_paths:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        def write():
+            for path, html in zip(dest_paths, outputs):
+                with open(path, 'w') as file:
+                    file.write(html)
+        stages["write"], _ = best_time(write, repeat)
+
+    total = sum(stages.values())
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "params": {"pages": pages, "depth": depth, "fanout": fanout, "mix": mix, "assets": assets, "asset_size": asset_size, "repeat": repeat},
+        "markdown_bytes": sum(len(text) for text in texts),
+        "html_bytes": sum(len(html) for html in outputs),
+        "stages": stages,
+        "total": total,
+        "pages_per_second": pages / total,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the static site build.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    jobs_parser = subparsers.add_parser("jobs", help="scaling of parallel page generation")
+    jobs_parser.add_argument("--pages", type=int, default=1000)
+    jobs_parser.add_argument("--max-jobs", type=int, default=None)
+    jobs_parser.add_argument("--repeat", type=int, default=3)
+    inline_parser = subparsers.add_parser("inline", help="single-pass inline scanner vs the split pipeline")
+    inline_parser.add_argument("--sentences", type=int, default=200, help="sentences per paragraph")
+    inline_parser.add_argument("--paragraphs", type=int, default=50)
+    inline_parser.add_argument("--repeat", type=int, default=5)
+    inline_parser.add_argument("--plain", type=float, default=0.0, help="share of paragraphs without markup (0-1)")
+    memory_parser = subparsers.add_parser("memory", help="bytes per node and peak RSS for node trees")
+    memory_parser.add_argument("--pages", type=int, default=500)
+    memory_parser.add_argument("--against", default=None, help="git revision to compare with")
+    memory_parser.add_argument("--src", default=None, help="measure the parser and node classes of another src/ directory")
+    memory_parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    serialize_parser = subparsers.add_parser("serialize", help="HTMLNode serialization against the serializer at another git revision")
+    serialize_parser.add_argument("--pages", type=int, default=500)
+    serialize_parser.add_argument("--against", default="HEAD", help="git revision to compare with")
+    serialize_parser.add_argument("--repeat", type=int, default=10)
+    build_parser = subparsers.add_parser("build", help="per-stage timings of a full build, optionally saved as JSON")
+    build_parser.add_argument("--pages", type=int, default=1000)
+    build_parser.add_argument("--depth", type=int, default=2, help="directory levels above each page")
+    build_parser.add_argument("--fanout", type=int, default=100, help="entries per directory level")
+    build_parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help=f"blocks per page, e.g. paragraph=20,list=5 (keys: {', '.join(DEFAULT_MIX)})")
+    build_parser.add_argument("--assets", type=int, default=50, help="number of static files")
+    build_parser.add_argument("--asset-size", type=int, default=64 * 1024, help="bytes per static file")
+    build_parser.add_argument("--repeat", type=int, default=3)
+    build_parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    if args.command == "jobs":
+        results = bench_jobs(args.pages, args.max_jobs, args.repeat)
+        baseline = results[1]
+        print(f"{'jobs':>5} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+        for jobs, seconds in sorted(results.items()):
+            print(f"{jobs:>5} {seconds:>9.3f} {args.pages / seconds:>9.0f} {baseline / seconds:>7.2f}x")
+    elif args.command == "inline":
+        results = bench_inline(args.sentences, args.paragraphs, args.repeat, args.plain)
+        baseline = results["split pipeline"]
+        for name, seconds in results.items():
+            print(f"{name:>15} {seconds * 1000:>9.2f} ms {baseline / seconds:>6.2f}x")
+    elif args.command == "serialize":
+        results, same = bench_serialize(args.pages, args.against, args.repeat)
+        baseline = results[args.against]
+        for name, seconds in results.items():
+            print(f"{name:>15} {seconds * 1000:>9.2f} ms {seconds / baseline - 1:>+7.1%}")
+        print(f"{'output':>15} {'identical' if same else 'differs'}")
+    elif args.command == "build":
+        report = bench_build(args.pages, args.depth, args.fanout, args.mix, args.assets, args.asset_size, args.repeat)
+        for name, seconds in report["stages"].items():
+            print(f"{name:>16} {seconds * 1000:>10.2f} ms {seconds / report['total']:>6.1%}")
+        print(f"{'total':>16} {report['total'] * 1000:>10.2f} ms {report['pages_per_second']:>8.0f} pages/s")
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(report, file, indent=2)
+    elif args.command == "memory" and args.against:
+        results = compare_memory(args.pages, args.against)
+        before, after = results[args.against], results["working tree"]
+        print(f"{'':>20} {args.against:>12} {'working tree':>12}")
+        for name, value in after.items():
+            print(f"{name:>20} {before[name]:>12.1f} {value:>12.1f} {value / before[name] - 1:>+7.1%}")
+    elif args.command == "memory":
+        results = bench_memory(args.pages, args.src)
+        if args.json:
+            print(json.dumps(results))
+        else:
+            for name, value in results.items():
+                print(f"{name:>20} {value:>12.1f}")
+
+if __name__ == "__main__":
+    main()
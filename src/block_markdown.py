@@ -1,5 +1,6 @@
 from enum import Enum
-from htmlnode import HTMLNode
+from htmlnode import EMPTY_CHILDREN, HTMLNode
+from instrument import get_instrumentation, timed
 from textnode import TextNode, TextType, text_node_to_html_node, text_to_textnodes
 
 class BlockType(Enum):
@@ -10,102 +11,206 @@ class BlockType(Enum):
     UNORDERED_LIST = "unordered list"
     ORDERED_LIST = "ordered list"
 
+def markdown_lines(markdown):
+    # Accept a whole document or anything yielding lines (e.g. an open file)
+    if isinstance(markdown, str):
+        return markdown.split("\n")
+    return (line[:-1] if line.endswith("\n") else line for line in markdown)
+
+def iter_blocks(lines):
+    # Group lines into blocks (lists of lines) with a small state machine, one line at a time,
+    # so memory grows with the largest block rather than the document.
+    # Blank lines end a block, except inside a fenced code block that opened the block.
+    block = []
+    in_fence = False
+    for line in lines:
+        if in_fence:
+            block.append(line)
+            if is_closing_fence(line): # closing fence ends the code block
+                yield strip_block(block)
+                block = []
+                in_fence = False
+        elif not line.strip():
+            if block:
+                yield strip_block(block)
+                block = []
+        else:
+            if not block and line.lstrip().startswith("```") and not is_single_line_fence(line):
+                in_fence = True
+            block.append(line)
+    if in_fence:
+        # Unterminated fence: not code after all, fall back to splitting on blank lines
+        yield from iter_blocks_without_fences(block)
+    elif block:
+        yield strip_block(block)
+
+def is_closing_fence(line):
+    # A line of three or more backticks only; code such as s = "```" does not close the block
+    stripped = line.strip()
+    return stripped.startswith("```") and not stripped.strip("`")
+
+def is_single_line_fence(line):
+    stripped = line.strip()
+    return len(stripped) > 3 and stripped.endswith("```")
+
+def iter_blocks_without_fences(lines):
+    block = []
+    for line in lines:
+        if line.strip():
+            block.append(line)
+        elif block:
+            yield strip_block(block)
+            block = []
+    if block:
+        yield strip_block(block)
+
+def strip_block(lines):
+    # Strip leading whitespace of the block's first line and trailing whitespace of its last
+    lines[0] = lines[0].lstrip()
+    lines[-1] = lines[-1].rstrip()
+    return lines
+
 def markdown_to_blocks(markdown):
     if not isinstance(markdown, str):
         raise TypeError("Input must be a string")
-    if not markdown.strip():
-        return []
-    # separate blocks by blank lines
-    blocks = markdown.split("\n\n")
-    # strip any leading or trailing whitespace from each block
-    stripped_blocks = []
-    for block in blocks:
-        stripped_block = block.strip()
-        if stripped_block: # only add non-empty blocks
-            stripped_blocks.append(stripped_block)
-    return stripped_blocks
+    return ["\n".join(lines) for lines in iter_blocks(markdown_lines(markdown))]
 
 def block_to_block_type(markdown):
-    lines = markdown.split("\n")
-    if markdown.startswith("#"):
-        heading_level = len(markdown.split(" ")[0])
+    return block_lines_to_block_type(markdown.split("\n"))
+
+def block_lines_to_block_type(lines):
+    # Classify a block already split into lines, without re-splitting it per check
+    first = lines[0]
+    if first.startswith("#"):
+        heading_level = len(first.split(" ")[0])
         if 1 <= heading_level <=6:
             return BlockType.HEADING
         else:
             return BlockType.PARAGRAPH
 
-    elif markdown.startswith("```") and markdown.endswith("```"):
+    elif first.startswith("```") and lines[-1].endswith("```"):
         return BlockType.CODE
-    elif all(line.startswith("> ") for line in markdown.split("\n")):
+    elif all(line.startswith("> ") for line in lines):
         return BlockType.QUOTE
-    elif all(line.startswith("- ") for line in markdown.split("\n")):
+    elif all(line.startswith("- ") for line in lines):
         return BlockType.UNORDERED_LIST
     elif all(line.startswith(f"{i}. ") for i, line in enumerate(lines, start=1)):
         return BlockType.ORDERED_LIST
     else:
         return BlockType.PARAGRAPH
 
-def text_to_children(text):
+def text_to_children(text, context=None):
     # Convert function into list of HTMLNode objects.
     text_nodes = text_to_textnodes(text) # Convert text to TextNodes
-    return [text_node_to_html_node(node) for node in text_nodes] # Convert TextNodes to HTMLNodes
+    if context is not None:
+        context.record_text(text_nodes) # search terms, when the build collects them
+    return [text_node_to_html_node(node, context) for node in text_nodes] # Convert TextNodes to HTMLNodes
+
+def block_to_html_node(lines, block_type, context=None):
+    # Build the HTMLNode for one block from its lines
+    if block_type == BlockType.HEADING:
+        # Determine heading level
+        heading_level = len(lines[0].split(" ")[0])
+        heading_text = "\n".join(lines)[heading_level + 1:]
+        return HTMLNode(f"h{heading_level}", "", text_to_children(heading_text, context))
+
+    elif block_type == BlockType.PARAGRAPH:
+        return HTMLNode("p","", text_to_children("\n".join(lines), context))
+
+    elif block_type == BlockType.CODE:
+        code_content = "\n".join(lines[1:-1]) # raw text, escaped once when serialized
+        return HTMLNode("pre", "", [HTMLNode("code", code_content, EMPTY_CHILDREN)]) # HTML codes use <pre></pre> for preformatted text
+
+    elif block_type == BlockType.QUOTE:
+        quote_content = "\n".join(line[2:] for line in lines)
+        return HTMLNode("blockquote", "", text_to_children(quote_content, context))
+
+    elif block_type == BlockType.UNORDERED_LIST: #HTML unordered list uses <ul><li>first item</li></ul> for unordered items (ul) and list (li)
+        list_items = []
+        for line in lines:
+            list_items.append(HTMLNode("li", "", text_to_children(line[2:], context)))
+        return HTMLNode("ul", "", list_items)
+    
+    elif block_type == BlockType.ORDERED_LIST: #HTML ordered list uses <ol><li>first item</li></ol> for ordered items (ol) and list (li)
+        list_items = []
+        for line in lines:
+            list_items.append(HTMLNode("li", "", text_to_children(line[line.index(". ") + 2:], context)))
+        return HTMLNode("ol", "", list_items)
+    
+    else:
+        raise ValueError(f"Unsupported block type: {block_type}")
 
-def markdown_to_html_node(markdown):
+def iter_block_nodes(markdown, context=None):
+    # Yield one finished HTMLNode per block while reading markdown (a string or lines) incrementally
+    for lines in iter_blocks(markdown_lines(markdown)):
+        yield block_to_html_node(lines, block_lines_to_block_type(lines), context)
+
+@timed("markdown_to_html_node")
+def markdown_to_html_node(markdown, context=None):
     # Convert a full markdown document into single parent HTMLNode. The parent HTMLNode should contain main child HTMLNodes
-    blocks = markdown_to_blocks(markdown) # Split markdown into blocks using existing func.
+    # context (a RenderContext) rewrites link and image URLs for the site's basepath as nodes are created
     parent_node = HTMLNode("div") # Root node to contain all child nodes
-
-    for block in blocks:
-        block_type = block_to_block_type(block) # Determine type of block by looping with existing func
-
-        if block_type == BlockType.HEADING:
-            # Determine heading level
-            heading_level = len(block.split(" ")[0])
-            heading_text = block[heading_level + 1:]
-            child_node = HTMLNode(f"h{heading_level}", "", text_to_children(heading_text))
-
-        elif block_type == BlockType.PARAGRAPH:
-            child_node = HTMLNode("p","", text_to_children(block))
-
-        elif block_type == BlockType.CODE:
-            code_content = "\n".join(block.split("\n")[1:-1])
-            # text_node = TextNode(code_content, TextType.TEXT)
-            child_node = HTMLNode("pre", "", [HTMLNode("code", code_content)]) # HTML codes use <pre></pre> for preformatted text
-
-        elif block_type == BlockType.QUOTE:
-            quote_content = "\n".join(line[2:] for line in block.split("\n"))
-            child_node = HTMLNode("blockquote", "", text_to_children(quote_content))
-
-        elif block_type == BlockType.UNORDERED_LIST: #HTML unordered list uses <ul><li>first item</li></ul> for unordered items (ul) and list (li)
-            list_items = []
-            for line in block.split("\n"):
-                list_items.append(HTMLNode("li", "", text_to_children(line[2:])))
-            child_node = HTMLNode("ul", "", list_items)
-        
-        elif block_type == BlockType.ORDERED_LIST: #HTML ordered list uses <ol><li>first item</li></ol> for ordered items (ol) and list (li)
-            list_items = []
-            for line in block.split("\n"):
-                list_items.append(HTMLNode("li", "", text_to_children(line[line.index(". ") + 2:])))
-            child_node = HTMLNode("ol", "", list_items)
-        
-        else:
-            raise ValueError(f"Unsupported block type: {block_type}")
-        
-        # Add the child node to the parent node
+    for child_node in iter_block_nodes(markdown, context):
         parent_node.add_child(child_node)
     return parent_node
 
+class MarkdownStream():
+    # Stand-in for markdown_to_html_node(...) in a template slot: parses and writes one block
+    # at a time, so a page is rendered without holding its whole node tree in memory.
+    # find_title reads ahead to the first h1 in the same pass, for a title slot that comes first.
+    def __init__(self, markdown, context=None):
+        self.blocks = iter_blocks(markdown_lines(markdown))
+        self.context = context
+        self.pending = [] # (lines, block type) read ahead by find_title
+
+    def find_title(self):
+        for lines in self.blocks:
+            block_type = block_lines_to_block_type(lines)
+            self.pending.append((lines, block_type))
+            title = heading_title(lines, block_type)
+            if title is not None:
+                return title
+        raise ValueError("No heading")
+
+    def iter_block_nodes(self):
+        for lines, block_type in self.pending:
+            yield block_to_html_node(lines, block_type, self.context)
+        self.pending = []
+        for lines in self.blocks:
+            yield block_to_html_node(lines, block_lines_to_block_type(lines), self.context)
+
+    def write_html(self, fp, minify=False):
+        instrumentation = get_instrumentation()
+        block_nodes = self.iter_block_nodes()
+        opened = False
+        while True:
+            # parsing and serializing interleave per block, so each half is timed separately
+            with instrumentation.timer("markdown_to_html_node"):
+                child_node = next(block_nodes, None)
+            if child_node is None:
+                break
+            if not opened:
+                fp.write("<div>")
+                opened = True
+            with instrumentation.timer("to_html"):
+                child_node.write_html(fp, minify)
+        fp.write("</div>" if opened else "<div />") # same markup as an empty markdown_to_html_node
+
+def heading_title(lines, block_type):
+    # The text of an h1 block, else None
+    if block_type == BlockType.HEADING:
+        # Determine heading level
+        heading_level = len(lines[0].split(" ")[0])
+
+        if heading_level == 1:
+            return "\n".join(lines)[heading_level + 1:].strip()
+    return None
+
 def extract_title(markdown):
-    blocks = markdown_to_blocks(markdown) # Split markdown into blocks using existing func.
-    
-    for block in blocks:
-        block_type = block_to_block_type(block) # Determine type of block by looping with existing func
-
-        if block_type == BlockType.HEADING:
-            # Determine heading level
-            heading_level = len(block.split(" ")[0])
-            
-            if heading_level == 1:
-                return block[heading_level + 1:].strip()
-    
+    # markdown may be a string or an open file; reading stops at the first h1
+    for lines in iter_blocks(markdown_lines(markdown)):
+        title = heading_title(lines, block_lines_to_block_type(lines)) # Determine type of block by looping with existing func
+        if title is not None:
+            return title
+
     raise ValueError("No heading")
\ No newline at end of file
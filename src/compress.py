@@ -0,0 +1,93 @@
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import brotli
+except ImportError: # optional; without it only .gz siblings are written
+    brotli = None
+
+from instrument import get_instrumentation, log, timed
+
+COMPRESS_SUFFIXES = (".html", ".css", ".svg", ".js", ".xml", ".json")
+COMPRESSED_SUFFIXES = (".gz", ".br")
+MIN_COMPRESS_SIZE = 1024 # smaller files barely shrink and a precompressed copy costs a request header's worth
+
+def available_encodings():
+    return (".gz", ".br") if brotli is not None else (".gz",)
+
+def compress_bytes(data, suffix):
+    if suffix == ".br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0) # mtime 0 keeps the output reproducible
+
+def compress_file(job):
+    # Worker entry point: write path's compressed siblings; returns (bytes read, bytes written)
+    path, suffixes = job
+    with open(path, 'rb') as file:
+        data = file.read()
+    written = 0
+    for suffix in suffixes:
+        compressed = compress_bytes(data, suffix)
+        tmp_path = f"{path}{suffix}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(compressed)
+        os.replace(tmp_path, path + suffix)
+        written += len(compressed)
+    return len(data), written
+
+def is_sibling_fresh(sibling, source_mtime):
+    try:
+        return os.stat(sibling).st_mtime_ns >= source_mtime
+    except FileNotFoundError:
+        return False
+
+def plan_compression(root, min_size=MIN_COMPRESS_SIZE, encodings=None):
+    # Walk root and return (jobs, stale siblings to delete). A job is (path, suffixes still to write):
+    # siblings at least as new as their source are kept. Siblings whose source is gone or now
+    # below min_size are stale.
+    encodings = encodings or available_encodings()
+    jobs = []
+    stale = []
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(COMPRESSED_SUFFIXES) and entry.name[:-3].endswith(COMPRESS_SUFFIXES): # not e.g. archive.tar.gz
+                    source = entry.path[:-3]
+                    if not os.path.isfile(source) or os.stat(source).st_size < min_size:
+                        stale.append(entry.path)
+                elif entry.name.endswith(COMPRESS_SUFFIXES):
+                    stat = entry.stat()
+                    if stat.st_size < min_size:
+                        continue
+                    suffixes = tuple(suffix for suffix in encodings if not is_sibling_fresh(entry.path + suffix, stat.st_mtime_ns))
+                    if suffixes:
+                        jobs.append((entry.path, suffixes))
+    return sorted(jobs), sorted(stale)
+
+@timed("compress")
+def compress_tree(root, jobs=1, min_size=MIN_COMPRESS_SIZE):
+    # Post-build stage: write .gz (and with the brotli module, .br) next to every text output of
+    # at least min_size bytes, across a process pool. Returns stats.
+    work, stale = plan_compression(root, min_size)
+    for path in stale:
+        os.remove(path)
+        log(f"Deleting file: {path}")
+    if jobs > 1 and len(work) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(compress_file, work, chunksize=max(1, len(work) // (jobs * 4))))
+    else:
+        results = [compress_file(job) for job in work]
+
+    stats = {"compressed": len(work), "removed": len(stale), "bytes in": 0, "bytes out": 0}
+    for (path, suffixes), (read, written) in zip(work, results):
+        stats["bytes in"] += read * len(suffixes)
+        stats["bytes out"] += written
+        log(f"Compressed file: {path} ({', '.join(suffixes)})")
+    instrumentation = get_instrumentation()
+    instrumentation.count("files compressed", stats["compressed"])
+    instrumentation.count("compressed bytes written", stats["bytes out"])
+    return stats
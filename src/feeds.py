@@ -0,0 +1,143 @@
+import datetime
+import heapq
+import os
+import re
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+from instrument import log
+
+SITEMAP_NAME = "sitemap.xml"
+SITEMAP_LIMIT = 50000 # URLs per sitemap file allowed by the sitemaps.org protocol
+SITEMAP_PART_PATTERN = re.compile(r"sitemap-\d+\.xml$")
+SITEMAP_NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
+RSS_NAME = "rss.xml"
+ATOM_NAME = "atom.xml"
+FEED_LIMIT = 20
+
+def absolute_url(site_url, url):
+    # site_url is the scheme and host the site is published at; url already includes the basepath
+    return site_url.rstrip("/") + url
+
+def parse_date(date):
+    # Front matter dates (ISO 8601) as aware datetimes; dates without a zone are taken as UTC
+    value = datetime.datetime.fromisoformat(date)
+    return value if value.tzinfo is not None else value.replace(tzinfo=datetime.timezone.utc)
+
+class SitemapWriter():
+    # Writes sitemap.xml while pages are handed to it (add), one <url> at a time, never holding the
+    # list in memory. Past limit URLs the output rolls over into sitemap-2.xml, sitemap-3.xml, ...
+    # and close turns sitemap.xml into a sitemap index pointing at all the parts.
+    def __init__(self, dest_dir, site_url, basepath="/", limit=SITEMAP_LIMIT):
+        self.dest_dir = dest_dir
+        self.site_url = site_url
+        self.basepath = basepath
+        self.limit = limit
+        self.parts = [] # temporary files written so far
+        self.file = None
+        self.count = 0 # URLs in the current part
+
+    def add(self, page):
+        if self.file is None or self.count == self.limit:
+            self.start_part()
+        lastmod = f"<lastmod>{escape(page['date'])}</lastmod>" if page["date"] else ""
+        self.file.write(f"<url><loc>{escape(absolute_url(self.site_url, page['url']))}</loc>{lastmod}</url>\n")
+        self.count += 1
+
+    def start_part(self):
+        self.end_part()
+        path = os.path.join(self.dest_dir, f"sitemap-{len(self.parts) + 1}.xml.tmp")
+        self.parts.append(path)
+        self.file = open(path, 'w')
+        self.file.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NAMESPACE}">\n')
+        self.count = 0
+
+    def end_part(self):
+        if self.file is not None:
+            self.file.write("</urlset>\n")
+            self.file.close()
+            self.file = None
+
+    def close(self):
+        # Move the parts into place and remove parts left by a larger previous build; returns the file names
+        if not self.parts:
+            self.start_part() # an empty site still gets a valid sitemap
+        self.end_part()
+        if len(self.parts) == 1:
+            names = [SITEMAP_NAME]
+            os.replace(self.parts[0], os.path.join(self.dest_dir, SITEMAP_NAME))
+        else:
+            names = [os.path.basename(path)[:-len(".tmp")] for path in self.parts]
+            for path, name in zip(self.parts, names):
+                os.replace(path, os.path.join(self.dest_dir, name))
+            self.write_index(names)
+            names.append(SITEMAP_NAME)
+        for name in os.listdir(self.dest_dir):
+            if SITEMAP_PART_PATTERN.match(name) and name not in names:
+                os.remove(os.path.join(self.dest_dir, name))
+                log(f"Removed stale sitemap: {name}")
+        return names
+
+    def write_index(self, names):
+        tmp_path = os.path.join(self.dest_dir, SITEMAP_NAME + ".tmp")
+        with open(tmp_path, 'w') as file:
+            file.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n')
+            for name in names:
+                file.write(f"<sitemap><loc>{escape(absolute_url(self.site_url, self.basepath + name))}</loc></sitemap>\n")
+            file.write("</sitemapindex>\n")
+        os.replace(tmp_path, os.path.join(self.dest_dir, SITEMAP_NAME))
+
+class FeedWriter():
+    # RSS 2.0 (rss.xml) and Atom (atom.xml) feeds of the limit most recent dated pages. Pages are
+    # handed over one at a time (add) and only the newest limit are kept, in a bounded min-heap,
+    # so memory does not grow with the site.
+    def __init__(self, dest_dir, site_url, basepath="/", title="", limit=FEED_LIMIT):
+        self.dest_dir = dest_dir
+        self.site_url = site_url
+        self.basepath = basepath
+        self.title = title
+        self.limit = limit
+        self.heap = [] # (timestamp, url, title, date), oldest first
+
+    def add(self, page):
+        if not page["date"]:
+            return # only dated pages (posts) are syndicated
+        item = (parse_date(page["date"]).timestamp(), page["url"], page["title"] or page["url"], page["date"])
+        if len(self.heap) < self.limit:
+            heapq.heappush(self.heap, item)
+        elif item > self.heap[0]:
+            heapq.heapreplace(self.heap, item)
+
+    def close(self):
+        # Write both feeds, newest entry first; returns the file names
+        entries = sorted(self.heap, reverse=True)
+        link = escape(absolute_url(self.site_url, self.basepath))
+        title = escape(self.title)
+        write_file(os.path.join(self.dest_dir, RSS_NAME), self.iter_rss(entries, link, title))
+        write_file(os.path.join(self.dest_dir, ATOM_NAME), self.iter_atom(entries, link, title))
+        return [RSS_NAME, ATOM_NAME]
+
+    def iter_rss(self, entries, link, title):
+        yield f'<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel><title>{title}</title><link>{link}</link><description>{title}</description>\n'
+        for _, url, entry_title, date in entries:
+            entry_link = escape(absolute_url(self.site_url, url))
+            yield (f"<item><title>{escape(entry_title)}</title><link>{entry_link}</link><guid>{entry_link}</guid>"
+                   f"<pubDate>{format_datetime(parse_date(date))}</pubDate></item>\n")
+        yield "</channel></rss>\n"
+
+    def iter_atom(self, entries, link, title):
+        updated = parse_date(entries[0][3]).isoformat() if entries else "1970-01-01T00:00:00+00:00"
+        feed_url = escape(absolute_url(self.site_url, self.basepath + ATOM_NAME))
+        yield (f'<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom"><title>{title}</title>'
+               f'<link href="{link}"/><link rel="self" href="{feed_url}"/><id>{link}</id><updated>{updated}</updated>\n')
+        for _, url, entry_title, date in entries:
+            entry_link = escape(absolute_url(self.site_url, url))
+            yield (f'<entry><title>{escape(entry_title)}</title><link href="{entry_link}"/><id>{entry_link}</id>'
+                   f"<updated>{parse_date(date).isoformat()}</updated></entry>\n")
+        yield "</feed>\n"
+
+def write_file(path, chunks):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        file.writelines(chunks)
+    os.replace(tmp_path, path)
@@ -0,0 +1,70 @@
+import json
+import os
+
+from assets import is_unchanged, place_file
+from instrument import get_instrumentation, log
+from manifest import hash_file
+
+FINGERPRINT_CACHE_PATH = os.path.join(".buildcache", "fingerprints.json")
+ASSET_MANIFEST_NAME = "asset-manifest.json"
+FINGERPRINT_LENGTH = 8 # hex digits of the content hash kept in the file name
+FINGERPRINT_SUFFIXES = (".css", ".js", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".svg", ".ico", ".woff", ".woff2")
+
+def fingerprinted_path(path, digest):
+    # images/tom.png -> images/tom.<hash>.png
+    root, extension = os.path.splitext(path)
+    return f"{root}.{digest[:FINGERPRINT_LENGTH]}{extension}"
+
+def asset_url(path, root):
+    return "/" + os.path.relpath(path, root).replace(os.sep, "/")
+
+def load_json_cache(path):
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {} # a lost cache only costs rehashing
+
+def save_json(path, data):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(data, file, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def fingerprint_assets(synced, dest_dir, cache_path=FINGERPRINT_CACHE_PATH, link_mode="copy"):
+    # Write a content-hashed copy next to every cacheable asset synced into dest_dir (the dest -> src
+    # mapping from sync_tree) plus dest_dir/asset-manifest.json, and return the same mapping of
+    # root-relative URLs to fingerprinted URLs for page rendering. Hashes are cached by source
+    # size and mtime, so unchanged assets are never read again. The previous hashed copy of a
+    # changed or removed asset is deleted.
+    cache = load_json_cache(cache_path) # dest path -> {"size", "mtime_ns", "digest", "hashed"}
+    fingerprints = {}
+    urls = {}
+    for dest_path, src_path in sorted(synced.items()):
+        if not dest_path.lower().endswith(FINGERPRINT_SUFFIXES):
+            continue
+        stat = os.stat(src_path)
+        entry = cache.get(dest_path)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            digest = entry["digest"]
+        else:
+            digest = hash_file(src_path)
+            get_instrumentation().count("assets hashed")
+        hashed_path = fingerprinted_path(dest_path, digest)
+        if not is_unchanged(stat, hashed_path, src_path):
+            method = place_file(src_path, hashed_path, link_mode)
+            log(f"Fingerprinted file ({method}): {dest_path} -> {hashed_path}")
+        if entry is not None and entry["hashed"] != hashed_path and os.path.isfile(entry["hashed"]):
+            os.remove(entry["hashed"])
+        fingerprints[dest_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest, "hashed": hashed_path}
+        urls[asset_url(dest_path, dest_dir)] = asset_url(hashed_path, dest_dir)
+
+    for dest_path, entry in cache.items():
+        if dest_path not in fingerprints and os.path.isfile(entry["hashed"]):
+            os.remove(entry["hashed"]) # source removed from static/
+    save_json(cache_path, fingerprints)
+    save_json(os.path.join(dest_dir, ASSET_MANIFEST_NAME), urls)
+    return urls
@@ -0,0 +1,19 @@
+import os
+import tempfile
+import unittest
+
+# Shared test fixtures. Not named test_*.py, so unittest discovery does not collect it.
+
+class TempDirTestCase(unittest.TestCase):
+    # A scratch directory (self.tmp) for each test, removed afterwards
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, text):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            file.write(text)
+        return path
@@ -0,0 +1,66 @@
+import datetime
+import io
+
+FRONT_MATTER_FENCE = "---"
+
+def parse_value(value):
+    # "[a, b]" is a list; surrounding quotes are dropped
+    if value.startswith("[") and value.endswith("]"):
+        return [parse_value(item.strip()) for item in value[1:-1].split(",") if item.strip()]
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+def read_front_matter(file):
+    # Read the front matter block at the head of an open file:
+    #
+    #   ---
+    #   tags: [tolkien, characters]
+    #   ---
+    #
+    # Returns its fields and leaves the file at the first line of the body. A file that does
+    # not start with the fence has no front matter and is rewound.
+    first = file.readline()
+    if first.rstrip() != FRONT_MATTER_FENCE:
+        file.seek(0)
+        return {}
+    fields = {}
+    for line in file:
+        line = line.rstrip()
+        if line == FRONT_MATTER_FENCE:
+            return fields
+        key, separator, value = line.partition(":")
+        if separator and key.strip():
+            fields[key.strip().lower()] = parse_value(value.strip())
+    raise ValueError("Unterminated front matter")
+
+def page_fields(fields):
+    # The fields the build uses, typed: title, date (ISO 8601 text), description, tags (list),
+    # draft (bool) and template. Raises ValueError for a date that is not ISO 8601.
+    tags = fields.get("tags", [])
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
+    date = fields.get("date") or None
+    if date is not None:
+        try:
+            datetime.datetime.fromisoformat(date)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid date in front matter: {date!r}")
+    return {
+        "title": fields.get("title") or None,
+        "date": date,
+        "description": fields.get("description") or None,
+        "tags": tags,
+        "draft": str(fields.get("draft", "")).lower() in ("true", "yes", "1"),
+        "template": fields.get("template") or None,
+    }
+
+def read_page_fields(file):
+    # Typed front matter from the head of an open file, which is left at the start of the body
+    return page_fields(read_front_matter(file))
+
+def split_front_matter(markdown):
+    # read_front_matter for a whole document; returns (fields, body)
+    stream = io.StringIO(markdown)
+    fields = read_front_matter(stream)
+    return fields, stream.read()
@@ -1,32 +1,133 @@
+import re
+from types import MappingProxyType
+
+from instrument import timed
+
+# Shared read-only defaults so leaves don't each allocate an empty props dict and children list
+EMPTY_PROPS = MappingProxyType({})
+EMPTY_CHILDREN = ()
+WHITESPACE_RUN = re.compile(r"[ \t\n\r\f]{2,}|[\t\n\r\f]") # HTML whitespace a browser renders as one space (not &nbsp;)
+PREFORMATTED_TAGS = ("pre", "textarea")
+
+def has_collapsible_whitespace(text):
+    # Cheap test that lets most chunks skip the regex
+    return "\n" in text or "  " in text or "\t" in text or "\r" in text or "\f" in text
+
+def escape_text(text):
+    # Escape text content. Only & and < can end text early or start markup, so only those are
+    # replaced; most strings have neither, and the substring tests let them through untouched.
+    if "&" in text or "<" in text:
+        return text.replace("&", "&amp;").replace("<", "&lt;")
+    return text
+
+def escape_attribute(value):
+    # The same for a double-quoted attribute value, where & and the closing quote matter
+    if "&" in value or '"' in value:
+        return value.replace("&", "&amp;").replace('"', "&quot;")
+    return value
+
+def escape_html(text):
+    # For text that may be placed in content or in a double-quoted attribute, such as a template slot
+    if "&" in text or "<" in text or '"' in text:
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;")
+    return text
+
+def attributes_to_html(props):
+    # ' key="value"' for every prop, values escaped. Keys are attribute names set by the code, so
+    # the joined markup is checked once instead of each value: an & or a quote besides the
+    # delimiters means some value needs escaping.
+    markup = "".join([f' {key}="{value}"' for key, value in props.items()])
+    if "&" in markup or markup.count('"') != 2 * len(props):
+        return "".join([f' {key}="{escape_attribute(value)}"' for key, value in props.items()])
+    return markup
+
 class HTMLNode():
     # represent a node in the structure of HTML document, building blocks for all different parts of a webpag
+    # value and prop values are plain text: the serializer escapes them, so callers must not escape them first
+    # __slots__ drops the per-instance __dict__; pages build hundreds of thousands of these
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag
         self.value = value
         self.children = children if children is not None else [] # children can be empty list if no children exist
-        self.props = props or {}
+        self.props = props or EMPTY_PROPS
 
-    def to_html(self):
+    @timed("to_html")
+    def to_html(self, minify=False):
+        return "".join(self.iter_html(minify))
+
+    def write_html(self, fp, minify=False):
+        # Stream the serialized tree into a file or buffer without building the whole string
+        fp.writelines(self.iter_html(minify))
+
+    def iter_html(self, minify=False):
+        # Yield the HTML of this subtree as string chunks. Walks the tree with an explicit stack
+        # so deep nesting never hits the recursion limit and no level re-copies its children's output.
+        if minify:
+            return self.iter_minified_html()
+        return self.iter_plain_html()
+
+    def iter_plain_html(self):
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str): # closing tag pushed when its element was opened
+                yield item
+                continue
+            start, children, end = item.html_parts()
+            yield start
+            if end:
+                stack.append(end)
+            if children: # leaves, most of a tree, have none
+                stack.extend(reversed(children))
+
+    def iter_minified_html(self):
+        # iter_html with whitespace runs in each chunk collapsed to one space, as they are
+        # serialized, except inside <pre> (and <textarea>) where whitespace is content
+        stack = [self]
+        preformatted = 0 # depth of open preformatted elements
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                if preformatted and item in ("</pre>", "</textarea>"):
+                    preformatted -= 1
+                yield item
+                continue
+            start, children, end = item.html_parts()
+            if preformatted or item.tag in PREFORMATTED_TAGS or not has_collapsible_whitespace(start):
+                yield start
+            else:
+                yield WHITESPACE_RUN.sub(" ", start)
+            if end:
+                if item.tag in PREFORMATTED_TAGS:
+                    preformatted += 1
+                stack.append(end)
+            if children: # leaves, most of a tree, have none
+                stack.extend(reversed(children))
+
+    def html_parts(self):
+        # (opening markup, children to serialize next, closing markup) for this node alone
         if not self.tag:
             raise ValueError("Tag is required for HTMLNode.")
         
         attr_str = self.props_to_html()
         
         if self.children:
-            children_html = "".join(child.to_html() for child in self.children)
-            return f"<{self.tag}{attr_str}>{children_html}</{self.tag}>"
+            return f"<{self.tag}{attr_str}>", self.children, f"</{self.tag}>"
         elif self.value:
-            return f"<{self.tag}{attr_str}>{self.value}</{self.tag}>"
+            return f"<{self.tag}{attr_str}>{escape_text(self.value)}</{self.tag}>", (), ""
         else:
-            return f"<{self.tag}{attr_str} />"
+            return f"<{self.tag}{attr_str} />", (), ""
     
     def props_to_html(self):
         if not self.props:
             return ""
-        html_props = [f' {key}="{value}"' for key, value in self.props.items()]
-        return "".join(html_props) #joins the list elements into single string
+        return attributes_to_html(self.props)
     
     def add_child(self, child_node): # Add child_node to list of children
+        if not isinstance(self.children, list): # shared EMPTY_CHILDREN or another read-only sequence
+            self.children = list(self.children)
         self.children.append(child_node)
 
     def __repr__(self):
@@ -34,29 +135,39 @@ class HTMLNode():
 
 class LeafNode(HTMLNode): 
     # handle HTML tags that contain a value and no child elements nested inside them
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
         if value is None:
             raise ValueError
-        super().__init__(tag=tag, value=value, props=props)
+        self.tag = tag
+        self.value = value
+        self.children = EMPTY_CHILDREN
+        self.props = props or EMPTY_PROPS
      
-    def to_html(self):
+    def html_parts(self):
         if self.value is None:
             raise ValueError("invalid HTML: no value")
+        value = self.value
+        if "&" in value or "<" in value: # escape_text's test inline, leaves are the bulk of a tree
+            value = escape_text(value)
         if self.tag is None:
-            return self.value
+            return value, (), ""
         
         attr = ""
         if self.props:
-            attr = ' ' + ' '.join(f'{key}="{value}"' for key, value in self.props.items())
-        return f"<{self.tag}{attr}>{self.value}</{self.tag}>"
+            attr = attributes_to_html(self.props)
+        return f"<{self.tag}{attr}>{value}</{self.tag}>", (), ""
     
 class ParentNode(HTMLNode):
     # node that has child nodes nested within it
     # potential nesting tags could be italics and bold within a normal text block or a paragraph with bold text.
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None): # no value argument required
         super().__init__(tag=tag, children=children, props=props)
 
-    def to_html(self):
+    def html_parts(self):
         if self.tag is None:
             raise ValueError("no tag exists")
         if self.children is None or self.children == []:
@@ -65,9 +176,8 @@ class ParentNode(HTMLNode):
         # check if have child nodes otherwise return string representing HTML tag of node and its children. 
         # Nested child node.
         if self.props:
-            attr_str = " " + " ".join(f'{key}="{value}"' for key, value in self.props.items())
+            attr_str = attributes_to_html(self.props)
         else:
             attr_str = ""
 
-        children_html = "".join(child.to_html() for child in self.children)
-        return f"<{self.tag}{attr_str}>{children_html}</{self.tag}>"
+        return f"<{self.tag}{attr_str}>", self.children, f"</{self.tag}>"
@@ -0,0 +1,133 @@
+import os
+import struct
+
+from assets import copy_file, is_unchanged
+from fingerprint import asset_url, load_json_cache, save_json
+from instrument import get_instrumentation, log
+from manifest import hash_file
+
+IMAGE_CACHE_PATH = os.path.join(".buildcache", "images.json")
+IMAGE_VARIANT_DIR = os.path.join(".buildcache", "images")
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif")
+DEFAULT_IMAGE_WIDTHS = (480, 960)
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def image_size(path):
+    # (width, height) read from the PNG, GIF or JPEG header without decoding the image, or None
+    with open(path, 'rb') as file:
+        head = file.read(26)
+        if head.startswith(PNG_SIGNATURE) and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", head[6:10])
+        if head[:2] == b"\xff\xd8":
+            return jpeg_size(file)
+    return None
+
+def jpeg_size(file):
+    # Walk the JPEG segments up to the first start-of-frame, which holds the dimensions
+    file.seek(2)
+    while True:
+        byte = file.read(1)
+        if byte != b"\xff":
+            return None # not at a marker: corrupt or truncated
+        code = file.read(1)
+        while code == b"\xff": # fill bytes before the marker code
+            code = file.read(1)
+        if not code:
+            return None
+        code = code[0]
+        if code == 0x01 or 0xD0 <= code <= 0xD8: # markers without a length
+            continue
+        length = file.read(2)
+        if len(length) < 2:
+            return None
+        if code in JPEG_SOF_MARKERS:
+            data = file.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">xHH", data)
+            return width, height
+        file.seek(struct.unpack(">H", length)[0] - 2, os.SEEK_CUR)
+
+def variant_path(path, width, digest):
+    # images/tom.png -> images/tom-480w.<hash>.png; named by source hash so it never needs revalidating
+    root, extension = os.path.splitext(path)
+    return f"{root}-{width}w.{digest[:8]}{extension}"
+
+def resize_image(src_path, dest_path, width, height):
+    from PIL import Image # optional dependency, only needed for responsive variants
+    with Image.open(src_path) as image:
+        image.resize((width, height), Image.LANCZOS).save(dest_path)
+
+def pillow_available():
+    try:
+        import PIL # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def process_images(synced, dest_dir, widths=DEFAULT_IMAGE_WIDTHS, cache_path=IMAGE_CACHE_PATH, variant_dir=IMAGE_VARIANT_DIR):
+    # Image stage run after the static sync (synced is the dest -> src mapping from sync_tree).
+    # Returns root-relative image URL -> {"width", "height", "srcset": [[url, width], ...]} for
+    # RenderContext. Sizes come from the file headers and are cached by source size and mtime.
+    # Downscaled variants narrower than the original are rendered once per source hash into
+    # variant_dir and copied next to the original; without Pillow only sizes are emitted.
+    cache = load_json_cache(cache_path) # dest path -> {"size", "mtime_ns", "digest", "width", "height", "variants"}
+    resize = bool(widths) and pillow_available()
+    if widths and not resize:
+        print("Pillow is not installed; emitting image sizes without responsive variants")
+    entries = {}
+    images = {}
+    for dest_path, src_path in sorted(synced.items()):
+        if not dest_path.lower().endswith(IMAGE_SUFFIXES):
+            continue
+        stat = os.stat(src_path)
+        entry = cache.get(dest_path)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            size = image_size(src_path)
+            if size is None:
+                continue
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": hash_file(src_path),
+                     "width": size[0], "height": size[1], "variants": (cache.get(dest_path) or {}).get("variants", [])}
+            get_instrumentation().count("images measured")
+
+        variants = []
+        if resize:
+            for width in sorted(set(widths)):
+                if width >= entry["width"]:
+                    continue
+                height = max(1, round(entry["height"] * width / entry["width"]))
+                path = variant_path(dest_path, width, entry["digest"])
+                extension = os.path.splitext(dest_path)[1]
+                cached = os.path.join(variant_dir, f"{entry['digest']}-{width}w{extension}")
+                if not os.path.exists(cached):
+                    os.makedirs(variant_dir, exist_ok=True)
+                    tmp_path = f"{cached}.{os.getpid()}.tmp{extension}" # Pillow picks the format from the extension
+                    resize_image(src_path, tmp_path, width, height)
+                    os.replace(tmp_path, cached)
+                    get_instrumentation().count("image variants rendered")
+                if not is_unchanged(os.stat(cached), path, cached):
+                    copy_file(cached, path)
+                    log(f"Image variant: {dest_path} -> {path}")
+                variants.append([path, width])
+        current = {path for path, _ in variants}
+        for old_path, _ in entry["variants"]:
+            if old_path not in current and os.path.isfile(old_path):
+                os.remove(old_path)
+        entry["variants"] = variants
+        entries[dest_path] = entry
+        images[asset_url(dest_path, dest_dir)] = {
+            "width": entry["width"],
+            "height": entry["height"],
+            "srcset": [[asset_url(path, dest_dir), width] for path, width in variants],
+        }
+
+    for dest_path, entry in cache.items():
+        if dest_path not in entries:
+            for path, _ in entry["variants"]:
+                if os.path.isfile(path):
+                    os.remove(path) # source removed from static/
+    save_json(cache_path, entries)
+    return images
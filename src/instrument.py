@@ -0,0 +1,131 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+class Instrumentation():
+    # Counters and stage timers for one build process. Disabled instances cost one attribute
+    # check per timed call, so the hooks stay in place for normal builds.
+    def __init__(self, enabled=False, quiet=False, trace=False):
+        self.enabled = enabled
+        self.quiet = quiet # suppress per-file log lines
+        self.trace = trace # keep Chrome trace events
+        self.reset()
+
+    def reset(self):
+        self.counters = defaultdict(int)
+        self.totals = defaultdict(float) # stage -> seconds, summed over the build
+        self.pages = {} # page -> {stage: seconds}
+        self.events = []
+        self.current_page = None
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] += amount
+
+    @contextmanager
+    def timer(self, stage):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, start, time.perf_counter())
+
+    def add_time(self, stage, start, end):
+        elapsed = end - start
+        self.totals[stage] += elapsed
+        self.counters[stage + " calls"] += 1
+        if self.current_page is not None:
+            stages = self.pages.setdefault(self.current_page, {})
+            stages[stage] = stages.get(stage, 0.0) + elapsed
+        if self.trace:
+            self.events.append({
+                "name": stage, "cat": "build", "ph": "X",
+                "ts": start * 1e6, "dur": elapsed * 1e6,
+                "pid": os.getpid(), "tid": threading.get_ident(),
+                "args": {"page": self.current_page} if self.current_page else {},
+            })
+
+    @contextmanager
+    def page(self, path):
+        # Attribute every stage timed inside this block to page path
+        previous, self.current_page = self.current_page, path
+        try:
+            with self.timer("generate_page"):
+                yield
+        finally:
+            self.current_page = previous
+
+    def take(self):
+        # Hand this process's measurements over (e.g. from a worker to the parent) and start fresh
+        data = {"counters": dict(self.counters), "totals": dict(self.totals), "pages": self.pages, "events": self.events}
+        self.reset()
+        return data
+
+    def merge(self, data):
+        for name, value in data["counters"].items():
+            self.counters[name] += value
+        for stage, seconds in data["totals"].items():
+            self.totals[stage] += seconds
+        self.pages.update(data["pages"])
+        self.events.extend(data["events"])
+
+    def report(self, top=10):
+        # Per-stage totals plus the slowest pages with their time per stage
+        lines = ["Build stages:"]
+        for stage, seconds in sorted(self.totals.items(), key=lambda item: -item[1]):
+            lines.append(f"  {stage:<32} {seconds * 1000:>10.2f} ms {self.counters.get(stage + ' calls', 0):>8} calls")
+        other = {name: value for name, value in self.counters.items() if not name.endswith(" calls")}
+        if other:
+            lines.append("Counters:")
+            lines.extend(f"  {name:<32} {value:>10}" for name, value in sorted(other.items()))
+        slowest = sorted(self.pages.items(), key=lambda item: -item[1].get("generate_page", 0.0))[:top]
+        if slowest:
+            lines.append(f"Slowest {len(slowest)} page(s):")
+            for path, stages in slowest:
+                breakdown = ", ".join(f"{stage} {seconds * 1000:.2f}" for stage, seconds in sorted(stages.items()) if stage != "generate_page")
+                lines.append(f"  {stages.get('generate_page', 0.0) * 1000:>8.2f} ms  {path}  ({breakdown})")
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        # Chrome trace format, viewable in chrome://tracing or Perfetto
+        with open(path, 'w') as file:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, file)
+
+_instrumentation = Instrumentation()
+
+def configure_instrumentation(enabled=False, quiet=False, trace=False):
+    # Install the instrumentation for this process; also used as a worker initializer
+    global _instrumentation
+    _instrumentation = Instrumentation(enabled or trace, quiet, trace)
+    return _instrumentation
+
+def get_instrumentation():
+    return _instrumentation
+
+def log(message):
+    # Per-file progress output, silenced by quiet mode
+    if not _instrumentation.quiet:
+        print(message)
+
+def timed(stage):
+    # Decorator timing every call of a function as stage
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            instrumentation = _instrumentation
+            if not instrumentation.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                instrumentation.add_time(stage, start, time.perf_counter())
+        return wrapper
+    return decorator
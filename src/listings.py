@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import re
+
+from block_markdown import extract_title
+from fingerprint import load_json_cache, save_json
+from front_matter import page_fields, read_page_fields
+from htmlnode import LeafNode, ParentNode, escape_text
+from instrument import get_instrumentation, log, timed
+from manifest import hash_template, remove_empty_dirs
+from render_context import settings_digest
+from search import page_url
+from template import load_template, resolve_template, template_slots
+
+SITE_CACHE_PATH = os.path.join(".buildcache", "site.json")
+SITE_VERSION = 3
+PER_PAGE = 10
+TAGS_DIR = "tags" # tag listings go to <dest>/tags/<tag>/
+SLUG_PATTERN = re.compile(r"[^a-z0-9]+")
+
+def slugify(text):
+    return SLUG_PATTERN.sub("-", text.lower()).strip("-")
+
+def section_title(directory):
+    # content/middle-earth -> "Middle Earth"
+    return os.path.basename(directory).replace("-", " ").title()
+
+def page_metadata(from_path, dest_path, stat):
+    # Metadata from the head of a source file: its front matter and, when that has no title, the
+    # first h1. The body is never read; the word count comes from rendering the page (record).
+    # A page with no title (yet) or bad front matter keeps what could be read, so that a draft
+    # without a heading is still left out; a published one reports the error when it is generated.
+    fields, title = page_fields({}), None
+    try:
+        with open(from_path, 'r') as file:
+            fields = read_page_fields(file)
+            title = fields["title"] or extract_title(file) # reads only up to the first h1
+    except ValueError:
+        pass
+    metadata = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "dest": dest_path, "words": None}
+    metadata.update(fields)
+    metadata["title"] = title
+    return metadata
+
+def sort_entries(entries):
+    # Newest first by front matter date; undated pages last, then by title
+    entries = sorted(entries, key=lambda entry: (entry["title"] or "", entry["dest"]))
+    return sorted(entries, key=lambda entry: str(entry["date"] or ""), reverse=True)
+
+def listing_node(items, newer=None, older=None):
+    entries = []
+    for url, title, date, words in items:
+        children = [LeafNode("a", title or url, {"href": url})]
+        if date:
+            children.append(LeafNode("time", date, {"datetime": date}))
+        if words is not None:
+            children.append(LeafNode("span", f"{words} words"))
+        entries.append(ParentNode("li", children))
+    children = [ParentNode("ul", entries)]
+    links = []
+    if newer:
+        links.append(LeafNode("a", "Newer", {"href": newer, "rel": "prev"}))
+    if older:
+        links.append(LeafNode("a", "Older", {"href": older, "rel": "next"}))
+    if links:
+        children.append(ParentNode("nav", links))
+    return ParentNode("div", children)
+
+def nav_node(links):
+    return ParentNode("ul", [ParentNode("li", [LeafNode("a", label, {"href": url})]) for url, label in links])
+
+class SiteModel():
+    # Metadata of every page (title, front matter, mtime, word count), gathered in one pass before
+    # pages are generated, and the listing pages built from it alone, without parsing Markdown again:
+    # a paginated index for each content directory that has no index.md of its own (blog/ for
+    # blog/<post>/index.md) and one per tag under tags/.
+    # Between incremental builds metadata is reused while a source's size and mtime match, and a
+    # listing is rewritten only when the metadata of its members (or the template) changes.
+    # Draft pages are left out of the site unless drafts is set. With listings, word counts are
+    # collected while pages render and pages without one are regenerated.
+    def __init__(self, path=SITE_CACHE_PATH, per_page=PER_PAGE, state=None, drafts=False, listings=True):
+        state = state or {}
+        self.path = path
+        self.per_page = per_page
+        self.drafts = drafts
+        self.listings_enabled = listings
+        self.pages = state.get("pages", {}) # from_path -> metadata
+        self.listings = state.get("listings", {}) # listing dest path -> digest of its inputs
+        self.content_dir = "content"
+        self.dest_dir = "docs"
+        self.basepath = "/"
+
+    @classmethod
+    def load(cls, path=SITE_CACHE_PATH, per_page=PER_PAGE, drafts=False, listings=True):
+        state = load_json_cache(path)
+        if state.get("version") != SITE_VERSION:
+            state = {}
+        return cls(path, per_page, state, drafts, listings)
+
+    def save(self):
+        save_json(self.path, {"version": SITE_VERSION, "pages": self.pages, "listings": self.listings})
+
+    @timed("metadata")
+    def scan(self, pages, content_dir, dest_dir, basepath):
+        # The metadata pass over the (from_path, dest_path) pairs of find_markdown_files.
+        # Returns the pairs that are part of the site, without drafts.
+        previous = self.pages
+        self.pages = {}
+        self.content_dir = content_dir
+        self.dest_dir = dest_dir
+        self.basepath = basepath
+        for from_path, dest_path in pages:
+            stat = os.stat(from_path)
+            entry = previous.get(from_path)
+            if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns or entry["dest"] != dest_path:
+                entry = page_metadata(from_path, dest_path, stat)
+                get_instrumentation().count("pages scanned")
+            self.pages[from_path] = entry
+        published = []
+        for from_path, dest_path in pages:
+            if self.pages[from_path]["draft"] and not self.drafts:
+                del self.pages[from_path]
+                log(f"Skipping draft: {from_path}")
+            else:
+                published.append((from_path, dest_path))
+        return published
+
+    def needs_render(self, from_path):
+        # Why an otherwise unchanged page has to be regenerated for the model, or None
+        if self.listings_enabled and self.pages[from_path]["words"] is None:
+            return "no word count"
+        return None
+
+    def record(self, from_path, info):
+        # Take what only rendering knows from generate_page's page info
+        if info["words"] is not None:
+            self.pages[from_path]["words"] = info["words"]
+
+    def sections(self):
+        # content directory -> its listed pages: those in its subdirectories' index.md or its own files
+        sections = {}
+        for from_path, entry in self.pages.items():
+            directory = os.path.dirname(from_path)
+            if os.path.basename(from_path) == "index.md":
+                if directory == self.content_dir:
+                    continue # the home page
+                directory = os.path.dirname(directory)
+            if os.path.join(directory, "index.md") not in self.pages:
+                sections.setdefault(directory, []).append(entry)
+        return sections
+
+    def tags(self):
+        tags = {}
+        for entry in self.pages.values():
+            for tag in entry["tags"]:
+                tags.setdefault(tag, []).append(entry)
+        return tags
+
+    def plan(self, template_path):
+        # (dest_path, template, title, items, newer URL, older URL) for every listing page. A section
+        # listing uses the template its directory's pages would; tag listings use template_path.
+        listings = []
+        directories = {}
+        for directory, entries in sorted(self.sections().items()):
+            relative = os.path.relpath(directory, self.content_dir)
+            title = section_title(directory)
+            template = resolve_template(os.path.join(directory, "index.md"), self.content_dir, template_path, None, directories)
+            listings.extend((dest_path, template, *rest) for dest_path, *rest in self.paginate(os.path.join(self.dest_dir, relative), title, entries))
+        for tag, entries in sorted(self.tags().items()):
+            listings.extend((dest_path, template_path, *rest) for dest_path, *rest in self.paginate(os.path.join(self.dest_dir, TAGS_DIR, slugify(tag)), f"Tagged {tag}", entries))
+        return listings
+
+    def nav_links(self):
+        # [url, label] of the home page and of every top-level page and section listing, for the
+        # templates' Nav slot. Pages are labelled with their title, listings with their directory.
+        links = {}
+        for from_path, entry in self.pages.items():
+            parts = os.path.relpath(from_path, self.content_dir).split(os.sep)
+            if parts == ["index.md"] or len(parts) > 2 or len(parts) == 2 and parts[1] != "index.md":
+                continue
+            url = page_url(entry["dest"], self.dest_dir, self.basepath)
+            links[url] = entry["title"] or url
+        if self.listings_enabled:
+            for directory in self.sections():
+                if os.path.dirname(directory) == self.content_dir:
+                    dest_path = os.path.join(self.dest_dir, os.path.relpath(directory, self.content_dir), "index.html")
+                    links.setdefault(page_url(dest_path, self.dest_dir, self.basepath), section_title(directory))
+        return [[self.basepath, "Home"]] + [[url, label] for url, label in sorted(links.items())]
+
+    def paginate(self, directory, title, entries):
+        items = [[page_url(entry["dest"], self.dest_dir, self.basepath), entry["title"], entry["date"], entry["words"]]
+                 for entry in sort_entries(entries)]
+        chunks = [items[start:start + self.per_page] for start in range(0, len(items), self.per_page)]
+        paths = [os.path.join(directory, "index.html")]
+        paths.extend(os.path.join(directory, "page", str(number), "index.html") for number in range(2, len(chunks) + 1))
+        urls = [page_url(path, self.dest_dir, self.basepath) for path in paths]
+        pages = []
+        for number, chunk in enumerate(chunks):
+            page_title = title if number == 0 else f"{title} (page {number + 1})"
+            newer = urls[number - 1] if number > 0 else None
+            older = urls[number + 1] if number + 1 < len(urls) else None
+            pages.append((paths[number], page_title, chunk, newer, older))
+        return pages
+
+    @timed("listings")
+    def write_listings(self, template_path, options=None):
+        # Second phase, after scan: render the listing pages with the site template and delete
+        # listings that no longer exist. Returns how many were written.
+        options = options or {}
+        assets = options.get("assets") or {}
+        minify = bool(options.get("minify"))
+        settings = settings_digest(assets, options.get("images")) # once, not per listing
+        template_hashes = {}
+        nav = None
+        page_dests = {entry["dest"] for entry in self.pages.values()}
+        digests = {}
+        written = 0
+        for dest_path, page_template, title, items, newer, older in self.plan(template_path):
+            if dest_path in page_dests:
+                continue # a Markdown page of the same name wins
+            if page_template not in template_hashes:
+                template_hashes[page_template] = (hash_template(page_template), "Nav" in template_slots(page_template))
+            template_hash, uses_nav = template_hashes[page_template]
+            if uses_nav and nav is None:
+                nav = self.nav_links()
+            inputs = [self.basepath, template_hash, settings, minify, title, items, newer, older, nav if uses_nav else None]
+            digest = hashlib.sha256(json.dumps(inputs).encode()).hexdigest()
+            digests[dest_path] = digest
+            if self.listings.get(dest_path) == digest and os.path.exists(dest_path):
+                continue
+            template = load_template(page_template, self.basepath, assets, minify, settings)
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            tmp_path = dest_path + ".tmp"
+            with open(tmp_path, 'w') as file:
+                template.write(file, {"Title": escape_text(title), "Content": listing_node(items, newer, older), "Nav": nav_node(nav) if uses_nav else ""})
+            os.replace(tmp_path, dest_path)
+            log(f"Generated listing: {dest_path}")
+            written += 1
+        for dest_path in self.listings:
+            if dest_path not in digests and os.path.exists(dest_path):
+                os.remove(dest_path)
+                remove_empty_dirs(os.path.dirname(dest_path), self.dest_dir)
+                log(f"Removed stale listing: {dest_path}")
+        self.listings = digests
+        get_instrumentation().count("listings written", written)
+        return written
@@ -1,15 +1,142 @@
+import argparse
+import cProfile
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
-from block_markdown import extract_title, markdown_to_html_node
+from assets import LINK_MODES, sync_tree
+from block_markdown import MarkdownStream, extract_title
+from compress import MIN_COMPRESS_SIZE, available_encodings, compress_tree
+from feeds import FEED_LIMIT, FeedWriter, SitemapWriter
+from fingerprint import fingerprint_assets
+from front_matter import read_page_fields
+from htmlnode import escape_html, escape_text
+from images import DEFAULT_IMAGE_WIDTHS, process_images
+from instrument import configure_instrumentation, get_instrumentation, log, timed
+from listings import PER_PAGE, SiteModel, nav_node
+from manifest import BuildManifest, asset_states
+from render_cache import RENDER_CACHE_DIR, configure_render_cache, get_render_cache, render_markdown
+from render_context import RenderContext, settings_digest
+from search import SearchIndex, page_url
+from template import load_template, resolve_template, template_slots
 
-def main():
-    basepath = sys.argv[1] if len(sys.argv) > 1 else "/" # site assumes / is root path of the site
+def parse_widths(text):
+    return tuple(int(width) for width in text.split(",") if width.strip())
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the static site from content/ and static/ into docs/.")
+    parser.add_argument("basepath", nargs="?", default="/", help="root path the site is served from") # site assumes / is root path of the site
+    parser.add_argument("--incremental", action="store_true", help="only regenerate pages whose inputs changed since the last build")
+    parser.add_argument("--explain", action="store_true", help="say why each page is rebuilt")
+    parser.add_argument("--checksum", action="store_true", help="compare static files by content hash instead of size and mtime")
+    parser.add_argument("--link-mode", choices=LINK_MODES, default="copy",
+                        help="how static files reach docs/: copied, or linked to static/ with a copy fallback (symlinks suit local builds only)")
+    parser.add_argument("--minify", action="store_true", help="collapse whitespace in pages and the template (not inside <pre>)")
+    parser.add_argument("--fingerprint", action="store_true", help="also write content-hashed copies of static assets and link pages to them")
+    parser.add_argument("--images", action="store_true", help="add width/height, srcset and lazy loading to images")
+    parser.add_argument("--image-widths", type=parse_widths, default=DEFAULT_IMAGE_WIDTHS, metavar="W,W",
+                        help="widths of downscaled image variants (needs Pillow; empty for sizes only)")
+    parser.add_argument("--drafts", action="store_true", help="also build pages marked draft: true in their front matter")
+    parser.add_argument("--listings", action="store_true", help="generate paginated index pages for blog-style directories and tags")
+    parser.add_argument("--per-page", type=int, default=PER_PAGE, metavar="N", help="entries per listing page")
+    parser.add_argument("--sitemap", action="store_true", help="write sitemap.xml (split into a sitemap index past 50,000 URLs)")
+    parser.add_argument("--feed", action="store_true", help="write rss.xml and atom.xml of the most recent dated pages")
+    parser.add_argument("--feed-size", type=int, default=FEED_LIMIT, metavar="N", help="entries per feed")
+    parser.add_argument("--feed-title", default=None, help="feed title (default: the home page title)")
+    parser.add_argument("--site-url", default=None, metavar="URL", help="scheme and host the site is published at, e.g. https://example.com (for --sitemap and --feed)")
+    parser.add_argument("--search", action="store_true", help="write a sharded search index of the page text to docs/search/")
+    parser.add_argument("--compress", action="store_true", help="write .gz (and .br with the brotli module) next to HTML, CSS and SVG outputs")
+    parser.add_argument("--compress-min-size", type=int, default=MIN_COMPRESS_SIZE, metavar="BYTES", help="leave smaller files uncompressed")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="number of worker processes for page generation (0 = one per CPU)")
+    parser.add_argument("--render-cache", type=int, default=0, metavar="ENTRIES", help="cache rendered documents and blocks in an LRU of this size (0 = off)")
+    parser.add_argument("--render-cache-dir", default=None, help=f"also persist render cache entries here (e.g. {RENDER_CACHE_DIR})")
+    parser.add_argument("--quiet", "-q", action="store_true", help="no per-file progress output")
+    parser.add_argument("--stats", action="store_true", help="time each build stage and report the slowest pages")
+    parser.add_argument("--profile", metavar="PATH", help="write cProfile stats of the build (main process) to PATH")
+    parser.add_argument("--trace", metavar="PATH", help="write a Chrome trace of the build stages to PATH")
+    args = parser.parse_args(argv)
+    if (args.sitemap or args.feed) and not args.site_url:
+        parser.error("--sitemap and --feed need --site-url")
+    if args.render_cache_dir and not args.render_cache:
+        parser.error("--render-cache-dir needs --render-cache")
+    return args
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "serve": # python3 src/main.py serve [basepath] [--port N]
+        from server import serve_main
+        return serve_main(argv[1:])
+    args = parse_args(argv)
+    instrumentation = configure_instrumentation(args.stats, args.quiet, bool(args.trace))
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        failures = build(args)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+    if args.stats:
+        print(instrumentation.report())
+    if args.trace:
+        instrumentation.write_trace(args.trace)
+    if failures:
+        sys.exit(f"Build failed: {len(failures)} page(s) could not be generated")
+
+def build(args):
+    # One build of content/ and static/ into docs/; returns the pages that failed
+    basepath = args.basepath
+    jobs = args.jobs or os.cpu_count() or 1
     print(basepath)
-    copy_source_static_to_destination_public_directory("static", "docs")
-    generate_pages_recursive(basepath, "content", "template.html", "docs")
+    configure_render_cache(args.render_cache, args.render_cache_dir)
+    # A full build starts from an empty manifest so every page is regenerated and recorded
+    manifest = BuildManifest.load() if args.incremental else BuildManifest()
+    assets = copy_source_static_to_destination_public_directory("static", "docs", not args.incremental, manifest, args.checksum, args.fingerprint, args.link_mode)
+    images = process_images(manifest.assets, "docs", args.image_widths) if args.images else None
+    options = {"assets": assets, "images": images, "minify": args.minify}
+    # The search state is kept with incremental builds only, like the manifest
+    search_index = (SearchIndex.load() if args.incremental else SearchIndex()) if args.search else None
+    site_args = {"per_page": args.per_page, "drafts": args.drafts, "listings": args.listings}
+    site = SiteModel.load(**site_args) if args.incremental else SiteModel(**site_args)
+    sitemap = SitemapWriter("docs", args.site_url, basepath) if args.sitemap else None
+    feed = FeedWriter("docs", args.site_url, basepath, args.feed_title, args.feed_size) if args.feed else None
+    writers = [writer for writer in (sitemap, feed) if writer is not None]
+    try:
+        cache_stats = generate_pages_recursive(basepath, "content", "template.html", "docs", manifest, jobs, args.explain, options, search_index, site, writers)
+    except PageBuildError as error:
+        failures = error.failures
+    else:
+        failures = []
+        if get_render_cache() is not None:
+            print(f"Render cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    for dest_path in manifest.prune("docs"):
+        log(f"Removed stale page: {dest_path}")
+    if args.listings:
+        written = site.write_listings("template.html", options)
+        print(f"Listings: {written} page(s) written.")
+    site.save()
+    if sitemap is not None:
+        print(f"Sitemap: {', '.join(sitemap.close())}")
+    if feed is not None:
+        if feed.title is None:
+            home = site.pages.get(os.path.join("content", "index.md"))
+            feed.title = home["title"] if home and home["title"] else args.site_url
+        print(f"Feeds: {', '.join(feed.close())}")
+    if search_index is not None:
+        written = search_index.write("docs")
+        search_index.save()
+        print(f"Search index: {len(search_index.pages)} page(s), {written} file(s) updated.")
+    if args.compress:
+        stats = compress_tree("docs", jobs, args.compress_min_size)
+        print(f"Compression complete: {stats['compressed']} file(s) as {', '.join(available_encodings())}, "
+              f"{stats['bytes in']} -> {stats['bytes out']} bytes, {stats['removed']} stale removed.")
+    manifest.save() # pages that did build are kept even when others failed
+    return failures
 
-def copy_source_static_to_destination_public_directory(src="static", dest='public'):
+@timed("copy_static")
+def copy_source_static_to_destination_public_directory(src="static", dest='public', clean=True, manifest=None, checksum=False, fingerprint=False, link_mode="copy"):
+    # Returns the asset manifest (root-relative URL -> fingerprinted URL), empty unless fingerprint is set
     # Delete directory and contents
     def delete_dir(path):
         if not os.path.exists(path):
@@ -19,70 +146,275 @@ def copy_source_static_to_destination_public_directory(src="static", dest='publi
             if os.path.isdir(full_path):
                 delete_dir(full_path)
             else:
-                print(f"Deleting file: {full_path}")
+                log(f"Deleting file: {full_path}")
                 os.remove(full_path) # removes file
-        print(f"Deleting directory: {path}")
+        log(f"Deleting directory: {path}")
         os.rmdir(path) # removes directory
 
-    def recursive_copy(src_path, dest_path):
-    # Copy files and directories recursively to destination directory aka public        
-        if not os.path.exists(dest_path):
-            os.mkdir(dest_path) # create directory
+    if clean: # incremental builds keep dest and only sync what changed
+        delete_dir(dest)
+    previous = manifest.assets if manifest is not None else None
+    assets, stats = sync_tree(src, dest, previous, checksum, link_mode)
+    if manifest is not None:
+        manifest.assets = assets
+    for name, value in stats.items():
+        get_instrumentation().count(f"static files {name}", value)
+    print(f"Copy complete: {stats['copied']} copied, {stats['unchanged']} unchanged, {stats['removed']} removed.")
+    return fingerprint_assets(assets, dest, link_mode=link_mode) if fingerprint else {}
 
-        for item in os.listdir(src_path):
-            src_item = os.path.join(src_path, item)
-            dest_item = os.path.join(dest_path, item)
+def generate_page(basepath, from_path, template_path, dest_path, options=None): # generate HTML page from Markdown
+    # options holds the build-wide RenderContext settings: assets (fingerprinted names), images
+    # (sizes and variants), minify, search, words and nav. Returns the page info: "refs", the sorted
+    # root-relative URLs the page links to for the dependency graph, its "title" and, when
+    # searching, the sorted "terms" of its text and, when counting, its "words".
+    log(f"Generating page from {from_path} to {dest_path} using {template_path}")
+    with get_instrumentation().page(from_path):
+        return render_page(basepath, from_path, template_path, dest_path, options or {})
 
-            if os.path.isdir(src_item):
-                print(f"Creating directory: {dest_item}")
-                recursive_copy(src_item, dest_item)  # Recursively copy subdirectories
+def render_page(basepath, from_path, template_path, dest_path, options):
+    context = RenderContext(basepath, **options)
+    template = load_template(template_path, basepath, context.assets, context.minify, context.digest) # parsed once per build, basepath already applied
+    cache = get_render_cache()
+    # Without a cache the body is parsed and serialized block by block straight into the output file,
+    # in one pass that also finds the title (unless the front matter gives one).
+    # Writing to a temporary file first means a page that fails halfway never replaces the previous good copy.
+    tmp_path = dest_path + ".tmp"
+    try:
+        with open(from_path, 'r') as source, open(tmp_path, 'w') as file:
+            fields = read_page_fields(source) # the body starts after the front matter
+            if cache is not None: # a cache key needs the whole text, so render it up front
+                markdown = source.read()
+                title = fields["title"] or extract_title(markdown)
+                content = render_markdown(markdown, context, cache)
             else:
-                with open(src_item, 'rb') as fsrc:
-                    with open(dest_item, 'wb') as fdst:
-                        fdst.write(fsrc.read())
-                print(f"Copied file: {src_item} -> {dest_item}")
-
-    delete_dir(dest)
-    recursive_copy(src, dest)
-    print("Copy complete.")
+                content = MarkdownStream(source, context)
+                title = fields["title"] or content.find_title()
+            template.write(file, page_values(title, fields, content, context.nav))
+        os.replace(tmp_path, dest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    terms = sorted(context.terms) if context.terms is not None else None
+    return {"refs": sorted(context.refs.union(template.refs)), "title": title, "terms": terms, "words": context.words}
 
-def generate_page(basepath, from_path, template_path, dest_path): # generate HTML page from Markdown
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
+def page_values(title, fields, content, nav=None):
+    # The template slots of a page. String slots are written as markup, so text is escaped here;
+    # Description is meant for attributes such as <meta content="..."> as much as for text.
+    return {
+        "Title": escape_text(title),
+        "Content": content,
+        "Date": escape_text(fields["date"] or ""),
+        "Description": escape_html(fields["description"] or ""),
+        "Nav": nav_node(nav) if nav else "",
+    }
 
-    with open(from_path, 'r') as file:
-        markdown = file.read()
-    with open(template_path, 'r') as file:
-        template = file.read()
-    
-    content = markdown_to_html_node(markdown).to_html()
-    title = extract_title(markdown)
+def site_navigation(site, template_paths):
+    # The Nav links (SiteModel.nav_links) when one of template_paths has a Nav slot, else None, so
+    # that pages whose templates show no navigation are not rebuilt when it changes
+    for path in template_paths:
+        try:
+            if "Nav" in template_slots(path):
+                return site.nav_links()
+        except (OSError, ValueError):
+            pass # a missing or broken template is reported by the pages using it
+    return None
 
-    html = template.replace("{{ Title }}", title).replace("{{ Content }}", content).replace('href="/', f'href="{basepath}').replace('src="/', f'src="{basepath}')
+class PageBuildError(Exception):
+    # Raised after a build in which one or more pages failed; failures holds (from_path, message) pairs
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(f"{len(failures)} page(s) failed to generate")
 
-    with open(dest_path, 'w') as file:
-        file.write(html)
-
-def generate_pages_recursive(basepath, dir_path_content="content", template_path="template.html", dest_dir_path="public"):
-    # Recursively go through the content directory, generate HTML file for each Markdown and writes them to the public directory
-    print(f"Generating page from {dir_path_content} to {dest_dir_path} using {template_path}")
+def find_markdown_files(dir_path_content="content", dest_dir_path="public"):
+    # Recursively collect (markdown path, html path) pairs and create the matching destination directories
+    # so page generation can be spread across workers afterwards
+    log(f"Scanning {dir_path_content} for Markdown files")
 
     # Ensure destination directory aka public exists       
     if not os.path.exists(dest_dir_path):
         os.mkdir(dest_dir_path) # create directory
 
+    pages = []
     # Iterate through all items in the content directory
     for item in os.listdir(dir_path_content):
         src_item = os.path.join(dir_path_content, item)
         dest_item = os.path.join(dest_dir_path, os.path.splitext(item)[0] + ".html") # Convert .md to .html
 
         if os.path.isdir(src_item):
-            print(f"Creating directory: {dest_dir_path}")
+            log(f"Creating directory: {dest_dir_path}")
             new_dest_dir = os.path.join(dest_dir_path, item)
-            generate_pages_recursive(basepath, src_item, template_path, new_dest_dir)  # Recursively copy subdirectories
+            pages.extend(find_markdown_files(src_item, new_dest_dir))  # Recursively collect subdirectories
         elif src_item.endswith(".md"): # If item is Markdown file, generate HTML page
-            generate_page(basepath, src_item, template_path, dest_item)
+            pages.append((src_item, dest_item))
         else:
-            print(f"Skipping non-Markdown file: {src_item}")
+            log(f"Skipping non-Markdown file: {src_item}")
+    return pages
+
+def init_worker(cache_args, instrument_args):
+    # ProcessPoolExecutor initializer: per-process render cache and instrumentation
+    configure_render_cache(*cache_args)
+    configure_instrumentation(*instrument_args)
+
+def generate_page_job(job):
+    # Worker entry point: returns an error message instead of raising so each failing file is reported,
+    # plus this page's info, render cache hits/misses and measurements (worker state lives in other processes)
+    basepath, from_path, template_path, dest_path, options = job
+    cache = get_render_cache()
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+    result = {"error": None, "page": None, "hits": 0, "misses": 0, "stats": None}
+    try:
+        result["page"] = generate_page(basepath, from_path, template_path, dest_path, options)
+    except Exception as exception:
+        result["error"] = f"{type(exception).__name__}: {exception}"
+    if cache:
+        result["hits"], result["misses"] = cache.hits - hits, cache.misses - misses
+    return result
+
+def generate_worker_page_job(job):
+    result = generate_page_job(job)
+    instrumentation = get_instrumentation()
+    if instrumentation.enabled:
+        result["stats"] = instrumentation.take() # merged into the parent's report
+    return result
+
+def generate_pages(basepath, pages, template_path, jobs=1, cache_stats=None, generated=None, options=None, on_page=None, templates=None):
+    # Generate every (from_path, dest_path) page, serially or across a process pool, with its template
+    # from templates (from_path -> template path) or else template_path.
+    # Returns the list of (from_path, message) failures; render cache counts are added to cache_stats
+    # and each generated page's info (see generate_page) to generated (from_path -> info).
+    # on_page(from_path) is called as each page's result comes in, in the order of pages.
+    templates = templates or {}
+    work = [(basepath, from_path, templates.get(from_path, template_path), dest_path, options) for from_path, dest_path in pages]
+    instrumentation = get_instrumentation()
+    executor = None
+    if jobs > 1 and len(work) > 1:
+        chunksize = max(1, len(work) // (jobs * 4)) # a few chunks per worker keeps them busy without per-page IPC
+        cache = get_render_cache()
+        cache_args = (cache.maxsize, cache.directory) if cache else (None, None)
+        instrument_args = (instrumentation.enabled, instrumentation.quiet, instrumentation.trace)
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(cache_args, instrument_args))
+        results = executor.map(generate_worker_page_job, work, chunksize=chunksize)
+    else:
+        results = map(generate_page_job, work) # each page is generated as the loop below asks for it
+    try:
+        failures = collect_results(pages, results, cache_stats, generated, on_page)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    instrumentation.count("pages generated", len(pages) - len(failures))
+    instrumentation.count("pages failed", len(failures))
+    return failures
+
+def collect_results(pages, results, cache_stats, generated, on_page):
+    instrumentation = get_instrumentation()
+    failures = []
+    for (from_path, dest_path), result in zip(pages, results):
+        if cache_stats is not None:
+            cache_stats["hits"] += result["hits"]
+            cache_stats["misses"] += result["misses"]
+        if generated is not None and result["page"] is not None:
+            generated[from_path] = result["page"]
+        if result["stats"] is not None:
+            instrumentation.merge(result["stats"])
+        if result["error"] is not None:
+            print(f"Error generating page from {from_path}: {result['error']}")
+            failures.append((from_path, result["error"]))
+        if on_page is not None:
+            on_page(from_path)
+    return failures
+
+def generate_pages_recursive(basepath, dir_path_content="content", template_path="template.html", dest_dir_path="public", manifest=None, jobs=1, explain=False, options=None, search_index=None, site=None, writers=()):
+    # Recursively go through the content directory, generate HTML file for each Markdown and writes them to the public directory
+    # With a manifest only the pages its dependency graph reports as stale are regenerated; explain prints why.
+    # Every page's front matter and title are gathered into site (listings.py) first, which drops drafts.
+    # Each page uses the template its front matter names, or the nearest template.html in its content
+    # directory or above, or template_path (template.resolve_template).
+    # With a search_index (search.py) the terms of each generated page are collected into it. Writing
+    # either out is up to the caller. Every page of the site is handed to each of writers (feeds.py)
+    # in walk order, unchanged pages from the metadata and the others as they are generated.
+    log(f"Generating page from {dir_path_content} to {dest_dir_path} using {template_path}")
+    if site is None:
+        site = SiteModel(None, listings=False)
+    pages = site.scan(find_markdown_files(dir_path_content, dest_dir_path), dir_path_content, dest_dir_path, basepath)
+    all_pages = pages
+    if options and options.get("digest") is None:
+        digest = settings_digest(options.get("assets"), options.get("images")) # once, not per page
+        if digest is not None:
+            options = dict(options, digest=digest)
+    if search_index is not None:
+        options = dict(options or {}, search=True)
+    if site.listings_enabled:
+        options = dict(options or {}, words=True)
+    directories = {}
+    templates = {}
+    for from_path, _ in pages:
+        page_template = resolve_template(from_path, dir_path_content, template_path, site.pages[from_path]["template"], directories)
+        if page_template != template_path:
+            templates[from_path] = page_template
+    nav = site_navigation(site, {template_path, *templates.values()})
+    if nav is not None:
+        options = dict(options or {}, nav=nav)
+
+    if manifest is not None:
+        options = options or {}
+        manifest.asset_states = asset_states(options.get("assets"), options.get("images"))
+        manifest.options = {"minify": True} if options.get("minify") else {} # only settings that differ from the defaults
+        if nav is not None:
+            manifest.options["nav"] = nav # shown on every page, so a change rebuilds them all
+        manifest.index_outputs(dest_dir_path, pages)
+        stale_pages = manifest.rebuild_set(basepath, pages, template_path, templates)
+        stale_sources = {from_path for from_path, _, _ in stale_pages}
+        for from_path, dest_path in pages:
+            if from_path in stale_sources:
+                continue
+            reason = site.needs_render(from_path)
+            if reason is None and search_index is not None and dest_path not in search_index.pages:
+                reason = "not in search index"
+            if reason is not None:
+                stale_pages.append((from_path, dest_path, reason))
+                stale_sources.add(from_path)
+        for from_path, _ in pages:
+            if from_path not in stale_sources:
+                log(f"Skipping unchanged page: {from_path}")
+                get_instrumentation().count("pages skipped")
+        if explain:
+            for from_path, dest_path, reason in stale_pages:
+                print(f"Rebuilding {dest_path}: {reason}")
+        pages = [(from_path, dest_path) for from_path, dest_path in pages if from_path in stale_sources] # walk order
+
+    cache_stats = {"hits": 0, "misses": 0}
+    generated = {}
+    rebuilt = {from_path for from_path, _ in pages}
+    remaining = iter(all_pages)
+    def publish(done_path=None):
+        # Hand writers every page up to done_path (all of them when None); failed pages are left out
+        for from_path, dest_path in remaining:
+            if from_path not in rebuilt or from_path in generated:
+                entry = site.pages[from_path]
+                page = {"url": page_url(dest_path, dest_dir_path, basepath), "title": entry["title"], "date": entry["date"]}
+                for writer in writers:
+                    writer.add(page)
+            if from_path == done_path:
+                return
+    failures = generate_pages(basepath, pages, template_path, jobs, cache_stats, generated, options, publish if writers else None, templates)
+    if writers:
+        publish()
+
+    for from_path, info in generated.items():
+        site.record(from_path, info)
+    if manifest is not None:
+        for from_path, dest_path in pages:
+            if from_path in generated: # failed pages stay unrecorded so the next build retries them
+                manifest.record(basepath, from_path, templates.get(from_path, template_path), dest_path, generated[from_path]["refs"])
+    if search_index is not None:
+        search_index.prune(dest_path for _, dest_path in all_pages)
+        for from_path, dest_path in pages:
+            if from_path in generated:
+                info = generated[from_path]
+                search_index.update(dest_path, page_url(dest_path, dest_dir_path, basepath), info["title"], info["terms"])
+    if failures:
+        raise PageBuildError(failures)
+    return cache_stats
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+from urllib.parse import unquote, urlsplit
+
+from template import template_files
+
+MANIFEST_PATH = os.path.join(".buildcache", "manifest.json")
+MANIFEST_VERSION = 7
+
+def hash_file(path, chunk_size=1 << 16):
+    # Hash file contents in chunks so large inputs never sit in memory at once
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_template(template_path, hash_path=hash_file):
+    # One hash for a template and every file it extends or includes; a plain file hash when it
+    # stands alone
+    files = template_files(template_path)
+    if len(files) == 1:
+        return hash_path(template_path)
+    return hashlib.sha256(" ".join(hash_path(path) for path in files).encode()).hexdigest()
+
+def asset_states(assets=None, images=None):
+    # Summary per asset URL of everything that changes how pages link to it: the fingerprinted
+    # name (fingerprint.py) and the image size and variants (images.py)
+    states = dict(assets or {})
+    for url, info in (images or {}).items():
+        variants = " ".join(variant for variant, _ in info["srcset"])
+        states[url] = f"{states.get(url, url)} {info['width']}x{info['height']} {variants}".rstrip()
+    return states
+
+def ref_outputs(url, root):
+    # Output paths under root a root-relative URL may be served from, most specific first
+    base = os.path.normpath(os.path.join(root, unquote(urlsplit(url).path).lstrip("/")))
+    return (base, base + ".html", os.path.join(base, "index.html"))
+
+class BuildManifest():
+    # On-disk dependency graph of the build: the inputs that produced each generated page.
+    # Lets an incremental build skip pages whose source, template and basepath are unchanged
+    # and delete pages whose Markdown source has been removed. Each page also records the
+    # root-relative URLs it links to and which source produced each target, so adding, moving
+    # or deleting a linked page or asset rebuilds exactly the pages that reference it, as does
+    # a new fingerprinted name or image size for a linked asset.
+    # Also remembers which outputs were copied from static/ so the asset sync can remove them
+    # once their source is gone.
+    def __init__(self, path=MANIFEST_PATH, pages=None, assets=None):
+        self.path = path
+        self.pages = pages if pages is not None else {} # dest_path -> {"source", "source_hash", "template_hash", "basepath", "options", "refs", "assets"}
+        self.assets = assets if assets is not None else {} # dest_path -> static source path
+        self.seen = set() # outputs produced or confirmed during this build
+        self.root = None # output directory refs are resolved against, set by index_outputs
+        self.outputs = {} # normalized dest path -> source for everything this build produces
+        self.options = {} # build options that change every page's markup, e.g. minify
+        self.asset_states = {} # root-relative URL -> how this build renders links to it, see asset_states()
+        self._hashes = {} # per-build memo so every input is hashed at most once
+
+    @classmethod
+    def load(cls, path=MANIFEST_PATH):
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return cls(path) # unreadable manifest means a full rebuild, not a crash
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data.get("pages", {}), data.get("assets", {}))
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({"version": MANIFEST_VERSION, "pages": self.pages, "assets": self.assets}, file, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path) # atomic so an interrupted build never leaves half a manifest
+
+    def hash(self, path):
+        if path not in self._hashes:
+            self._hashes[path] = hash_file(path)
+        return self._hashes[path]
+
+    def forget_hash(self, path):
+        # Drop a memoized hash after path changed on disk (long-running builds such as serve)
+        self._hashes.pop(path, None)
+
+    def index_outputs(self, root, pages):
+        # Map every output of this build (copied assets plus (from_path, dest_path) pages) to
+        # its source, so refs can be resolved before the pages are written
+        self.root = root
+        self.outputs = {os.path.normpath(dest_path): source for dest_path, source in self.assets.items()}
+        self.outputs.update((os.path.normpath(dest_path), from_path) for from_path, dest_path in pages)
+
+    def resolve_ref(self, url):
+        # Source producing the output url points at, or None for a broken link
+        if self.root is None:
+            return None
+        for candidate in ref_outputs(url, self.root):
+            source = self.outputs.get(candidate)
+            if source is not None:
+                return source
+        return None
+
+    def stale_reason(self, basepath, from_path, template_path, dest_path):
+        # Why dest_path has to be rebuilt, or None when it was built from exactly these inputs
+        self.seen.add(dest_path)
+        entry = self.pages.get(dest_path)
+        if entry is None:
+            return "not built before"
+        if not os.path.exists(dest_path):
+            return "output is missing"
+        if entry["source"] != from_path:
+            return f"source moved from {entry['source']}"
+        if entry["basepath"] != basepath:
+            return f"basepath changed from {entry['basepath']}"
+        if entry["options"] != self.options:
+            return f"build options changed from {entry['options']}"
+        if entry["source_hash"] != self.hash(from_path):
+            return f"{from_path} changed"
+        try:
+            template_hash = hash_template(template_path, self.hash)
+        except (OSError, ValueError):
+            return f"{template_path} cannot be read" # generating the page reports the error
+        if entry["template_hash"] != template_hash:
+            return f"{template_path} changed"
+        return self.ref_change(dest_path) or self.asset_change(dest_path)
+
+    def ref_change(self, dest_path):
+        # Why the URLs a recorded page links to now resolve differently, or None
+        for url, source in self.pages[dest_path]["refs"].items():
+            current = self.resolve_ref(url)
+            if current == source:
+                continue
+            if current is None:
+                return f"links to {url}, whose source {source} is gone"
+            if source is None:
+                return f"links to {url}, which {current} now provides"
+            return f"links to {url}, which moved from {source} to {current}"
+        return None
+
+    def asset_change(self, dest_path):
+        # Why the markup for an asset a recorded page links to changed (fingerprint, image size), or None
+        entry = self.pages[dest_path]
+        for url in entry["refs"]:
+            state = self.asset_states.get(url)
+            if state != entry["assets"].get(url):
+                return f"links to {url}, now rendered as {state or url}"
+        return None
+
+    def is_fresh(self, basepath, from_path, template_path, dest_path):
+        return self.stale_reason(basepath, from_path, template_path, dest_path) is None
+
+    def rebuild_set(self, basepath, pages, template_path, templates=None):
+        # The minimal list of (from_path, dest_path, reason) among pages that must be regenerated.
+        # templates maps pages that use another template than template_path to theirs.
+        stale = []
+        templates = templates or {}
+        for from_path, dest_path in pages:
+            reason = self.stale_reason(basepath, from_path, templates.get(from_path, template_path), dest_path)
+            if reason is not None:
+                stale.append((from_path, dest_path, reason))
+        return stale
+
+    def dependents(self, source):
+        # Recorded pages that link to an output produced by source
+        return sorted(dest_path for dest_path, entry in self.pages.items() if source in entry["refs"].values())
+
+    def record(self, basepath, from_path, template_path, dest_path, refs=()):
+        self.seen.add(dest_path)
+        self.pages[dest_path] = {
+            "source": from_path,
+            "source_hash": self.hash(from_path),
+            "template_hash": hash_template(template_path, self.hash),
+            "basepath": basepath,
+            "options": self.options,
+            "refs": {url: self.resolve_ref(url) for url in sorted(refs)},
+            "assets": {url: self.asset_states[url] for url in refs if url in self.asset_states},
+        }
+
+    def prune(self, root):
+        # Delete outputs whose Markdown source was not seen during this build
+        removed = sorted(set(self.pages) - self.seen)
+        for dest_path in removed:
+            self.discard(dest_path, root)
+        return removed
+
+    def discard(self, dest_path, root):
+        # Forget a page and delete its output
+        self.pages.pop(dest_path, None)
+        self.seen.discard(dest_path)
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+            remove_empty_dirs(os.path.dirname(dest_path), root)
+
+def remove_empty_dirs(path, root):
+    # Walk upwards removing directories left empty by a deleted output, never removing root itself
+    root = os.path.abspath(root)
+    path = os.path.abspath(path)
+    while path.startswith(root + os.sep) and os.path.isdir(path) and not os.listdir(path):
+        os.rmdir(path)
+        path = os.path.dirname(path)
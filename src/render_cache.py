@@ -0,0 +1,129 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+from block_markdown import block_lines_to_block_type, block_to_html_node, iter_blocks, markdown_lines, markdown_to_html_node
+from instrument import timed
+
+RENDER_CACHE_DIR = os.path.join(".buildcache", "render")
+RENDERER_MODULES = ("block_markdown.py", "textnode.py", "htmlnode.py", "render_context.py", "render_cache.py")
+
+_active_cache = None # per-process cache used by generate_page, installed by configure_render_cache
+
+def renderer_fingerprint():
+    # Hash of the renderer's own source, mixed into every key so a persisted cache never
+    # serves HTML produced by an older version of the code
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in RENDERER_MODULES:
+        with open(os.path.join(directory, name), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+class RenderCache():
+    # Content-addressed cache mapping a hash of normalized markdown to its rendered HTML.
+    # Entries live in an in-memory LRU and, when directory is set, in an on-disk store shared
+    # between builds and worker processes.
+    def __init__(self, maxsize=4096, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.salt = renderer_fingerprint()
+
+    def key(self, markdown, *variant):
+        # variant holds the render settings that change the output (RenderContext.cache_variant)
+        normalized = markdown.replace("\r\n", "\n").strip() # leading/trailing blank space never reaches the output
+        digest = hashlib.sha256(self.salt.encode())
+        for part in variant:
+            digest.update(b"\0" + str(part).encode())
+        digest.update(b"\0" + normalized.encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        html = self.entries.get(key)
+        if html is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return html
+        if self.directory:
+            try:
+                with open(self.disk_path(key), 'r') as file:
+                    html = file.read()
+            except FileNotFoundError:
+                pass
+            else:
+                self.remember(key, html)
+                self.hits += 1
+                return html
+        self.misses += 1
+        return None
+
+    def put(self, key, html):
+        self.remember(key, html)
+        if self.directory:
+            path = self.disk_path(key)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp" # workers may race on the same entry
+                with open(tmp_path, 'w') as file:
+                    file.write(html)
+                os.replace(tmp_path, path)
+
+    def remember(self, key, html):
+        self.entries[key] = html
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False) # evict least recently used
+
+    def disk_path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".html")
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+    def __repr__(self):
+        return f"RenderCache(maxsize={self.maxsize}, directory={self.directory}, hits={self.hits}, misses={self.misses})"
+
+def configure_render_cache(maxsize=None, directory=None):
+    # Install (or with maxsize None, remove) the cache generate_page uses in this process.
+    # Also the ProcessPoolExecutor initializer, so every worker gets its own instance.
+    global _active_cache
+    _active_cache = RenderCache(maxsize, directory) if maxsize else None
+    return _active_cache
+
+def get_render_cache():
+    return _active_cache
+
+@timed("render_markdown")
+def render_markdown(markdown, context=None, cache=None):
+    # Rendered HTML for a whole document. With a cache, an unchanged document is a single
+    # lookup, and a changed one only renders the blocks that are not already cached.
+    minify = context.minify if context else False
+    if cache is None:
+        return markdown_to_html_node(markdown, context).to_html(minify)
+    variant = context.cache_variant() if context else ()
+    key = cache.key(markdown, *variant)
+    html = cache.get(key)
+    if html is not None:
+        if context:
+            context.record_html_refs(html)
+            context.record_html_text(html)
+        return html
+
+    parts = []
+    for lines in iter_blocks(markdown_lines(markdown)):
+        block = "\n".join(lines)
+        block_key = cache.key(block, "block", *variant)
+        block_html = cache.get(block_key)
+        if block_html is None:
+            block_html = block_to_html_node(lines, block_lines_to_block_type(lines), context).to_html(minify)
+            cache.put(block_key, block_html)
+        elif context:
+            context.record_html_refs(block_html)
+            context.record_html_text(block_html)
+        parts.append(block_html)
+    html = f"<div>{''.join(parts)}</div>" if parts else "<div />"
+    cache.put(key, html)
+    return html
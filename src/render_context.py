@@ -0,0 +1,107 @@
+import hashlib
+import re
+
+from search import html_text, tokenize
+from textnode import TextType
+
+URL_ATTRIBUTE_PATTERN = re.compile(r'\b(?:href|src)="([^"]*)"')
+
+_originals_cache = {} # settings digest -> {fingerprinted URL: original URL}, shared by every page of a build
+
+def settings_digest(assets, images):
+    # Hash of the asset names and image info, the build settings that change rendered HTML
+    # besides basepath and minify; computed once per build and passed to every page as digest
+    if not assets and images is None:
+        return None
+    settings = repr((sorted(assets.items()) if assets else [], sorted(images.items()) if images is not None else None))
+    return hashlib.sha256(settings.encode()).hexdigest()
+
+class RenderContext():
+    # Per-page settings threaded through markdown_to_html_node while the node tree is built,
+    # so URL rewriting happens on node props rather than by scanning the finished HTML.
+    # assets maps root-relative asset URLs to their fingerprinted names (see fingerprint.py);
+    # images, when the image stage ran, maps image URLs to their sizes and variants (see images.py).
+    # minify selects whitespace-collapsing serialization (HTMLNode.iter_minified_html).
+    # Every root-relative URL resolved is remembered in refs for the build's dependency graph,
+    # and with search, the words of the page's text nodes are collected in terms (search.py).
+    # With words, the words of the text nodes are counted for the site model (listings.py).
+    # nav holds the site's navigation links for the template's Nav slot (SiteModel.nav_links).
+    # digest is settings_digest(assets, images) when the build has already computed it.
+    def __init__(self, basepath="/", assets=None, images=None, minify=False, search=False, words=False, nav=None, digest=None):
+        self.basepath = basepath
+        self.assets = assets or {}
+        self.images = images
+        self.minify = minify
+        self.refs = set()
+        self.terms = set() if search else None
+        self.words = 0 if words else None
+        self.nav = nav
+        self.digest = digest
+        self.originals = None # reverse of assets, built on the first record_html_refs
+
+    def resolve_url(self, url):
+        # Root-relative URLs are served from under basepath
+        if url.startswith("/"):
+            self.refs.add(url)
+            return self.basepath + self.assets.get(url, url)[1:]
+        return url
+
+    def image_props(self, url):
+        # Extra img attributes: intrinsic size and srcset for known images, lazy loading for all
+        if self.images is None:
+            return {}
+        info = self.images.get(url)
+        if info is None:
+            return {"loading": "lazy"}
+        props = {"width": str(info["width"]), "height": str(info["height"])}
+        if info["srcset"]:
+            candidates = [f"{self.basepath}{variant[1:]} {width}w" for variant, width in info["srcset"]]
+            candidates.append(f"{self.basepath}{self.assets.get(url, url)[1:]} {info['width']}w")
+            props["srcset"] = ", ".join(candidates)
+        props["loading"] = "lazy"
+        return props
+
+    def record_text(self, text_nodes):
+        # Reuse the TextNode stream of each block for the search index and word count.
+        # Image alt text is left out, as it is when the text comes from cached HTML.
+        if self.terms is not None or self.words is not None:
+            self.count_text(" ".join(node.text for node in text_nodes if node.text_type != TextType.IMAGE))
+
+    def record_html_text(self, html):
+        if self.terms is not None or self.words is not None:
+            self.count_text(html_text(html))
+
+    def count_text(self, text):
+        if self.terms is not None:
+            self.terms.update(tokenize(text))
+        if self.words is not None:
+            self.words += len(text.split())
+
+    def record_html_refs(self, html):
+        # Recover refs from already rendered HTML (a render cache hit never builds nodes)
+        originals = self.asset_originals()
+        for url in URL_ATTRIBUTE_PATTERN.findall(html):
+            if url.startswith(self.basepath):
+                path = "/" + url[len(self.basepath):]
+                self.refs.add(originals.get(path, path))
+
+    def asset_originals(self):
+        # Original URL of each fingerprinted asset name; with the build's digest, the map is
+        # built once per build (per process) instead of for every page
+        if self.originals is None:
+            self.originals = _originals_cache.get(self.digest) if self.digest else None
+            if self.originals is None:
+                self.originals = {hashed: url for url, hashed in self.assets.items()}
+                if self.digest:
+                    _originals_cache.clear() # only the current build's settings are kept
+                    _originals_cache[self.digest] = self.originals
+        return self.originals
+
+    def cache_variant(self):
+        # Everything here that changes rendered HTML, for render cache keys
+        variant = (self.basepath, "minify") if self.minify else (self.basepath,)
+        digest = self.digest or settings_digest(self.assets, self.images)
+        return variant + (digest,) if digest is not None else variant
+
+    def __repr__(self):
+        return f"RenderContext(basepath={self.basepath}, assets={len(self.assets)}, minify={self.minify})"
@@ -0,0 +1,144 @@
+import html
+import json
+import os
+import re
+
+SEARCH_STATE_PATH = os.path.join(".buildcache", "search.json")
+SEARCH_DIR = "search" # under the output directory
+SEARCH_VERSION = 1
+TERM_PATTERN = re.compile(r"\w{2,}")
+TAG_PATTERN = re.compile(r"<pre\b.*?</pre>|<[^>]+>", re.DOTALL) # code blocks are not indexed, as in the node path
+
+def tokenize(text):
+    return TERM_PATTERN.findall(text.lower())
+
+def html_text(markup):
+    # The text of already rendered HTML, for pages whose nodes came from the render cache
+    return html.unescape(TAG_PATTERN.sub(" ", markup))
+
+def html_terms(markup):
+    return set(tokenize(html_text(markup)))
+
+def page_url(dest_path, root, basepath="/"):
+    # docs/blog/tom/index.html -> /blog/tom/ (under basepath), as the page is linked and served
+    relative = os.path.relpath(dest_path, root).replace(os.sep, "/")
+    if relative == "index.html":
+        relative = ""
+    elif relative.endswith("/index.html"):
+        relative = relative[:-len("index.html")]
+    return basepath + relative
+
+def shard_key(term):
+    first = term[0]
+    return first if "a" <= first <= "z" or "0" <= first <= "9" else "_"
+
+def delta_encode(ids):
+    # Sorted page ids as gaps, which keeps the numbers (and the JSON) short
+    previous = 0
+    gaps = []
+    for page_id in ids:
+        gaps.append(page_id - previous)
+        previous = page_id
+    return gaps
+
+class SearchIndex():
+    # Inverted index of the site for client-side search, kept between builds so an incremental
+    # build only re-tokenizes the pages it regenerates. Terms come from the TextNode streams
+    # produced while a page is rendered (RenderContext.terms).
+    #
+    # Output, under <dest>/search/: index.json holds {"version", "pages": [[url, title] or null
+    # by page id], "shards": [keys]} and <key>.json maps each term starting with that character
+    # to its delta-encoded list of page ids, so a browser loads only the shard a query needs.
+    # Page ids are stable across builds and shards are only rewritten when they change.
+    def __init__(self, path=SEARCH_STATE_PATH, pages=None):
+        self.path = path
+        self.pages = pages if pages is not None else {} # dest_path -> {"id", "url", "title", "terms"}
+        self._used_ids = None # ids in use, built on the first free_id call
+        self._next_id = 0
+
+    @classmethod
+    def load(cls, path=SEARCH_STATE_PATH):
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return cls(path) # pages missing from the index get regenerated
+        if data.get("version") != SEARCH_VERSION:
+            return cls(path)
+        return cls(path, data["pages"])
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({"version": SEARCH_VERSION, "pages": self.pages}, file, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def update(self, dest_path, url, title, terms):
+        entry = self.pages.get(dest_path)
+        page_id = entry["id"] if entry is not None else self.free_id()
+        self.pages[dest_path] = {"id": page_id, "url": url, "title": title, "terms": sorted(terms)}
+
+    def free_id(self):
+        # Lowest id not in use, so ids of removed pages are reused and the page list stays dense
+        if self._used_ids is None:
+            self._used_ids = {entry["id"] for entry in self.pages.values()}
+            self._next_id = 0
+        while self._next_id in self._used_ids:
+            self._next_id += 1
+        self._used_ids.add(self._next_id)
+        return self._next_id
+
+    def prune(self, dest_paths):
+        # Drop pages that are no longer part of the site; returns the removed dest paths
+        keep = set(dest_paths)
+        removed = sorted(dest_path for dest_path in self.pages if dest_path not in keep)
+        for dest_path in removed:
+            del self.pages[dest_path]
+        self._used_ids = None
+        return removed
+
+    def shards(self):
+        postings = {}
+        for entry in self.pages.values():
+            for term in entry["terms"]:
+                postings.setdefault(term, []).append(entry["id"])
+        shards = {}
+        for term, ids in postings.items():
+            shards.setdefault(shard_key(term), {})[term] = delta_encode(sorted(ids))
+        return shards
+
+    def write(self, dest_dir):
+        # Write the index files under dest_dir/search; returns how many files changed
+        directory = os.path.join(dest_dir, SEARCH_DIR)
+        os.makedirs(directory, exist_ok=True)
+        page_list = [None] * (max((entry["id"] for entry in self.pages.values()), default=-1) + 1)
+        for entry in self.pages.values():
+            page_list[entry["id"]] = [entry["url"], entry["title"]]
+        shards = self.shards()
+        files = {"index.json": {"version": SEARCH_VERSION, "pages": page_list, "shards": sorted(shards)}}
+        for key, terms in shards.items():
+            files[f"{key}.json"] = terms
+
+        written = 0
+        for name, data in files.items():
+            written += write_if_changed(os.path.join(directory, name), json.dumps(data, separators=(",", ":"), sort_keys=True))
+        for name in os.listdir(directory):
+            if name.endswith(".json") and name not in files:
+                os.remove(os.path.join(directory, name)) # shard with no terms left; its .gz/.br go with compress_tree
+                written += 1
+        return written
+
+def write_if_changed(path, text):
+    # Leave an identical file (and its mtime, for compression and caches) alone
+    try:
+        with open(path, 'r') as file:
+            if file.read() == text:
+                return 0
+    except FileNotFoundError:
+        pass
+    with open(path, 'w') as file:
+        file.write(text)
+    return 1
@@ -0,0 +1,244 @@
+# Development server: builds the site, then serves docs/ while polling sources and rebuilding
+# only what changed. Usage: python3 src/main.py serve [basepath] [--port 8888]
+import argparse
+import asyncio
+import email.utils
+import mimetypes
+import os
+import time
+from urllib.parse import unquote, urlsplit
+
+from main import copy_source_static_to_destination_public_directory, find_markdown_files, generate_page, generate_pages_recursive, site_navigation, PageBuildError
+from instrument import log
+from listings import SiteModel
+from manifest import MANIFEST_PATH, BuildManifest
+from render_cache import configure_render_cache
+from template import TEMPLATE_NAME, cached_template_files, clear_template_cache, mtime_ns, resolve_template
+
+def scan_files(root, suffix=""):
+    # Map every file under root (or root itself if it is a file) to its mtime
+    if os.path.isfile(root):
+        return {root: os.stat(root).st_mtime_ns}
+    files = {}
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.name.endswith(suffix):
+                    files[entry.path] = entry.stat().st_mtime_ns
+    return files
+
+def diff_snapshots(old, new):
+    # (added or modified paths, removed paths)
+    changed = [path for path, mtime in new.items() if old.get(path) != mtime]
+    removed = [path for path in old if path not in new]
+    return changed, removed
+
+class SiteWatcher():
+    # Keeps the manifest, compiled template and render cache warm between rebuilds and
+    # regenerates only the pages and assets whose sources changed
+    def __init__(self, basepath="/", content="content", static="static", template_path="template.html", dest="docs", manifest_path=MANIFEST_PATH):
+        self.basepath = basepath
+        self.content = content
+        self.static = static
+        self.template_path = template_path
+        self.dest = dest
+        self.manifest = BuildManifest.load(manifest_path)
+        self.site = SiteModel(None, listings=False) # page titles for the Nav slot
+        self.snapshots = {}
+
+    def take_snapshots(self):
+        # Templates: the default, any template.html in content/ and every partial or base loaded so far
+        templates = scan_files(self.template_path)
+        templates.update((path, mtime) for path, mtime in scan_files(self.content, TEMPLATE_NAME).items() if os.path.basename(path) == TEMPLATE_NAME)
+        templates.update((path, mtime_ns(path)) for path in cached_template_files() if path not in templates)
+        return {
+            "content": scan_files(self.content, ".md"),
+            "static": scan_files(self.static),
+            "template": templates,
+        }
+
+    def build(self):
+        # Initial build; the manifest makes it incremental relative to the last run
+        self.snapshots = self.take_snapshots()
+        copy_source_static_to_destination_public_directory(self.static, self.dest, False, self.manifest)
+        try:
+            generate_pages_recursive(self.basepath, self.content, self.template_path, self.dest, self.manifest, site=self.site)
+        except PageBuildError as error:
+            print(f"{len(error.failures)} page(s) failed; fix them and save to rebuild")
+        self.manifest.prune(self.dest)
+        self.manifest.save()
+
+    def poll(self):
+        # Compare mtimes with the last snapshot and rebuild what changed; returns rebuilt outputs
+        snapshots = self.take_snapshots()
+        rebuilt = []
+        if snapshots["static"] != self.snapshots["static"]:
+            copy_source_static_to_destination_public_directory(self.static, self.dest, False, self.manifest)
+            rebuilt.append(self.dest)
+        if snapshots["template"] != self.snapshots["template"]:
+            clear_template_cache()
+            for path in set(snapshots["template"]).union(self.snapshots["template"]):
+                self.manifest.forget_hash(path)
+        changed, removed = diff_snapshots(self.snapshots["content"], snapshots["content"])
+        for from_path in changed:
+            self.manifest.forget_hash(from_path)
+        if changed or removed: # titles in the navigation and drafts may have changed
+            self.site.scan(find_markdown_files(self.content, self.dest), self.content, self.dest, self.basepath)
+        if snapshots == self.snapshots:
+            return rebuilt
+
+        # Removed sources and pages turned into drafts lose their output
+        pages = [(from_path, entry["dest"]) for from_path, entry in self.site.pages.items()]
+        published = {dest_path for _, dest_path in pages}
+        for dest_path in [dest_path for dest_path in self.manifest.pages if dest_path not in published]:
+            self.manifest.discard(dest_path, self.dest)
+            rebuilt.append(dest_path)
+
+        # As in an incremental build, the manifest decides which pages are stale: the ones whose source
+        # or resolved template (with what it extends and includes) changed, every page when the
+        # navigation changed, and pages linking to a page or asset that appeared, moved or vanished
+        directories = {}
+        templates = {from_path: resolve_template(from_path, self.content, self.template_path, self.site.pages[from_path]["template"], directories)
+                     for from_path, _ in pages}
+        nav = site_navigation(self.site, set(templates.values()))
+        options = {"nav": nav} if nav is not None else None
+        self.manifest.options = {"nav": nav} if nav is not None else {} # a new dict: recorded pages keep the old one
+        self.manifest.index_outputs(self.dest, pages)
+        for from_path, dest_path, _ in self.manifest.rebuild_set(self.basepath, pages, self.template_path, templates):
+            try:
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                info = generate_page(self.basepath, from_path, templates[from_path], dest_path, options)
+            except Exception as error:
+                print(f"Error generating page from {from_path}: {type(error).__name__}: {error}")
+                continue
+            self.manifest.record(self.basepath, from_path, templates[from_path], dest_path, info["refs"])
+            rebuilt.append(dest_path)
+
+        self.snapshots = snapshots
+        if rebuilt:
+            self.manifest.save()
+        return rebuilt
+
+    async def watch(self, interval=0.25):
+        while True:
+            await asyncio.sleep(interval)
+            start = time.perf_counter()
+            try:
+                rebuilt = self.poll()
+            except OSError as error: # e.g. a file vanished mid-scan; the next poll catches up
+                print(f"Rebuild skipped: {error}")
+                continue
+            if rebuilt:
+                print(f"Rebuilt {len(rebuilt)} output(s) in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+class StaticFileServer():
+    # Minimal asyncio HTTP/1.1 server for docs/ with ETag/Last-Modified validation
+    def __init__(self, root="docs", basepath="/"):
+        self.root = os.path.abspath(root)
+        self.basepath = basepath
+
+    def resolve(self, target):
+        # Map a request target to a file under root, or None
+        path = unquote(urlsplit(target).path)
+        if self.basepath != "/" and path.startswith(self.basepath):
+            path = "/" + path[len(self.basepath):] # pages link to basepath-prefixed URLs
+        full_path = os.path.normpath(os.path.join(self.root, path.lstrip("/")))
+        if full_path != self.root and not full_path.startswith(self.root + os.sep):
+            return None # path traversal
+        if os.path.isdir(full_path):
+            full_path = os.path.join(full_path, "index.html")
+        elif not os.path.exists(full_path) and os.path.exists(full_path + ".html"):
+            full_path += ".html"
+        return full_path if os.path.isfile(full_path) else None
+
+    def respond(self, method, target, headers):
+        # (status line, headers, body) for one request
+        if method not in ("GET", "HEAD"):
+            return "405 Method Not Allowed", {"Allow": "GET, HEAD", "Content-Length": "0"}, b""
+        path = self.resolve(target)
+        if path is None:
+            body = b"Not Found"
+            return "404 Not Found", {"Content-Type": "text/plain", "Content-Length": str(len(body))}, body
+
+        stat = os.stat(path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        response_headers = {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": "no-cache"}
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+                return "304 Not Modified", response_headers, b""
+        elif "if-modified-since" in headers:
+            try:
+                since = email.utils.parsedate_to_datetime(headers["if-modified-since"]).timestamp()
+            except (TypeError, ValueError):
+                since = None
+            if since is not None and int(stat.st_mtime) <= since:
+                return "304 Not Modified", response_headers, b""
+
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+        response_headers["Content-Type"] = content_type
+        response_headers["Content-Length"] = str(stat.st_size)
+        if method == "HEAD":
+            return "200 OK", response_headers, b""
+        with open(path, 'rb') as file:
+            return "200 OK", response_headers, file.read()
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            parts = request_line.decode("latin-1").split()
+            if len(parts) != 3:
+                status, response_headers, body = "400 Bad Request", {"Content-Length": "0"}, b""
+                method = target = "-"
+            else:
+                method, target, _ = parts
+                status, response_headers, body = self.respond(method, target, headers)
+            response_headers["Connection"] = "close"
+            head = f"HTTP/1.1 {status}\r\n" + "".join(f"{name}: {value}\r\n" for name, value in response_headers.items()) + "\r\n"
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+            log(f"{method} {target} {status.split()[0]}")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(watcher, server, host="127.0.0.1", port=8888, interval=0.25):
+    http_server = await asyncio.start_server(server.handle, host, port)
+    print(f"Serving {server.root} at http://{host}:{port}{watcher.basepath} (Ctrl+C to stop)")
+    async with http_server:
+        await asyncio.gather(http_server.serve_forever(), watcher.watch(interval))
+
+def serve_main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Build the site, serve docs/ and rebuild on change.")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--interval", type=float, default=0.25, help="seconds between source polls")
+    parser.add_argument("--render-cache", type=int, default=4096, metavar="ENTRIES", help="in-memory render cache size")
+    args = parser.parse_args(argv)
+
+    configure_render_cache(args.render_cache) # stays warm for the life of the server
+    watcher = SiteWatcher(args.basepath)
+    watcher.build()
+    try:
+        asyncio.run(serve(watcher, StaticFileServer("docs", args.basepath), args.host, args.port, args.interval))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    serve_main()
@@ -0,0 +1,247 @@
+import os
+import re
+
+from render_context import URL_ATTRIBUTE_PATTERN
+
+# Placeholders a template may use; anything else in {{ }} is left as literal text
+TEMPLATE_SLOTS = ("Title", "Content", "Date", "Description", "Nav")
+SLOT_PATTERN = re.compile(r"\{\{ (" + "|".join(TEMPLATE_SLOTS) + r") \}\}")
+# Elements whose contents keep their whitespace, and elements around which whitespace never renders
+PRESERVED_PATTERN = re.compile(r"(<(pre|textarea|script|style)\b.*?</\2\s*>)", re.DOTALL | re.IGNORECASE)
+BLOCK_TAG_PATTERN = re.compile(
+    r" ?(<!doctype[^>]*>|</?(?:html|head|body|meta|link|title|base|article|section|nav|header|footer|main|aside"
+    r"|div|p|ul|ol|li|h[1-6]|blockquote|table|thead|tbody|tr|td|th|hr|br)\b[^>]*>) ?", re.IGNORECASE)
+
+# Inheritance and partials, resolved into one text before the template is compiled
+EXTENDS_PATTERN = re.compile(r'\A\s*\{% extends "([^"]+)" %\}')
+INCLUDE_PATTERN = re.compile(r'\{% include "([^"]+)" %\}')
+BLOCK_MARKER_PATTERN = re.compile(r"\{% (?:block (\w+)|endblock) %\}") # blocks may nest, so they are matched by parse_blocks
+TEMPLATE_NAME = "template.html" # a content directory's own template, for the pages in and below it
+
+_expanded_cache = {} # template_path -> (text, ((file, mtime_ns), ...)) of it and the files it extends or includes
+_template_cache = {} # (template_path, basepath, asset items, minify) -> (file mtimes, Template), shared by every page of a build
+
+class Template():
+    # A template parsed once into literal segments and named slots.
+    # parts holds the literals with None placeholders where slots go; slots maps each
+    # slot index to its name so rendering is one fill-in plus a single join.
+    # refs lists the root-relative URLs the literal markup links to; minify is passed on to
+    # node values so they serialize minified like the literals around them.
+    # files lists the template and the files it extends or includes.
+    def __init__(self, parts, slots, refs=(), minify=False, files=()):
+        self.parts = parts
+        self.slots = slots
+        self.slot_names = dict(slots)
+        self.refs = refs
+        self.minify = minify
+        self.files = files
+
+    def render(self, values):
+        parts = self.parts.copy()
+        for index, name in self.slots:
+            parts[index] = values.get(name, "")
+        return "".join(parts)
+
+    def write(self, fp, values):
+        # Stream the page into fp. Slot values may be strings or HTMLNode trees; trees are
+        # serialized straight into fp instead of being rendered to a string first.
+        for index, part in enumerate(self.parts):
+            if part is not None:
+                fp.write(part)
+                continue
+            value = values.get(self.slot_names[index], "")
+            if isinstance(value, str):
+                fp.write(value)
+            else:
+                value.write_html(fp, self.minify)
+
+    def __repr__(self):
+        return f"Template(parts={self.parts}, slots={self.slots})"
+
+def compile_template(text, basepath="/", assets=None, minify=False):
+    # Split the template on its placeholders. Root-relative href/src attributes in the
+    # literal markup are pointed at basepath (and at fingerprinted asset names from assets)
+    # and, with minify, its whitespace is collapsed here, once, instead of on every rendered page.
+    if minify:
+        text = minify_markup(text)
+    parts = []
+    slots = []
+    position = 0
+    for match in SLOT_PATTERN.finditer(text):
+        parts.append(rewrite_root_urls(text[position:match.start()], basepath, assets))
+        slots.append((len(parts), match.group(1)))
+        parts.append(None)
+        position = match.end()
+    parts.append(rewrite_root_urls(text[position:], basepath, assets))
+    refs = tuple(sorted({url for url in URL_ATTRIBUTE_PATTERN.findall(SLOT_PATTERN.sub("", text)) if url.startswith("/")}))
+    return Template(parts, slots, refs, minify)
+
+def minify_markup(markup):
+    # Collapse whitespace runs to one space and drop it next to block-level tags, leaving
+    # <pre>, <textarea>, <script> and <style> contents untouched
+    pieces = PRESERVED_PATTERN.split(markup)
+    minified = []
+    for index in range(0, len(pieces), 3): # split() yields text, whole element, tag name, text, ...
+        text = re.sub(r"[ \t\n\r\f]+", " ", pieces[index])
+        minified.append(BLOCK_TAG_PATTERN.sub(r"\1", text))
+        if index + 1 < len(pieces):
+            minified.append(pieces[index + 1])
+    return "".join(minified).strip(" ")
+
+def rewrite_root_urls(markup, basepath, assets=None):
+    if assets:
+        def replace(match):
+            url = match.group(1)
+            if not url.startswith("/"):
+                return match.group(0)
+            prefix = match.group(0)[:match.start(1) - match.start(0)]
+            return f'{prefix}{basepath}{assets.get(url, url)[1:]}"'
+        return URL_ATTRIBUTE_PATTERN.sub(replace, markup)
+    if basepath == "/":
+        return markup
+    return markup.replace('href="/', f'href="{basepath}').replace('src="/', f'src="{basepath}')
+
+def expand_template(template_path, parents=()):
+    # The text of template_path with its includes inlined and, when it starts with
+    # {% extends "base.html" %}, the base's text with the {% block name %}s it defines replaced.
+    # Blocks stay marked so a further child can override them; compiling drops the markers.
+    # Paths are relative to the directory of the template naming them. Returns (text, files).
+    if template_path in parents:
+        raise ValueError(f"Template {template_path} includes or extends itself")
+    parents = parents + (template_path,)
+    directory = os.path.dirname(template_path)
+    with open(template_path, 'r') as file:
+        text = file.read()
+    files = [template_path]
+
+    def include(match):
+        included, included_files = expand_template(os.path.join(directory, match.group(1)), parents)
+        files.extend(included_files)
+        return included
+    text = INCLUDE_PATTERN.sub(include, text)
+
+    extends = EXTENDS_PATTERN.match(text)
+    if extends:
+        base, base_files = expand_template(os.path.join(directory, extends.group(1)), parents)
+        files.extend(base_files)
+        blocks = {}
+        collect_blocks(parse_blocks(text, template_path), blocks)
+        text = join_blocks(parse_blocks(base, template_path), blocks)
+    return text, files
+
+def parse_blocks(text, template_path):
+    # Split text on its {% block name %} ... {% endblock %} markers, keeping their nesting:
+    # a list of literal strings and (name, contents) pairs whose contents is such a list again
+    root = []
+    stack = [(None, root)]
+    position = 0
+    for match in BLOCK_MARKER_PATTERN.finditer(text):
+        stack[-1][1].append(text[position:match.start()])
+        position = match.end()
+        if match.group(1):
+            contents = []
+            stack[-1][1].append((match.group(1), contents))
+            stack.append((match.group(1), contents))
+        elif len(stack) == 1:
+            raise ValueError(f"Template {template_path} has an {{% endblock %}} without a block")
+        else:
+            stack.pop()
+    if len(stack) > 1:
+        raise ValueError(f"Template {template_path} does not close {{% block {stack[-1][0]} %}}")
+    root.append(text[position:])
+    return root
+
+def collect_blocks(items, blocks):
+    # Map the name of every block in items, nested ones included, to its contents
+    for item in items:
+        if not isinstance(item, str):
+            blocks.setdefault(item[0], item[1])
+            collect_blocks(item[1], blocks)
+
+def join_blocks(items, blocks):
+    # Text of items with each block's contents replaced by the override in blocks, if any.
+    # Blocks kept from the base are joined the same way, so a block nested in one can be overridden.
+    parts = []
+    for item in items:
+        if isinstance(item, str):
+            parts.append(item)
+        else:
+            name, contents = item
+            parts.append(f"{{% block {name} %}}{join_blocks(blocks.get(name, contents), blocks)}{{% endblock %}}")
+    return "".join(parts)
+
+def load_expanded(template_path):
+    # expand_template, redone only when the mtime of one of the files involved changes
+    cached = _expanded_cache.get(template_path)
+    if cached is not None and all(mtime_ns(path) == mtime for path, mtime in cached[1]):
+        return cached
+    text, files = expand_template(template_path)
+    cached = (text, tuple((path, mtime_ns(path)) for path in dict.fromkeys(files)))
+    _expanded_cache[template_path] = cached
+    return cached
+
+def mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def template_files(template_path):
+    # The template and every file it extends or includes
+    return [path for path, _ in load_expanded(template_path)[1]]
+
+def template_slots(template_path):
+    # Names of the placeholders template_path (with what it extends and includes) uses
+    return {match.group(1) for match in SLOT_PATTERN.finditer(load_expanded(template_path)[0])}
+
+def cached_template_files():
+    # Every file the templates loaded so far depend on, for watching
+    return sorted({path for _, stamps in _expanded_cache.values() for path, _ in stamps})
+
+def load_template(template_path, basepath="/", assets=None, minify=False, digest=None):
+    # Read and compile template_path (with what it extends and includes) at most once per build
+    # (per process) for each set of options; cached by path and mtime, so an edited template or
+    # partial is recompiled on the next page without clearing the cache. digest, the build's
+    # settings_digest, stands in for assets in the cache key so they are not sorted for every page.
+    text, stamps = load_expanded(template_path)
+    assets_key = digest if digest is not None else (tuple(sorted(assets.items())) if assets else ())
+    key = (template_path, basepath, assets_key, minify)
+    cached = _template_cache.get(key)
+    if cached is None or cached[0] != stamps:
+        template = compile_template(BLOCK_MARKER_PATTERN.sub("", text), basepath, assets, minify)
+        template.files = tuple(path for path, _ in stamps)
+        cached = (stamps, template)
+        _template_cache[key] = cached
+    return cached[1]
+
+def resolve_template(from_path, content_dir, default_path, name=None, directories=None):
+    # The template for the page at from_path: name from its front matter (relative to the default
+    # template's directory), else the nearest template.html in its directory or one above it
+    # within content_dir, else default_path. directories memoizes lookups across pages.
+    if name:
+        return os.path.join(os.path.dirname(default_path), name)
+    directory = os.path.dirname(from_path)
+    content_dir = os.path.normpath(content_dir)
+    searched = []
+    template_path = default_path
+    while True:
+        if directories is not None and directory in directories:
+            template_path = directories[directory]
+            break
+        searched.append(directory)
+        candidate = os.path.join(directory, TEMPLATE_NAME)
+        if os.path.isfile(candidate):
+            template_path = candidate
+            break
+        parent = os.path.dirname(directory)
+        if os.path.normpath(directory) == content_dir or parent == directory:
+            break
+        directory = parent
+    if directories is not None:
+        for path in searched:
+            directories[path] = template_path
+    return template_path
+
+def clear_template_cache():
+    _template_cache.clear()
+    _expanded_cache.clear()
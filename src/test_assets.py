@@ -0,0 +1,101 @@
+import os
+import unittest
+from unittest import mock
+
+from assets import copy_file, place_file, sync_tree
+from fixtures import TempDirTestCase
+
+class TestSyncTree(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.src = os.path.join(self.tmp.name, "static")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.write(os.path.join(self.src, "index.css"), "body {}")
+        self.write(os.path.join(self.src, "images", "a.png"), "png-bytes")
+
+    def read(self, path):
+        with open(path) as file:
+            return file.read()
+
+    def test_copy_file_preserves_content_and_mtime(self):
+        src = os.path.join(self.src, "big.bin")
+        with open(src, 'wb') as file:
+            file.write(os.urandom(3 * 1024 * 1024 + 17))
+        os.utime(src, ns=(1_000_000_000, 1_000_000_000))
+        dest = os.path.join(self.tmp.name, "copy.bin")
+        copy_file(src, dest)
+        with open(src, 'rb') as a, open(dest, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+        self.assertEqual(os.stat(dest).st_mtime_ns, 1_000_000_000)
+
+    def test_initial_sync_copies_everything(self):
+        synced, stats = sync_tree(self.src, self.dest)
+        self.assertEqual(stats["copied"], 2)
+        self.assertEqual(synced[os.path.join(self.dest, "images", "a.png")], os.path.join(self.src, "images", "a.png"))
+        self.assertEqual(self.read(os.path.join(self.dest, "index.css")), "body {}")
+
+    def test_noop_sync_copies_nothing(self):
+        previous, _ = sync_tree(self.src, self.dest)
+        _, stats = sync_tree(self.src, self.dest, previous)
+        self.assertEqual(stats, {"copied": 0, "unchanged": 2, "removed": 0})
+
+    def test_changed_file_is_copied(self):
+        previous, _ = sync_tree(self.src, self.dest)
+        self.write(os.path.join(self.src, "index.css"), "body { color: red }")
+        _, stats = sync_tree(self.src, self.dest, previous)
+        self.assertEqual(stats["copied"], 1)
+        self.assertEqual(self.read(os.path.join(self.dest, "index.css")), "body { color: red }")
+
+    def test_checksum_detects_same_size_edit(self):
+        previous, _ = sync_tree(self.src, self.dest)
+        dest_css = os.path.join(self.dest, "index.css")
+        self.write(dest_css, "BODY {}")
+        src_stat = os.stat(os.path.join(self.src, "index.css"))
+        os.utime(dest_css, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+        _, stats = sync_tree(self.src, self.dest, previous)
+        self.assertEqual(stats["copied"], 0) # size and mtime match, so only a hash can tell
+        _, stats = sync_tree(self.src, self.dest, previous, checksum=True)
+        self.assertEqual(stats["copied"], 1)
+        self.assertEqual(self.read(dest_css), "body {}")
+
+    def test_removed_source_is_deleted_but_pages_kept(self):
+        previous, _ = sync_tree(self.src, self.dest)
+        self.write(os.path.join(self.dest, "index.html"), "<html></html>") # generated page, not a static asset
+        os.remove(os.path.join(self.src, "images", "a.png"))
+        _, stats = sync_tree(self.src, self.dest, previous)
+        self.assertEqual(stats["removed"], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "images")))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "index.html")))
+
+    def test_hardlink_mode_shares_data(self):
+        sync_tree(self.src, self.dest, link_mode="hardlink")
+        self.assertTrue(os.path.samefile(os.path.join(self.src, "index.css"), os.path.join(self.dest, "index.css")))
+
+    def test_symlink_mode_links_relative_and_removes_dangling(self):
+        previous, _ = sync_tree(self.src, self.dest, link_mode="symlink")
+        dest_png = os.path.join(self.dest, "images", "a.png")
+        self.assertEqual(os.readlink(dest_png), os.path.join("..", "..", "static", "images", "a.png"))
+        self.assertEqual(self.read(dest_png), "png-bytes")
+        os.remove(os.path.join(self.src, "images", "a.png"))
+        _, stats = sync_tree(self.src, self.dest, previous, link_mode="symlink")
+        self.assertEqual(stats["removed"], 1)
+        self.assertFalse(os.path.lexists(dest_png))
+
+    def test_switching_modes_never_writes_into_source(self):
+        previous, _ = sync_tree(self.src, self.dest, link_mode="hardlink")
+        previous, stats = sync_tree(self.src, self.dest, previous, link_mode="symlink")
+        self.assertEqual(stats["copied"], 2)
+        _, stats = sync_tree(self.src, self.dest, previous, link_mode="copy")
+        dest_css = os.path.join(self.dest, "index.css")
+        self.assertFalse(os.path.islink(dest_css))
+        self.assertEqual(self.read(os.path.join(self.src, "index.css")), "body {}")
+
+    def test_link_failure_falls_back_to_copy(self):
+        dest = os.path.join(self.tmp.name, "out.css")
+        with mock.patch("os.link", side_effect=OSError(18, "Invalid cross-device link")):
+            self.assertEqual(place_file(os.path.join(self.src, "index.css"), dest, "hardlink"), "copy")
+        self.assertEqual(self.read(dest), "body {}")
+        self.assertIn(place_file(os.path.join(self.src, "index.css"), dest, "auto"), ("reflink", "hardlink"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
+import io
 import unittest
 
-from block_markdown import BlockType, extract_title, markdown_to_blocks, block_to_block_type, markdown_to_html_node
+from block_markdown import BlockType, MarkdownStream, extract_title, iter_block_nodes, markdown_to_blocks, block_to_block_type, markdown_to_html_node
 
 class TestMarkdowntoBlocks(unittest.TestCase):
     # Test markdown text to separate blocks of grouped text
@@ -141,6 +142,66 @@ Code block
         self.assertEqual(html_node.children[4].tag, "pre")
         self.assertEqual(html_node.children[5].tag, "blockquote")
 
+class TestStreamingBlockParser(unittest.TestCase):
+    def test_fenced_code_with_blank_lines(self):
+        md = "Intro\n\n```\nfirst\n\n    indented\n```\n\nOutro"
+        self.assertEqual(markdown_to_blocks(md), ["Intro", "```\nfirst\n\n    indented\n```", "Outro"])
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><p>Intro</p><pre><code>first\n\n    indented</code></pre><p>Outro</p></div>",
+        )
+
+    def test_code_escaped_once(self):
+        md = "Use `<b>` & co\n\n```\nif x < 1 and y > 2:\n    print(\"&amp;\")\n```"
+        expected = "<div><p>Use <code>&lt;b></code> &amp; co</p><pre><code>if x &lt; 1 and y > 2:\n    print(\"&amp;amp;\")</code></pre></div>"
+        self.assertEqual(markdown_to_html_node(md).to_html(), expected)
+        buffer = io.StringIO()
+        MarkdownStream(io.StringIO(md)).write_html(buffer)
+        self.assertEqual(buffer.getvalue(), expected)
+
+    def test_backticks_at_end_of_code_line_do_not_close_fence(self):
+        md = 'Intro\n\n```\ns = "```"\n\nprint(s)\n```\n\nOutro'
+        self.assertEqual(markdown_to_blocks(md), ["Intro", '```\ns = "```"\n\nprint(s)\n```', "Outro"])
+        self.assertEqual(markdown_to_html_node(md).to_html(),
+                         '<div><p>Intro</p><pre><code>s = "```"\n\nprint(s)</code></pre><p>Outro</p></div>')
+
+    def test_unterminated_fence_falls_back_to_paragraphs(self):
+        self.assertEqual(markdown_to_blocks("```\ncode\n\nmore"), ["```\ncode", "more"])
+
+    def test_blocks_from_file_object(self):
+        source = io.StringIO("# Title\n\n- a\n- b\n\ntext\n")
+        nodes = list(iter_block_nodes(source))
+        self.assertEqual([node.tag for node in nodes], ["h1", "ul", "p"])
+
+    def test_markdown_stream_matches_tree(self):
+        md = "# Title\n\nSome **bold**\n\n> quote\n\n1. one\n2. two"
+        buffer = io.StringIO()
+        MarkdownStream(io.StringIO(md)).write_html(buffer)
+        self.assertEqual(buffer.getvalue(), markdown_to_html_node(md).to_html())
+
+    def test_markdown_stream_finds_title_in_the_same_pass(self):
+        md = "Intro\n\n# Title\n\nSome **bold**"
+        source = io.StringIO(md)
+        stream = MarkdownStream(source)
+        self.assertEqual(stream.find_title(), "Title")
+        self.assertEqual(source.read(), "Some **bold**") # read ahead only to the heading
+        source.seek(0)
+        stream = MarkdownStream(source)
+        stream.find_title()
+        buffer = io.StringIO()
+        stream.write_html(buffer)
+        self.assertEqual(buffer.getvalue(), markdown_to_html_node(md).to_html())
+
+    def test_markdown_stream_empty_document(self):
+        buffer = io.StringIO()
+        MarkdownStream("").write_html(buffer)
+        self.assertEqual(buffer.getvalue(), markdown_to_html_node("").to_html())
+
+    def test_extract_title_stops_at_first_heading(self):
+        source = io.StringIO("# Title\n\nbody\n")
+        self.assertEqual(extract_title(source), "Title")
+        self.assertEqual(source.read(), "body\n") # rest of the file left unread
+
 class TestExtractTitle(unittest.TestCase):
     def test_valid_title(self):
         markdown = """
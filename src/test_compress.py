@@ -0,0 +1,46 @@
+import gzip
+import os
+import unittest
+
+from compress import compress_tree, plan_compression
+from fixtures import TempDirTestCase
+
+class TestCompressTree(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.tmp.name
+        self.page = os.path.join(self.root, "blog", "index.html")
+        self.write(self.page, "<p>hobbit</p>" * 200)
+        self.write(os.path.join(self.root, "small.css"), "body {}")
+        self.write(os.path.join(self.root, "image.png"), "x" * 5000)
+        self.write(os.path.join(self.root, "archive.tar.gz"), "a static download") # never a stale sibling
+
+    def test_writes_gzip_siblings_above_threshold(self):
+        stats = compress_tree(self.root, min_size=100)
+        self.assertEqual(stats["compressed"], 1)
+        with gzip.open(self.page + ".gz", 'rt') as file:
+            self.assertEqual(file.read(), "<p>hobbit</p>" * 200)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "small.css.gz")))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "image.png.gz")))
+
+    def test_fresh_siblings_are_skipped(self):
+        compress_tree(self.root, min_size=100)
+        self.assertEqual(plan_compression(self.root, 100, (".gz",)), ([], []))
+        stat = os.stat(self.page + ".gz")
+        os.utime(self.page, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000)) # page rewritten since
+        self.assertEqual(plan_compression(self.root, 100, (".gz",)), ([(self.page, (".gz",))], []))
+
+    def test_parallel_matches_serial_and_stale_siblings_are_removed(self):
+        for index in range(4):
+            self.write(os.path.join(self.root, f"page{index}.html"), f"<p>{index}</p>" * 300)
+        compress_tree(self.root, jobs=2, min_size=100)
+        with gzip.open(os.path.join(self.root, "page3.html.gz"), 'rt') as file:
+            self.assertEqual(file.read(), "<p>3</p>" * 300)
+        os.remove(os.path.join(self.root, "page3.html"))
+        stats = compress_tree(self.root, min_size=100)
+        self.assertEqual((stats["compressed"], stats["removed"]), (0, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "page3.html.gz")))
+        self.assertTrue(os.path.exists(os.path.join(self.root, "archive.tar.gz")))
+
+if __name__ == "__main__":
+    unittest.main()
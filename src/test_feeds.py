@@ -0,0 +1,96 @@
+import os
+import re
+import unittest
+
+from feeds import FeedWriter, SitemapWriter
+from fixtures import TempDirTestCase
+from listings import SiteModel
+from main import PageBuildError, generate_pages_recursive
+from manifest import BuildManifest
+
+TEMPLATE = "<title>{{ Title }}</title><body>{{ Content }}</body>"
+
+def page(url, date=None, title=None):
+    return {"url": url, "date": date, "title": title}
+
+class TestWriters(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dest = self.tmp.name
+
+    def read(self, name):
+        with open(os.path.join(self.dest, name), 'r') as file:
+            return file.read()
+
+    def test_single_sitemap(self):
+        sitemap = SitemapWriter(self.dest, "https://example.com/", "/site/")
+        sitemap.add(page("/site/", "2024-01-03"))
+        sitemap.add(page("/site/a&b/"))
+        self.assertEqual(sitemap.close(), ["sitemap.xml"])
+        self.assertIn("<url><loc>https://example.com/site/</loc><lastmod>2024-01-03</lastmod></url>", self.read("sitemap.xml"))
+        self.assertIn("<loc>https://example.com/site/a&amp;b/</loc>", self.read("sitemap.xml"))
+
+    def test_sitemap_index_past_the_limit(self):
+        sitemap = SitemapWriter(self.dest, "https://example.com", "/", limit=2)
+        for index in range(5):
+            sitemap.add(page(f"/{index}/"))
+        self.assertEqual(sitemap.close(), ["sitemap-1.xml", "sitemap-2.xml", "sitemap-3.xml", "sitemap.xml"])
+        self.assertEqual(re.findall(r"<loc>([^<]+)</loc>", self.read("sitemap.xml")),
+                         [f"https://example.com/sitemap-{number}.xml" for number in (1, 2, 3)])
+        self.assertEqual(self.read("sitemap-3.xml").count("<url>"), 1)
+
+        sitemap = SitemapWriter(self.dest, "https://example.com", "/", limit=2)
+        sitemap.add(page("/"))
+        sitemap.close()
+        self.assertEqual(sorted(os.listdir(self.dest)), ["sitemap.xml"]) # parts of the larger build removed
+
+    def test_feed_keeps_the_most_recent_entries(self):
+        feed = FeedWriter(self.dest, "https://example.com", "/", "Posts", limit=2)
+        for day in (3, 1, 4, 2):
+            feed.add(page(f"/{day}/", f"2024-01-0{day}", f"Day {day}"))
+        feed.add(page("/undated/"))
+        self.assertEqual(len(feed.heap), 2)
+        feed.close()
+        rss = self.read("rss.xml")
+        self.assertEqual(re.findall(r"<title>([^<]+)</title>", rss), ["Posts", "Day 4", "Day 3"])
+        self.assertIn("<pubDate>Thu, 04 Jan 2024 00:00:00 +0000</pubDate>", rss)
+        atom = self.read("atom.xml")
+        self.assertIn("<updated>2024-01-04T00:00:00+00:00</updated>", atom)
+        self.assertEqual(atom.count("<entry>"), 2)
+
+class TestStreamedBuild(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.template = os.path.join(self.tmp.name, "template.html")
+        self.write(self.template, TEMPLATE)
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        for name in ("a", "b", "c"):
+            self.write(os.path.join(self.content, "blog", name, "index.md"), f"---\ndate: 2024-01-0{ord(name) - 96}\n---\n# Post {name}")
+
+    def build(self, manifest=None):
+        sitemap = SitemapWriter(self.dest, "https://example.com")
+        try:
+            generate_pages_recursive("/", self.content, self.template, self.dest, manifest, site=SiteModel(None, listings=False), writers=[sitemap])
+        finally:
+            sitemap.close()
+        with open(os.path.join(self.dest, "sitemap.xml"), 'r') as file:
+            return re.findall(r"<loc>https://example.com([^<]+)</loc>", file.read())
+
+    def test_incremental_build_lists_every_page_in_walk_order(self):
+        manifest = BuildManifest(os.path.join(self.tmp.name, "manifest.json"))
+        full = self.build(manifest)
+        self.assertEqual(sorted(full), ["/", "/blog/a/", "/blog/b/", "/blog/c/"])
+        self.write(os.path.join(self.content, "blog", "b", "index.md"), "---\ndate: 2024-01-02\n---\n# Post B")
+        self.assertEqual(self.build(manifest), full)
+
+    def test_failed_pages_are_left_out(self):
+        self.write(os.path.join(self.content, "blog", "b", "index.md"), "No heading")
+        with self.assertRaises(PageBuildError):
+            self.build()
+        with open(os.path.join(self.dest, "sitemap.xml"), 'r') as file:
+            self.assertNotIn("/blog/b/", file.read())
+
+if __name__ == "__main__":
+    unittest.main()
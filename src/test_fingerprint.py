@@ -0,0 +1,67 @@
+import json
+import os
+import unittest
+
+from assets import sync_tree
+from block_markdown import markdown_to_html_node
+from fingerprint import fingerprint_assets
+from fixtures import TempDirTestCase
+from render_context import RenderContext
+from template import compile_template
+
+class TestFingerprintAssets(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.src = os.path.join(self.tmp.name, "static")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.cache_path = os.path.join(self.tmp.name, "fingerprints.json")
+        self.write(os.path.join(self.src, "index.css"), "body {}")
+        self.write(os.path.join(self.src, "images", "a.png"), "png-bytes")
+        self.write(os.path.join(self.src, "notes.txt"), "not fingerprinted")
+
+    def sync(self):
+        synced, _ = sync_tree(self.src, self.dest)
+        return fingerprint_assets(synced, self.dest, self.cache_path)
+
+    def test_writes_hashed_copies_and_manifest(self):
+        urls = self.sync()
+        self.assertEqual(sorted(urls), ["/images/a.png", "/index.css"])
+        self.assertRegex(urls["/index.css"], r"^/index\.[0-9a-f]{8}\.css$")
+        with open(os.path.join(self.dest, urls["/images/a.png"].lstrip("/"))) as file:
+            self.assertEqual(file.read(), "png-bytes")
+        with open(os.path.join(self.dest, "asset-manifest.json")) as file:
+            self.assertEqual(json.load(file), urls)
+
+    def test_unchanged_size_and_mtime_skip_hashing(self):
+        urls = self.sync()
+        path = os.path.join(self.src, "index.css")
+        stat = os.stat(path)
+        self.write(path, "BODY {}") # different content, same size
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self.sync()["/index.css"], urls["/index.css"])
+
+    def test_changed_asset_replaces_old_copy(self):
+        old = self.sync()["/index.css"]
+        self.write(os.path.join(self.src, "index.css"), "body { margin: 0 }")
+        new = self.sync()["/index.css"]
+        self.assertNotEqual(new, old)
+        self.assertTrue(os.path.exists(os.path.join(self.dest, new.lstrip("/"))))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, old.lstrip("/"))))
+
+    def test_pages_and_template_link_to_hashed_names(self):
+        assets = {"/index.css": "/index.0123abcd.css", "/images/a.png": "/images/a.89abcdef.png"}
+        context = RenderContext("/site/", assets)
+        html = markdown_to_html_node("![a](/images/a.png) [home](/)", context).to_html()
+        self.assertIn('src="/site/images/a.89abcdef.png"', html)
+        self.assertIn('href="/site/"', html)
+        self.assertEqual(context.refs, {"/images/a.png", "/"})
+        template = compile_template('<link href="/index.css" /><a href="https://example.com">{{ Content }}</a>', "/site/", assets)
+        self.assertEqual(template.render({"Content": "x"}), '<link href="/site/index.0123abcd.css" /><a href="https://example.com">x</a>')
+
+    def test_cached_html_refs_map_back_to_original_urls(self):
+        context = RenderContext("/", {"/images/a.png": "/images/a.89abcdef.png"})
+        context.record_html_refs('<img src="/images/a.89abcdef.png" alt="a"></img>')
+        self.assertEqual(context.refs, {"/images/a.png"})
+
+if __name__ == "__main__":
+    unittest.main()
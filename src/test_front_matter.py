@@ -0,0 +1,26 @@
+import unittest
+
+from front_matter import page_fields, split_front_matter
+
+class TestFrontMatter(unittest.TestCase):
+    def test_fields_and_body(self):
+        fields, body = split_front_matter("---\ntitle: \"Tom\"\ntags: [tolkien, characters]\n---\n# Tom\n")
+        self.assertEqual(fields, {"title": "Tom", "tags": ["tolkien", "characters"]})
+        self.assertEqual(body, "# Tom\n")
+
+    def test_no_front_matter(self):
+        self.assertEqual(split_front_matter("# Tom\n\n---\n"), ({}, "# Tom\n\n---\n"))
+
+    def test_page_fields(self):
+        self.assertEqual(page_fields({"date": "2024-01-03", "description": "Tom", "tags": "a, b", "draft": "true", "template": "post.html"}),
+                         {"title": None, "date": "2024-01-03", "description": "Tom", "tags": ["a", "b"], "draft": True, "template": "post.html"})
+        self.assertFalse(page_fields({})["draft"])
+        with self.assertRaises(ValueError):
+            page_fields({"date": "yesterday"})
+
+    def test_unterminated(self):
+        with self.assertRaises(ValueError):
+            split_front_matter("---\ntitle: Tom\n# Tom\n")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
+import io
+import sys
 import unittest
 
-from htmlnode import HTMLNode, LeafNode, ParentNode
+from htmlnode import EMPTY_CHILDREN, EMPTY_PROPS, HTMLNode, LeafNode, ParentNode, escape_attribute, escape_text
 
 
 class TestHTMLNode(unittest.TestCase):
@@ -91,5 +93,92 @@ class TestParentNode(unittest.TestCase):
         })
             node.to_html()
 
+class TestCompactNodes(unittest.TestCase):
+    def test_no_instance_dict(self):
+        for node in (HTMLNode("p"), LeafNode("b", "x"), ParentNode("div", [LeafNode(None, "x")])):
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    def test_leaves_share_empty_defaults(self):
+        first, second = LeafNode("b", "one"), LeafNode("i", "two")
+        self.assertIs(first.props, EMPTY_PROPS)
+        self.assertIs(first.children, second.children)
+        self.assertIs(first.children, EMPTY_CHILDREN)
+
+    def test_shared_props_are_read_only(self):
+        with self.assertRaises(TypeError):
+            LeafNode("b", "x").props["class"] = "y"
+
+    def test_add_child_to_shared_children(self):
+        node = HTMLNode("div", None, EMPTY_CHILDREN)
+        node.add_child(LeafNode("b", "x"))
+        self.assertEqual(node.to_html(), "<div><b>x</b></div>")
+        self.assertEqual(EMPTY_CHILDREN, ())
+
+class TestStreamingSerializer(unittest.TestCase):
+    def test_iter_html_chunks_join_to_html(self):
+        node = ParentNode("div", [LeafNode("b", "bold"), LeafNode(None, " text"), HTMLNode("pre", "", [HTMLNode("code", "x = 1")])], {"class": "post"})
+        self.assertEqual("".join(node.iter_html()), node.to_html())
+        self.assertEqual(node.to_html(), '<div class="post"><b>bold</b> text<pre><code>x = 1</code></pre></div>')
+
+    def test_write_html(self):
+        node = ParentNode("ul", [ParentNode("li", [LeafNode("i", "one")]), ParentNode("li", [LeafNode(None, "two")])])
+        buffer = io.StringIO()
+        node.write_html(buffer)
+        self.assertEqual(buffer.getvalue(), "<ul><li><i>one</i></li><li>two</li></ul>")
+
+    def test_self_closing_without_value(self):
+        self.assertEqual(HTMLNode("hr").to_html(), "<hr />")
+
+    def test_deep_tree_beyond_recursion_limit(self):
+        depth = sys.getrecursionlimit() * 2
+        node = LeafNode(None, "core")
+        for _ in range(depth):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith("<span>" * 3))
+        self.assertEqual(len(html), depth * len("<span></span>") + len("core"))
+
+    def test_minified_collapses_text_but_not_pre(self):
+        node = ParentNode("div", [
+            ParentNode("p", [LeafNode(None, "one\n  two"), LeafNode("b", "three\tfour"), LeafNode(None, "\u00a0\u00a0kept")]),
+            HTMLNode("pre", "", [HTMLNode("code", "def f():\n    return  1", ())]),
+            LeafNode("p", "after\n\nthe  code"),
+        ])
+        self.assertEqual(node.to_html(minify=True),
+                         "<div><p>one two<b>three four</b>\u00a0\u00a0kept</p><pre><code>def f():\n    return  1</code></pre><p>after the code</p></div>")
+        self.assertIn("one\n  two", node.to_html()) # unchanged by default
+
+    def test_error_from_nested_child(self):
+        node = ParentNode("div", [ParentNode("p", [])])
+        with self.assertRaises(ValueError):
+            node.to_html()
+
+class TestEscaping(unittest.TestCase):
+    def test_plain_strings_pass_through(self):
+        text = "Nothing to escape, \"quoted\" or -> not"
+        self.assertIs(escape_text(text), text)
+        self.assertIs(escape_attribute("a < b > c"), "a < b > c")
+
+    def test_special_characters(self):
+        self.assertEqual(escape_text('a < b && c > "d"'), 'a &lt; b &amp;&amp; c > "d"')
+        self.assertEqual(escape_attribute('say "hi" & <go>'), "say &quot;hi&quot; &amp; <go>")
+
+    def test_leaf_value_and_props(self):
+        node = LeafNode("a", "< Back", {"href": "/search?q=a&b=\"c\""})
+        self.assertEqual(node.to_html(), '<a href="/search?q=a&amp;b=&quot;c&quot;">&lt; Back</a>')
+        self.assertEqual(LeafNode(None, "1 < 2").to_html(), "1 &lt; 2")
+        self.assertEqual(LeafNode("img", "", {"src": "a.png", "alt": '"Tom" <3'}).to_html(minify=True),
+                         '<img src="a.png" alt="&quot;Tom&quot; <3"></img>')
+
+    def test_parent_props(self):
+        node = ParentNode("div", [LeafNode("b", "x")], {"title": "Q&A", "class": "faq"})
+        self.assertEqual(node.to_html(), '<div title="Q&amp;A" class="faq"><b>x</b></div>')
+        self.assertEqual(node.props_to_html(), ' title="Q&amp;A" class="faq"')
+
+    def test_value_escaped_once(self):
+        node = HTMLNode("pre", "", [HTMLNode("code", "if a < b and c &amp; d:", ())])
+        self.assertEqual(node.to_html(), "<pre><code>if a &lt; b and c &amp;amp; d:</code></pre>")
+        self.assertEqual(node.to_html(), node.to_html()) # serializing never changes the tree
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
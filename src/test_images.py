@@ -0,0 +1,84 @@
+import os
+import shutil
+import struct
+import unittest
+from unittest import mock
+
+from block_markdown import markdown_to_html_node
+from fixtures import TempDirTestCase
+from images import image_size, process_images
+from render_context import RenderContext
+
+def png_bytes(width, height):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", width, height) + b"\x08\x06\x00\x00\x00"
+
+def jpeg_bytes(width, height):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + bytes(9)
+    sof = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + bytes(3)
+    return b"\xff\xd8" + app0 + b"\xff" + sof + b"\xff\xd9"
+
+class TestImageSize(TempDirTestCase):
+    def size_of(self, data):
+        path = os.path.join(self.tmp.name, "image")
+        with open(path, 'wb') as file:
+            file.write(data)
+        return image_size(path)
+
+    def test_png(self):
+        self.assertEqual(self.size_of(png_bytes(928, 468)), (928, 468))
+
+    def test_jpeg_skips_segments_and_fill_bytes(self):
+        self.assertEqual(self.size_of(jpeg_bytes(640, 480)), (640, 480))
+
+    def test_gif(self):
+        self.assertEqual(self.size_of(b"GIF89a" + struct.pack("<HH", 16, 9) + bytes(8)), (16, 9))
+
+    def test_unknown_or_truncated(self):
+        self.assertIsNone(self.size_of(b"not an image"))
+        self.assertIsNone(self.size_of(jpeg_bytes(640, 480)[:24]))
+
+class TestProcessImages(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.cache_path = os.path.join(self.tmp.name, "images.json")
+        self.variant_dir = os.path.join(self.tmp.name, "variants")
+        os.makedirs(os.path.join(self.dest, "images"))
+        self.src = os.path.join(self.tmp.name, "tom.png")
+        with open(self.src, 'wb') as file:
+            file.write(png_bytes(928, 468))
+        self.synced = {os.path.join(self.dest, "images", "tom.png"): self.src, os.path.join(self.dest, "index.css"): self.src}
+
+    def process(self, widths):
+        return process_images(self.synced, self.dest, widths, self.cache_path, self.variant_dir)
+
+    def test_sizes_without_variants(self):
+        self.assertEqual(self.process(()), {"/images/tom.png": {"width": 928, "height": 468, "srcset": []}})
+
+    def test_variants_are_rendered_once_per_source(self):
+        def resize(src_path, dest_path, width, height):
+            shutil.copyfile(src_path, dest_path)
+            calls.append((width, height))
+        calls = []
+        with mock.patch("images.pillow_available", return_value=True), mock.patch("images.resize_image", side_effect=resize):
+            images = self.process((480, 2000))
+            self.process((480, 2000))
+        self.assertEqual(calls, [(480, 242)]) # cached on the second build, never upscaled
+        [[url, width]] = images["/images/tom.png"]["srcset"]
+        self.assertRegex(url, r"^/images/tom-480w\.[0-9a-f]{8}\.png$")
+        self.assertTrue(os.path.exists(os.path.join(self.dest, url.lstrip("/"))))
+
+class TestImageProps(unittest.TestCase):
+    def test_known_image_gets_size_srcset_and_lazy_loading(self):
+        images = {"/images/tom.png": {"width": 928, "height": 468, "srcset": [["/images/tom-480w.0123abcd.png", 480]]}}
+        html = markdown_to_html_node("![Tom](/images/tom.png) ![Remote](https://example.com/a.png)", RenderContext("/site/", None, images)).to_html()
+        self.assertIn('<img src="/site/images/tom.png" alt="Tom" width="928" height="468" '
+                      'srcset="/site/images/tom-480w.0123abcd.png 480w, /site/images/tom.png 928w" loading="lazy">', html)
+        self.assertIn('<img src="https://example.com/a.png" alt="Remote" loading="lazy">', html)
+
+    def test_disabled_stage_leaves_images_alone(self):
+        html = markdown_to_html_node("![Tom](/images/tom.png)", RenderContext("/")).to_html()
+        self.assertIn('<img src="/images/tom.png" alt="Tom">', html)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import contextlib
+import io
+import unittest
+
+import instrument
+from block_markdown import markdown_to_html_node
+from instrument import Instrumentation, configure_instrumentation, get_instrumentation, log
+
+class TestInstrumentation(unittest.TestCase):
+    def tearDown(self):
+        configure_instrumentation() # back to the disabled default for other tests
+
+    def test_disabled_records_nothing(self):
+        instrumentation = Instrumentation()
+        instrumentation.count("pages generated")
+        with instrumentation.timer("render"):
+            pass
+        self.assertEqual(dict(instrumentation.counters), {})
+        self.assertEqual(dict(instrumentation.totals), {})
+
+    def test_timed_stages_are_attributed_to_page(self):
+        instrumentation = configure_instrumentation(enabled=True)
+        with instrumentation.page("content/index.md"):
+            markdown_to_html_node("# Title\n\nSome *text*")
+        self.assertEqual(instrumentation.counters["markdown_to_html_node calls"], 1)
+        self.assertEqual(instrumentation.counters["text_to_textnodes calls"], 2)
+        stages = instrumentation.pages["content/index.md"]
+        self.assertIn("generate_page", stages)
+        self.assertIn("text_to_textnodes", stages)
+        self.assertIn("content/index.md", instrumentation.report())
+
+    def test_take_and_merge(self):
+        worker = Instrumentation(enabled=True, trace=True)
+        with worker.page("a.md"):
+            worker.count("pages generated")
+        data = worker.take()
+        self.assertEqual(dict(worker.counters), {}) # take starts the worker fresh
+        parent = Instrumentation(enabled=True)
+        parent.count("pages generated")
+        parent.merge(data)
+        self.assertEqual(parent.counters["pages generated"], 2)
+        self.assertIn("a.md", parent.pages)
+        self.assertEqual(len(parent.events), 1)
+
+    def test_quiet_log(self):
+        configure_instrumentation(quiet=True)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            log("Copied file")
+        self.assertEqual(output.getvalue(), "")
+        configure_instrumentation()
+        with contextlib.redirect_stdout(output):
+            log("Copied file")
+        self.assertEqual(output.getvalue(), "Copied file\n")
+
+    def test_trace_enables_timing(self):
+        self.assertTrue(configure_instrumentation(trace=True).enabled)
+        self.assertIs(get_instrumentation(), instrument._instrumentation)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import unittest
+
+from fixtures import TempDirTestCase
+from main import generate_pages_recursive
+from render_cache import configure_render_cache
+from listings import SiteModel, slugify
+
+TEMPLATE = "<title>{{ Title }}</title><body>{{ Content }}</body>"
+
+class TestListings(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.template = os.path.join(self.tmp.name, "template.html")
+        self.write(self.template, TEMPLATE)
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.post("tom", "2024-01-03", "tolkien, characters")
+        self.post("majesty", "2024-01-02", "tolkien")
+        self.post("glorfindel", "2024-01-01", "characters")
+
+    def tearDown(self):
+        configure_render_cache(0)
+        super().tearDown()
+
+    def read(self, *parts):
+        with open(os.path.join(self.dest, *parts), 'r') as file:
+            return file.read()
+
+    def post(self, name, date, tags, title=None):
+        self.write(os.path.join(self.content, "blog", name, "index.md"),
+                   f"---\ndate: {date}\ntags: {tags}\n---\n# {title or name.title()}\n\nA short post.")
+
+    def build(self, site):
+        generate_pages_recursive("/site/", self.content, self.template, self.dest, site=site)
+        return site.write_listings(self.template)
+
+    def test_pages_render_without_front_matter(self):
+        self.build(SiteModel(os.path.join(self.tmp.name, "site.json")))
+        self.assertEqual(self.read("blog", "tom", "index.html"), "<title>Tom</title><body><div><h1>Tom</h1><p>A short post.</p></div></body>")
+
+    def test_nav_links_include_section_listings(self):
+        self.write(self.template, "<nav>{{ Nav }}</nav>")
+        self.build(SiteModel(os.path.join(self.tmp.name, "site.json")))
+        nav = '<nav><ul><li><a href="/site/">Home</a></li><li><a href="/site/blog/">Blog</a></li></ul></nav>'
+        self.assertEqual(self.read("blog", "index.html"), nav)
+        self.assertEqual(self.read("blog", "tom", "index.html"), nav)
+
+    def test_section_and_tag_listings(self):
+        site = SiteModel(os.path.join(self.tmp.name, "site.json"), per_page=2)
+        self.assertEqual(self.build(site), 4) # blog (2 pages), tags/tolkien, tags/characters
+        self.assertEqual(site.pages[os.path.join(self.content, "blog", "tom", "index.md")]["words"], 4)
+        self.assertEqual(self.read("blog", "index.html"),
+                         '<title>Blog</title><body><div><ul>'
+                         '<li><a href="/site/blog/tom/">Tom</a><time datetime="2024-01-03">2024-01-03</time><span>4 words</span></li>'
+                         '<li><a href="/site/blog/majesty/">Majesty</a><time datetime="2024-01-02">2024-01-02</time><span>4 words</span></li>'
+                         '</ul><nav><a href="/site/blog/page/2/" rel="next">Older</a></nav></div></body>')
+        self.assertIn('<a href="/site/blog/" rel="prev">Newer</a>', self.read("blog", "page", "2", "index.html"))
+        self.assertIn("/site/blog/glorfindel/", self.read("tags", "characters", "index.html"))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "contact"))) # home has its own index.md
+
+    def test_listings_follow_member_metadata(self):
+        path = os.path.join(self.tmp.name, "site.json")
+        site = SiteModel(path)
+        self.build(site)
+        site.save()
+        self.assertEqual(self.build(SiteModel.load(path)), 0)
+
+        self.post("majesty", "2024-01-02", "tolkien", "The Majesty")
+        site = SiteModel.load(path)
+        self.assertEqual(self.build(site), 2) # blog and tags/tolkien, not tags/characters
+        self.assertIn("The Majesty", self.read("tags", "tolkien", "index.html"))
+
+        self.post("majesty", "2024-01-02", "lore", "The Majesty")
+        os.remove(os.path.join(self.content, "blog", "tom", "index.md"))
+        os.rmdir(os.path.join(self.content, "blog", "tom"))
+        self.build(site)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "tags", "tolkien"))) # no members left after the edit
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "tags", "lore", "index.html")))
+
+    def test_drafts_are_left_out(self):
+        self.write(os.path.join(self.content, "blog", "wip", "index.md"), "---\ndraft: true\n---\n# Work in progress")
+        site = SiteModel(os.path.join(self.tmp.name, "site.json"))
+        self.build(site)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "blog", "wip", "index.html")))
+        self.assertNotIn("wip", self.read("blog", "index.html"))
+
+        site = SiteModel(os.path.join(self.tmp.name, "site.json"), drafts=True)
+        self.build(site)
+        self.assertIn("/site/blog/wip/", self.read("blog", "index.html"))
+
+    def test_draft_without_heading_is_left_out(self):
+        self.write(os.path.join(self.content, "blog", "wip", "index.md"), "---\ndraft: true\n---\ntext")
+        site = SiteModel(os.path.join(self.tmp.name, "site.json"))
+        self.build(site) # would raise PageBuildError if the draft were generated
+        self.assertNotIn(os.path.join(self.content, "blog", "wip", "index.md"), site.pages)
+
+    def test_metadata_reads_only_the_head(self):
+        # a front matter title means the body is not needed, so its missing h1 is not noticed
+        self.write(os.path.join(self.content, "blog", "tom", "index.md"), "---\ntitle: Tom\n---\nNo heading here")
+        site = SiteModel(os.path.join(self.tmp.name, "site.json"))
+        site.scan([(os.path.join(self.content, "blog", "tom", "index.md"), os.path.join(self.dest, "blog", "tom", "index.html"))],
+                  self.content, self.dest, "/")
+        self.assertEqual(site.pages[os.path.join(self.content, "blog", "tom", "index.md")]["title"], "Tom")
+
+    def test_cached_render_counts_the_same_words(self):
+        uncached = SiteModel(os.path.join(self.tmp.name, "site.json"))
+        self.build(uncached)
+        configure_render_cache(16)
+        self.build(SiteModel(os.path.join(self.tmp.name, "warm.json")))
+        cached = SiteModel(os.path.join(self.tmp.name, "cached.json"))
+        self.build(cached)
+        self.assertEqual({path: entry["words"] for path, entry in cached.pages.items()},
+                         {path: entry["words"] for path, entry in uncached.pages.items()})
+
+    def test_slugify(self):
+        self.assertEqual(slugify("Middle-earth & More"), "middle-earth-more")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import unittest
+
+from fixtures import TempDirTestCase
+from main import PageBuildError, find_markdown_files, generate_pages, generate_pages_recursive
+
+TEMPLATE = "<title>{{ Title }}</title><link href=\"/index.css\" /><body>{{ Content }}</body>"
+
+class TestParallelGeneration(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.template = os.path.join(self.root, "template.html")
+        self.write(self.template, TEMPLATE)
+        for index in range(6):
+            self.write(os.path.join(self.content, f"dir{index % 2}", f"page{index}.md"), f"# Page {index}\n\nSome **bold** text [link](/page{index})")
+
+    def read_tree(self, root):
+        files = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(directory, name)
+                with open(path, 'rb') as file:
+                    files[os.path.relpath(path, root)] = file.read()
+        return files
+
+    def test_find_markdown_files(self):
+        dest = os.path.join(self.root, "docs")
+        pages = find_markdown_files(self.content, dest)
+        self.assertEqual(len(pages), 6)
+        self.assertIn((os.path.join(self.content, "dir1", "page3.md"), os.path.join(dest, "dir1", "page3.html")), pages)
+        self.assertTrue(os.path.isdir(os.path.join(dest, "dir0")))
+
+    def test_parallel_output_matches_serial(self):
+        serial = os.path.join(self.root, "serial")
+        parallel = os.path.join(self.root, "parallel")
+        generate_pages_recursive("/site/", self.content, self.template, serial, jobs=1)
+        generate_pages_recursive("/site/", self.content, self.template, parallel, jobs=3)
+        self.assertEqual(self.read_tree(serial), self.read_tree(parallel))
+        self.assertEqual(len(self.read_tree(serial)), 6)
+
+    def test_title_escaped(self):
+        self.write(os.path.join(self.content, "dir0", "page0.md"), "# Fish & Chips <3\n\nText")
+        dest = os.path.join(self.root, "docs")
+        generate_pages_recursive("/", self.content, self.template, dest, jobs=1)
+        with open(os.path.join(dest, "dir0", "page0.html"), 'r') as file:
+            html = file.read()
+        self.assertIn("<title>Fish &amp; Chips &lt;3</title>", html)
+        self.assertIn("<h1>Fish &amp; Chips &lt;3</h1>", html)
+
+    def test_errors_reported_per_file(self):
+        self.write(os.path.join(self.content, "dir0", "broken.md"), "# Broken\n\nUnmatched **bold")
+        self.write(os.path.join(self.content, "dir1", "untitled.md"), "No title here")
+        dest = os.path.join(self.root, "docs")
+        failures = generate_pages("/", find_markdown_files(self.content, dest), self.template, jobs=2)
+        failed = sorted(os.path.basename(from_path) for from_path, _ in failures)
+        self.assertEqual(failed, ["broken.md", "untitled.md"])
+        self.assertTrue(os.path.exists(os.path.join(dest, "dir0", "page0.html"))) # other pages still built
+
+    def test_failures_raise_after_build(self):
+        self.write(os.path.join(self.content, "broken.md"), "No title here")
+        with self.assertRaises(PageBuildError) as context:
+            generate_pages_recursive("/", self.content, self.template, os.path.join(self.root, "docs"), jobs=2)
+        self.assertEqual(len(context.exception.failures), 1)
+        self.assertIn("No heading", context.exception.failures[0][1])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import contextlib
+import io
+import os
+import unittest
+
+from fixtures import TempDirTestCase
+from main import generate_pages_recursive
+from manifest import BuildManifest
+
+TEMPLATE = "<title>{{ Title }}</title><body>{{ Content }}</body>"
+
+class TestIncrementalBuild(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.docs = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+        self.manifest_path = os.path.join(self.root, ".buildcache", "manifest.json")
+        os.makedirs(os.path.join(self.content, "blog"))
+        self.write(self.template, TEMPLATE)
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome")
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\nBody")
+
+    def build(self, basepath="/"):
+        manifest = BuildManifest.load(self.manifest_path)
+        generate_pages_recursive(basepath, self.content, self.template, self.docs, manifest)
+        removed = manifest.prune(self.docs)
+        manifest.save()
+        return manifest, removed
+
+    def test_first_build_records_every_page(self):
+        manifest, removed = self.build()
+        self.assertEqual(len(manifest.pages), 2)
+        self.assertEqual(removed, [])
+        self.assertTrue(os.path.exists(os.path.join(self.docs, "blog", "post.html")))
+
+    def test_unchanged_pages_are_fresh(self):
+        self.build()
+        manifest = BuildManifest.load(self.manifest_path)
+        dest = os.path.join(self.docs, "index.html")
+        self.assertTrue(manifest.is_fresh("/", os.path.join(self.content, "index.md"), self.template, dest))
+        self.assertFalse(manifest.is_fresh("/site/", os.path.join(self.content, "index.md"), self.template, dest))
+
+    def test_changed_source_is_regenerated(self):
+        self.build()
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome back")
+        manifest = BuildManifest.load(self.manifest_path)
+        dest = os.path.join(self.docs, "index.html")
+        self.assertFalse(manifest.is_fresh("/", os.path.join(self.content, "index.md"), self.template, dest))
+        self.build()
+        with open(dest) as file:
+            self.assertIn("Welcome back", file.read())
+
+    def test_template_change_invalidates_all_pages(self):
+        self.build()
+        self.write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        manifest = BuildManifest.load(self.manifest_path)
+        for dest, entry in manifest.pages.items():
+            self.assertFalse(manifest.is_fresh("/", entry["source"], self.template, dest))
+
+    def test_removed_source_deletes_output(self):
+        self.build()
+        os.remove(os.path.join(self.content, "blog", "post.md"))
+        manifest, removed = self.build()
+        self.assertEqual(removed, [os.path.join(self.docs, "blog", "post.html")])
+        self.assertNotIn(removed[0], manifest.pages)
+        self.assertFalse(os.path.exists(removed[0]))
+
+    def test_missing_output_is_regenerated(self):
+        self.build()
+        os.remove(os.path.join(self.docs, "index.html"))
+        self.build()
+        self.assertTrue(os.path.exists(os.path.join(self.docs, "index.html")))
+
+    def test_refs_are_recorded(self):
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nRead [the post](/blog/post) or [elsewhere](https://example.com)")
+        manifest, _ = self.build()
+        entry = manifest.pages[os.path.join(self.docs, "index.html")]
+        self.assertEqual(entry["refs"], {"/blog/post": os.path.join(self.content, "blog", "post.md")})
+
+    def test_moved_link_target_rebuilds_linking_page(self):
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nRead [the post](/blog/post)")
+        self.build()
+        os.rename(os.path.join(self.content, "blog", "post.md"), os.path.join(self.content, "blog.md"))
+        manifest = BuildManifest.load(self.manifest_path)
+        manifest.index_outputs(self.docs, [(os.path.join(self.content, "index.md"), os.path.join(self.docs, "index.html"))])
+        reason = manifest.stale_reason("/", os.path.join(self.content, "index.md"), self.template, os.path.join(self.docs, "index.html"))
+        self.assertIn("/blog/post", reason)
+        self.assertEqual(manifest.dependents(os.path.join(self.content, "blog", "post.md")), [os.path.join(self.docs, "index.html")])
+
+    def test_explain_reports_only_stale_pages(self):
+        self.build()
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nChanged")
+        manifest = BuildManifest.load(self.manifest_path)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            generate_pages_recursive("/", self.content, self.template, self.docs, manifest, explain=True)
+        lines = [line for line in output.getvalue().splitlines() if line.startswith("Rebuilding")]
+        self.assertEqual(lines, [f"Rebuilding {os.path.join(self.docs, 'index.html')}: {os.path.join(self.content, 'index.md')} changed"])
+
+    def test_corrupt_manifest_means_full_rebuild(self):
+        os.makedirs(os.path.dirname(self.manifest_path))
+        self.write(self.manifest_path, "{not json")
+        self.assertEqual(BuildManifest.load(self.manifest_path).pages, {})
+
+if __name__ == "__main__":
+    unittest.main()
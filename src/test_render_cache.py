@@ -0,0 +1,91 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+
+from block_markdown import markdown_to_html_node
+from main import parse_args
+from render_cache import RenderCache, render_markdown
+from render_context import RenderContext, settings_digest
+
+MARKDOWN = "# Title\n\nA **bold** [link](/about)\n\n```\ncode\n```\n\n- one\n- two"
+
+class TestRenderCache(unittest.TestCase):
+    def test_output_matches_uncached_render(self):
+        context = RenderContext("/site/")
+        expected = markdown_to_html_node(MARKDOWN, context).to_html()
+        cache = RenderCache()
+        self.assertEqual(render_markdown(MARKDOWN, context, cache), expected)
+        self.assertEqual(render_markdown(MARKDOWN, context, cache), expected)
+        self.assertEqual(render_markdown("", context, cache), markdown_to_html_node("").to_html())
+
+    def test_cached_markup_is_not_escaped_again(self):
+        markdown = "[< Back](/?a=1&b=2)\n\n```\na < b\n```"
+        expected = markdown_to_html_node(markdown).to_html()
+        self.assertIn('<a href="/?a=1&amp;b=2">&lt; Back</a>', expected)
+        cache = RenderCache()
+        render_markdown(markdown, None, cache)
+        self.assertEqual(render_markdown(markdown, None, cache), expected)
+        self.assertEqual(render_markdown("# Title\n\n" + markdown, None, cache), markdown_to_html_node("# Title\n\n" + markdown).to_html()) # block hits
+
+    def test_document_hit(self):
+        cache = RenderCache()
+        render_markdown(MARKDOWN, None, cache)
+        misses = cache.misses
+        render_markdown("\r\n" + MARKDOWN.replace("\n", "\r\n") + "\n\n", None, cache) # normalizes to the same key
+        self.assertEqual(cache.misses, misses)
+        self.assertEqual(cache.hits, 1)
+
+    def test_shared_blocks_hit(self):
+        cache = RenderCache()
+        footer = "Licensed under **MIT**."
+        render_markdown("# One\n\n" + footer, None, cache)
+        hits = cache.hits
+        render_markdown("# Two\n\n" + footer, None, cache)
+        self.assertEqual(cache.hits, hits + 1) # footer block reused, new heading rendered
+
+    def test_build_digest_stands_in_for_assets(self):
+        assets = {"/index.css": "/index.1234abcd.css"}
+        digest = settings_digest(assets, None)
+        self.assertEqual(RenderContext("/", assets, digest=digest).cache_variant(), RenderContext("/", assets).cache_variant())
+        self.assertEqual(RenderContext("/", assets, digest="precomputed").cache_variant(), ("/", "precomputed")) # not recomputed per page
+
+    def test_hit_refs_map_assets_back_once_per_build(self):
+        assets = {"/index.css": "/index.1234abcd.css"}
+        digest = settings_digest(assets, None)
+        first, second = RenderContext("/", assets, digest=digest), RenderContext("/", assets, digest=digest)
+        first.record_html_refs('<link href="/index.1234abcd.css" /><a href="/about">About</a>')
+        self.assertEqual(first.refs, {"/index.css", "/about"})
+        self.assertIs(second.asset_originals(), first.asset_originals()) # shared by every page of the build
+        self.assertIsNone(settings_digest({}, None))
+
+    def test_basepath_is_part_of_key(self):
+        cache = RenderCache()
+        self.assertIn('href="/about"', render_markdown(MARKDOWN, RenderContext("/"), cache))
+        self.assertIn('href="/site/about"', render_markdown(MARKDOWN, RenderContext("/site/"), cache))
+
+    def test_lru_eviction(self):
+        cache = RenderCache(maxsize=2)
+        for key in ("a", "b", "c"):
+            cache.put(key, key.upper())
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), "C")
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "entries": 2})
+
+    def test_disk_store_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = RenderCache(directory=directory)
+            html = render_markdown(MARKDOWN, None, first)
+            second = RenderCache(directory=directory)
+            self.assertEqual(render_markdown(MARKDOWN, None, second), html)
+            self.assertEqual((second.hits, second.misses), (1, 0))
+            self.assertTrue(os.listdir(directory))
+
+    def test_cache_dir_needs_cache_size(self):
+        self.assertEqual(parse_args(["--render-cache", "64", "--render-cache-dir", "cache"]).render_cache_dir, "cache")
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            parse_args(["--render-cache-dir", "cache"])
+
+if __name__ == "__main__":
+    unittest.main()
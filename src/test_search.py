@@ -0,0 +1,115 @@
+import json
+import os
+import unittest
+
+from compress import compress_tree
+from fixtures import TempDirTestCase
+from main import generate_pages_recursive
+from manifest import BuildManifest
+from render_cache import configure_render_cache
+from search import SearchIndex, delta_encode, html_terms, page_url, tokenize
+
+TEMPLATE = "<title>{{ Title }}</title><body>{{ Content }}</body>"
+
+class TestSearchHelpers(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Tolkien's **Middle-earth**, a 1954 book"), ["tolkien", "middle", "earth", "1954", "book"])
+
+    def test_html_terms_skip_markup_and_code(self):
+        self.assertEqual(html_terms('<p>Fish &amp; <a href="/chips">Chips</a></p><pre><code>skipped</code></pre>'), {"fish", "chips"})
+
+    def test_delta_encode(self):
+        self.assertEqual(delta_encode([2, 3, 7]), [2, 1, 4])
+
+    def test_page_url(self):
+        self.assertEqual(page_url(os.path.join("docs", "index.html"), "docs", "/site/"), "/site/")
+        self.assertEqual(page_url(os.path.join("docs", "blog", "tom", "index.html"), "docs"), "/blog/tom/")
+        self.assertEqual(page_url(os.path.join("docs", "contact.html"), "docs"), "/contact.html")
+
+class TestSearchIndex(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dest = os.path.join(self.tmp.name, "docs")
+
+    def read(self, name):
+        with open(os.path.join(self.dest, "search", name), 'r') as file:
+            return json.load(file)
+
+    def test_ids_are_stable_and_reused(self):
+        index = SearchIndex(os.path.join(self.tmp.name, "search.json"))
+        for name in ("a", "b", "c"):
+            index.update(name, f"/{name}", name, {name + "x"})
+        index.prune(["a", "c"])
+        index.update("c", "/c", "C", {"cx"})
+        index.update("d", "/d", "d", {"dx"})
+        self.assertEqual({name: entry["id"] for name, entry in index.pages.items()}, {"a": 0, "c": 2, "d": 1})
+
+    def test_write_shards_and_skip_unchanged_files(self):
+        index = SearchIndex(os.path.join(self.tmp.name, "search.json"))
+        index.update("a", "/a", "Apples", {"apple", "pie"})
+        index.update("b", "/b", "Pears", {"pear", "pie"})
+        self.assertEqual(index.write(self.dest), 3)
+        self.assertEqual(self.read("index.json"), {"version": 1, "pages": [["/a", "Apples"], ["/b", "Pears"]], "shards": ["a", "p"]})
+        self.assertEqual(self.read("p.json"), {"pear": [1], "pie": [0, 1]})
+        self.assertEqual(index.write(self.dest), 0)
+
+        index.prune(["b"])
+        self.assertEqual(index.write(self.dest), 3) # index.json and p.json rewritten, a.json removed
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "search", "a.json")))
+        self.assertEqual(self.read("index.json")["pages"], [None, ["/b", "Pears"]])
+
+    def test_compressed_siblings_are_kept(self):
+        index = SearchIndex(os.path.join(self.tmp.name, "search.json"))
+        index.update("a", "/a", "Apples", {"apple"})
+        index.write(self.dest)
+        self.assertEqual(compress_tree(self.dest, min_size=0)["compressed"], 2)
+        self.assertEqual(index.write(self.dest), 0)
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "search", "a.json.gz")))
+        self.assertEqual(compress_tree(self.dest, min_size=0)["compressed"], 0) # nothing to redo after a no-op build
+
+    def test_state_round_trip(self):
+        path = os.path.join(self.tmp.name, "search.json")
+        index = SearchIndex(path)
+        index.update("a", "/a", "A", {"word"})
+        index.save()
+        self.assertEqual(SearchIndex.load(path).pages, index.pages)
+
+class TestSearchBuild(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.template = os.path.join(self.tmp.name, "template.html")
+        self.write(self.template, TEMPLATE)
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome to the **library**.\n\n```\nhidden_code\n```")
+        self.write(os.path.join(self.content, "blog", "tom", "index.md"), "# Tom\n\nThe [hobbits](/blog) walk.")
+
+    def tearDown(self):
+        configure_render_cache(0)
+        super().tearDown()
+
+    def build(self, manifest, index):
+        generate_pages_recursive("/", self.content, self.template, self.dest, manifest, search_index=index)
+        return {entry["url"]: (entry["title"], entry["terms"]) for entry in index.pages.values()}
+
+    def test_terms_from_text_nodes(self):
+        pages = self.build(None, SearchIndex(os.path.join(self.tmp.name, "search.json")))
+        self.assertEqual(pages, {
+            "/": ("Home", ["home", "library", "the", "to", "welcome"]),
+            "/blog/tom/": ("Tom", ["hobbits", "the", "tom", "walk"]),
+        })
+
+    def test_cached_render_gives_the_same_terms(self):
+        uncached = self.build(None, SearchIndex(os.path.join(self.tmp.name, "search.json")))
+        configure_render_cache(16)
+        self.build(None, SearchIndex(os.path.join(self.tmp.name, "warm.json")))
+        self.assertEqual(self.build(None, SearchIndex(os.path.join(self.tmp.name, "cached.json"))), uncached)
+
+    def test_incremental_build_indexes_missing_pages(self):
+        manifest = BuildManifest(os.path.join(self.tmp.name, "manifest.json"))
+        generate_pages_recursive("/", self.content, self.template, self.dest, manifest)
+        pages = self.build(manifest, SearchIndex(os.path.join(self.tmp.name, "search.json")))
+        self.assertEqual(sorted(pages), ["/", "/blog/tom/"]) # unchanged pages are rebuilt once to index them
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import email.utils
+import os
+import time
+import unittest
+
+from fixtures import TempDirTestCase
+from server import SiteWatcher, StaticFileServer
+from template import clear_template_cache
+
+class TestSiteWatcher(TempDirTestCase):
+    def setUp(self):
+        clear_template_cache()
+        super().setUp()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.static = os.path.join(self.root, "static")
+        self.docs = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+        self.write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome")
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\nBody")
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.watcher = SiteWatcher("/", self.content, self.static, self.template, self.docs, os.path.join(self.root, "manifest.json"))
+        self.watcher.build()
+
+    def tearDown(self):
+        super().tearDown()
+        clear_template_cache()
+
+    def write(self, path, text):
+        super().write(path, text)
+        self.bump(path)
+
+    def bump(self, path):
+        # make sure the mtime moves even on coarse-grained filesystems
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def read(self, path):
+        with open(path) as file:
+            return file.read()
+
+    def test_no_changes_rebuilds_nothing(self):
+        self.assertEqual(self.watcher.poll(), [])
+
+    def test_edit_rebuilds_only_that_page(self):
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\nEdited")
+        self.assertEqual(self.watcher.poll(), [os.path.join(self.docs, "blog", "post.html")])
+        self.assertIn("Edited", self.read(os.path.join(self.docs, "blog", "post.html")))
+
+    def test_new_and_removed_pages(self):
+        self.write(os.path.join(self.content, "new", "page.md"), "# New")
+        os.remove(os.path.join(self.content, "blog", "post.md"))
+        rebuilt = self.watcher.poll()
+        self.assertIn(os.path.join(self.docs, "new", "page.html"), rebuilt)
+        self.assertTrue(os.path.exists(os.path.join(self.docs, "new", "page.html")))
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "blog", "post.html")))
+
+    def test_drafts_are_not_served(self):
+        secret = os.path.join(self.docs, "secret.html")
+        self.write(os.path.join(self.content, "secret.md"), "---\ndraft: true\n---\n# Secret")
+        self.assertEqual(self.watcher.poll(), [])
+        self.write(os.path.join(self.content, "secret.md"), "---\ndraft: true\n---\n# Secret, edited")
+        self.watcher.poll()
+        self.assertFalse(os.path.exists(secret))
+
+        post = os.path.join(self.docs, "blog", "post.html")
+        self.write(os.path.join(self.content, "blog", "post.md"), "---\ndraft: true\n---\n# Post")
+        self.assertEqual(self.watcher.poll(), [post]) # unpublished: its old output is removed
+        self.assertFalse(os.path.exists(post))
+
+    def test_template_change_rebuilds_every_page(self):
+        self.write(self.template, "<h2>{{ Title }}</h2>{{ Content }}")
+        self.assertEqual(len(self.watcher.poll()), 2)
+        self.assertTrue(self.read(os.path.join(self.docs, "index.html")).startswith("<h2>Home</h2>"))
+
+    def test_template_change_rebuilds_only_its_pages(self):
+        post = os.path.join(self.docs, "blog", "post.html")
+        blog_template = os.path.join(self.content, "blog", "template.html")
+        self.write(os.path.join(self.root, "footer.html"), "<footer>One</footer>")
+        self.write(blog_template, '<article>{{ Content }}</article>{% include "../../footer.html" %}')
+        self.assertEqual(self.watcher.poll(), [post]) # the home page keeps the default template
+        self.write(os.path.join(self.root, "footer.html"), "<footer>Two</footer>")
+        self.assertEqual(self.watcher.poll(), [post])
+        self.assertTrue(self.read(post).endswith("<footer>Two</footer>"))
+
+    def test_nav_change_rebuilds_pages_showing_it(self):
+        home = os.path.join(self.docs, "index.html")
+        self.write(self.template, "<nav>{{ Nav }}</nav>{{ Content }}")
+        self.write(os.path.join(self.content, "about", "index.md"), "# About")
+        self.assertEqual(len(self.watcher.poll()), 3)
+        self.assertIn('<a href="/about/">About</a>', self.read(home))
+        self.write(os.path.join(self.content, "about", "index.md"), "# About Us")
+        self.assertEqual(len(self.watcher.poll()), 3) # the title is in every page's navigation
+        self.assertIn('<a href="/about/">About Us</a>', self.read(home))
+        self.assertEqual(self.watcher.manifest.pages[home]["options"]["nav"][1], ["/about/", "About Us"])
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\nEdited")
+        self.assertEqual(self.watcher.poll(), [os.path.join(self.docs, "blog", "post.html")])
+
+    def test_static_change_is_synced(self):
+        self.write(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+        self.assertEqual(self.watcher.poll(), [self.docs])
+        self.assertEqual(self.read(os.path.join(self.docs, "index.css")), "body { margin: 0 }")
+
+    def test_removed_asset_rebuilds_pages_linking_to_it(self):
+        self.write(os.path.join(self.static, "logo.png"), "png")
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n![logo](/logo.png)")
+        self.watcher.poll()
+        os.remove(os.path.join(self.static, "logo.png"))
+        self.assertEqual(self.watcher.poll(), [self.docs, os.path.join(self.docs, "index.html")])
+
+class TestStaticFileServer(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.tmp.name, "blog"))
+        for path, text in (("index.html", "<p>home</p>"), ("blog/index.html", "<p>blog</p>"), ("index.css", "body {}")):
+            with open(os.path.join(self.tmp.name, path), 'w') as file:
+                file.write(text)
+        self.server = StaticFileServer(self.tmp.name, "/site/")
+
+    def test_serves_file_with_validators(self):
+        status, headers, body = self.server.respond("GET", "/index.css", {})
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body, b"body {}")
+        self.assertEqual(headers["Content-Type"], "text/css; charset=utf-8")
+        self.assertIn("ETag", headers)
+        self.assertIn("Last-Modified", headers)
+
+    def test_directory_index_and_basepath(self):
+        self.assertEqual(self.server.respond("GET", "/site/blog/", {})[2], b"<p>blog</p>")
+        self.assertEqual(self.server.respond("GET", "/site/", {})[2], b"<p>home</p>")
+
+    def test_etag_revalidation(self):
+        etag = self.server.respond("GET", "/index.html", {})[1]["ETag"]
+        status, _, body = self.server.respond("GET", "/index.html", {"if-none-match": etag})
+        self.assertEqual((status, body), ("304 Not Modified", b""))
+        self.assertEqual(self.server.respond("GET", "/index.html", {"if-none-match": '"other"'})[0], "200 OK")
+
+    def test_last_modified_revalidation(self):
+        future = email.utils.formatdate(time.time() + 60, usegmt=True)
+        past = email.utils.formatdate(0, usegmt=True)
+        self.assertEqual(self.server.respond("GET", "/index.html", {"if-modified-since": future})[0], "304 Not Modified")
+        self.assertEqual(self.server.respond("GET", "/index.html", {"if-modified-since": past})[0], "200 OK")
+
+    def test_not_found_and_traversal(self):
+        self.assertEqual(self.server.respond("GET", "/missing.html", {})[0], "404 Not Found")
+        self.assertEqual(self.server.respond("GET", "/../../etc/passwd", {})[0], "404 Not Found")
+
+    def test_head_and_method_not_allowed(self):
+        status, headers, body = self.server.respond("HEAD", "/index.html", {})
+        self.assertEqual((status, body, headers["Content-Length"]), ("200 OK", b"", "11"))
+        self.assertEqual(self.server.respond("POST", "/index.html", {})[0], "405 Method Not Allowed")
+
+if __name__ == "__main__":
+    unittest.main()
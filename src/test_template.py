@@ -0,0 +1,219 @@
+import io
+import os
+import unittest
+
+from block_markdown import markdown_to_html_node
+from fixtures import TempDirTestCase
+from htmlnode import LeafNode, ParentNode
+from render_context import RenderContext
+from main import generate_pages_recursive
+from manifest import BuildManifest
+from template import clear_template_cache, compile_template, load_template, minify_markup, resolve_template
+
+class TestCompileTemplate(unittest.TestCase):
+    def test_segments(self):
+        template = compile_template("<title>{{ Title }}</title><main>{{ Content }}</main>")
+        self.assertEqual(template.parts, ["<title>", None, "</title><main>", None, "</main>"])
+        self.assertEqual(template.slots, [(1, "Title"), (3, "Content")])
+
+    def test_render(self):
+        template = compile_template("<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertEqual(template.render({"Title": "Hi", "Content": "<p>x</p>"}), "<h1>Hi</h1><p>x</p>")
+
+    def test_extra_placeholders(self):
+        template = compile_template('<meta content="{{ Description }}" /><time>{{ Date }}</time><nav>{{ Nav }}</nav>')
+        html = template.render({"Description": "About", "Date": "2024-01-01", "Nav": "<a>Home</a>"})
+        self.assertEqual(html, '<meta content="About" /><time>2024-01-01</time><nav><a>Home</a></nav>')
+
+    def test_missing_values_render_empty(self):
+        self.assertEqual(compile_template("[{{ Date }}]").render({}), "[]")
+
+    def test_unknown_placeholder_is_literal(self):
+        self.assertEqual(compile_template("{{ Other }}").render({}), "{{ Other }}")
+
+    def test_slot_values_not_rescanned(self):
+        template = compile_template("{{ Content }}")
+        self.assertEqual(template.render({"Content": "{{ Title }}"}), "{{ Title }}")
+
+    def test_write_streams_node_values(self):
+        template = compile_template("<h1>{{ Title }}</h1>{{ Content }}")
+        buffer = io.StringIO()
+        template.write(buffer, {"Title": "Hi", "Content": ParentNode("p", [LeafNode("b", "x")])})
+        self.assertEqual(buffer.getvalue(), "<h1>Hi</h1><p><b>x</b></p>")
+
+    def test_basepath_applied_to_literals_once(self):
+        template = compile_template('<link href="/index.css" /><img src="/a.png" />{{ Content }}', "/site/")
+        self.assertEqual(template.render({"Content": 'href="/x"'}), '<link href="/site/index.css" /><img src="/site/a.png" />href="/x"')
+
+class TestLoadTemplate(TempDirTestCase):
+    def setUp(self):
+        clear_template_cache()
+        super().setUp()
+        self.path = self.write("template.html", "<b>{{ Title }}</b>")
+
+    def tearDown(self):
+        super().tearDown()
+        clear_template_cache()
+
+    def write(self, name, text, mtime_ns=None):
+        path = super().write(os.path.join(self.tmp.name, name), text)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def test_cached_per_path_and_basepath(self):
+        self.assertIs(load_template(self.path, "/"), load_template(self.path, "/"))
+        self.assertIsNot(load_template(self.path, "/"), load_template(self.path, "/site/"))
+
+    def test_extends_and_includes(self):
+        self.write("partials/nav.html", '<nav><a href="/">Home</a></nav>')
+        self.write("base.html", '{% include "partials/nav.html" %}<main>{% block main %}{{ Content }}{% endblock %}</main>'
+                                "<footer>{% block footer %}Default{% endblock %}</footer>")
+        post = self.write("layouts/post.html", '{% extends "../base.html" %}{% block main %}<article>{{ Content }}</article>{% endblock %}')
+        template = load_template(post, "/site/")
+        self.assertEqual(template.render({"Content": "x"}),
+                         '<nav><a href="/site/">Home</a></nav><main><article>x</article></main><footer>Default</footer>')
+        self.assertEqual(len(template.files), 3)
+        self.assertEqual(template.refs, ("/",))
+
+    def test_nested_blocks(self):
+        self.write("base.html", "<head>{% block head %}<title>{% block title %}T{% endblock %}</title>{% endblock %}</head>{{ Content }}")
+        child = self.write("child.html", '{% extends "base.html" %}{% block title %}{{ Title }}{% endblock %}')
+        self.assertEqual(load_template(child).render({"Title": "Hi", "Content": "x"}), "<head><title>Hi</title></head>x")
+        grandchild = self.write("grandchild.html", '{% extends "child.html" %}{% block head %}<meta />{% block title %}G{% endblock %}{% endblock %}')
+        self.assertEqual(load_template(grandchild).render({"Content": "x"}), "<head><meta />G</head>x")
+
+    def test_unbalanced_blocks_are_errors(self):
+        self.write("base.html", "{% block main %}{% block inner %}{% endblock %}")
+        child = self.write("child.html", '{% extends "base.html" %}')
+        with self.assertRaises(ValueError):
+            load_template(child)
+
+    def test_cycles_are_errors(self):
+        self.write("a.html", '{% include "b.html" %}')
+        self.write("b.html", '{% extends "a.html" %}')
+        with self.assertRaises(ValueError):
+            load_template(os.path.join(self.tmp.name, "a.html"))
+
+    def test_recompiled_when_a_file_changes(self):
+        self.write("nav.html", "<nav>One</nav>", 1_000_000_000)
+        path = self.write("page.html", '{% include "nav.html" %}{{ Content }}')
+        first = load_template(path)
+        self.assertIs(load_template(path), first) # same mtimes, no parse
+        self.write("nav.html", "<nav>Two</nav>", 2_000_000_000)
+        self.assertEqual(load_template(path).render({}), "<nav>Two</nav>")
+
+    def test_resolve_template(self):
+        content = os.path.join(self.tmp.name, "content")
+        blog_template = self.write("content/blog/template.html", "<blog>{{ Content }}</blog>")
+        directories = {}
+        page = os.path.join(content, "blog", "tom", "index.md")
+        self.assertEqual(resolve_template(page, content, self.path, None, directories), blog_template)
+        self.assertEqual(resolve_template(os.path.join(content, "index.md"), content, self.path, None, directories), self.path)
+        self.assertEqual(resolve_template(page, content, self.path, "layouts/post.html"), os.path.join(self.tmp.name, "layouts", "post.html"))
+
+class TestTemplateSelection(TempDirTestCase):
+    def setUp(self):
+        clear_template_cache()
+        super().setUp()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.template = self.write("template.html", "<main>{{ Content }}</main>")
+        self.write("footer.html", "<footer>One</footer>")
+        self.write("content/blog/template.html", '<article>{{ Content }}</article>{% include "../../footer.html" %}')
+        self.write("content/index.md", "# Home")
+        self.write("content/blog/tom/index.md", "# Tom")
+        self.write("content/blog/majesty/index.md", "---\ntemplate: plain.html\n---\n# Majesty")
+        self.write("plain.html", "{{ Title }}")
+
+    def tearDown(self):
+        super().tearDown()
+        clear_template_cache()
+
+    def write(self, name, text):
+        return super().write(os.path.join(self.tmp.name, name), text)
+
+    def read(self, *parts):
+        with open(os.path.join(self.dest, *parts), 'r') as file:
+            return file.read()
+
+    def test_directory_and_front_matter_templates(self):
+        manifest = BuildManifest(os.path.join(self.tmp.name, "manifest.json"))
+        generate_pages_recursive("/", self.content, self.template, self.dest, manifest)
+        self.assertEqual(self.read("index.html"), "<main><div><h1>Home</h1></div></main>")
+        self.assertEqual(self.read("blog", "tom", "index.html"), "<article><div><h1>Tom</h1></div></article><footer>One</footer>")
+        self.assertEqual(self.read("blog", "majesty", "index.html"), "Majesty")
+
+        manifest.save()
+        self.write("footer.html", "<footer>Two</footer>") # a partial of the blog template only
+        manifest = BuildManifest.load(os.path.join(self.tmp.name, "manifest.json"))
+        stale = manifest.rebuild_set("/", [(os.path.join(self.content, "index.md"), os.path.join(self.dest, "index.html")),
+                                           (os.path.join(self.content, "blog", "tom", "index.md"), os.path.join(self.dest, "blog", "tom", "index.html"))],
+                                     self.template, {os.path.join(self.content, "blog", "tom", "index.md"): os.path.join(self.content, "blog", "template.html")})
+        self.assertEqual([os.path.basename(os.path.dirname(dest_path)) for _, dest_path, _ in stale], ["tom"])
+
+class TestPageSlots(TempDirTestCase):
+    def setUp(self):
+        clear_template_cache()
+        super().setUp()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.template = os.path.join(self.tmp.name, "template.html")
+        self.write(self.template, '<nav>{{ Nav }}</nav><time>{{ Date }}</time><meta content="{{ Description }}">')
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "contact", "index.md"), "# Contact & Help")
+        self.write(os.path.join(self.content, "blog", "tom", "index.md"), '---\ndate: 2024-05-01\ndescription: Why "Tom" <3\n---\n# Tom')
+
+    def tearDown(self):
+        super().tearDown()
+        clear_template_cache()
+
+    def read(self, *parts):
+        with open(os.path.join(self.dest, *parts), 'r') as file:
+            return file.read()
+
+    def test_date_description_and_nav(self):
+        manifest = BuildManifest(os.path.join(self.tmp.name, "manifest.json"))
+        generate_pages_recursive("/site/", self.content, self.template, self.dest, manifest)
+        nav = '<nav><ul><li><a href="/site/">Home</a></li><li><a href="/site/contact/">Contact &amp; Help</a></li></ul></nav>'
+        self.assertEqual(self.read("blog", "tom", "index.html"), nav + '<time>2024-05-01</time><meta content="Why &quot;Tom&quot; &lt;3">')
+        self.assertEqual(self.read("index.html"), nav + '<time></time><meta content="">')
+
+        manifest.save()
+        self.write(os.path.join(self.content, "contact", "index.md"), "# Contact")
+        manifest = BuildManifest.load(os.path.join(self.tmp.name, "manifest.json"))
+        generate_pages_recursive("/site/", self.content, self.template, self.dest, manifest)
+        self.assertIn('<a href="/site/contact/">Contact</a>', self.read("blog", "tom", "index.html")) # every page shows the new title
+
+    def test_no_nav_slot_no_nav_rebuilds(self):
+        self.write(self.template, "<time>{{ Date }}</time>")
+        manifest = BuildManifest(os.path.join(self.tmp.name, "manifest.json"))
+        generate_pages_recursive("/", self.content, self.template, self.dest, manifest)
+        self.assertEqual(manifest.options, {})
+
+class TestMinifyTemplate(unittest.TestCase):
+    def test_minify_markup(self):
+        markup = "<!doctype html>\n<html>\n  <head>\n    <title>{{ Title }}</title>\n  </head>\n  <body>\n    <p>a  <b>b</b>\n <i>c</i></p>\n    <pre>  keep\n  this</pre>\n  </body>\n</html>\n"
+        self.assertEqual(minify_markup(markup),
+                         "<!doctype html><html><head><title>{{ Title }}</title></head><body><p>a <b>b</b> <i>c</i></p><pre>  keep\n  this</pre></body></html>")
+
+    def test_minified_template_minifies_node_values(self):
+        template = compile_template("<article>\n  {{ Content }}\n</article>\n", "/", minify=True)
+        buffer = io.StringIO()
+        template.write(buffer, {"Content": markdown_to_html_node("two\nlines")})
+        self.assertEqual(buffer.getvalue(), "<article><div><p>two lines</p></div></article>")
+
+class TestRenderContext(unittest.TestCase):
+    def test_resolve_url(self):
+        context = RenderContext("/site/")
+        self.assertEqual(context.resolve_url("/blog/tom"), "/site/blog/tom")
+        self.assertEqual(context.resolve_url("/"), "/site/")
+        self.assertEqual(context.resolve_url("https://boot.dev"), "https://boot.dev")
+
+    def test_urls_rewritten_in_node_tree(self):
+        md = "[Home](/) and ![pic](/images/a.png) and `href=\"/raw\"`"
+        html = markdown_to_html_node(md, RenderContext("/site/")).to_html()
+        self.assertEqual(html, '<div><p><a href="/site/">Home</a> and <img src="/site/images/a.png" alt="pic"></img> and <code>href="/raw"</code></p></div>')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 
-from textnode import TextNode, TextType, text_node_to_html_node, split_nodes_delimiter, extract_markdown_images, extract_markdown_links, split_nodes_image, split_nodes_link, text_to_textnodes
+from textnode import TextNode, TextType, text_node_to_html_node, split_nodes_delimiter, extract_markdown_images, extract_markdown_links, split_nodes_image, split_nodes_link, text_to_textnodes, has_inline_markup, scan_inline
 
 
 class TestTextNode(unittest.TestCase):
@@ -331,5 +331,48 @@ class TestConvertRawToTextNode(unittest.TestCase):
         # Take the error message from the exception that was raised, and make sure it exactly matches this expected message."
         self.assertEqual(str(context.exception), "Invalid Markdown syntax: unmatched delimiter '**' in text 'This is **bold text with unmatched _italic and ![image](missing_parenthesis'")
 
+    def test_text_to_textnodes_underscores_inside_code(self):
+        self.assertListEqual(
+            text_to_textnodes("Call `snake_case_name` here"),
+            [
+                TextNode("Call ", TextType.TEXT),
+                TextNode("snake_case_name", TextType.CODE),
+                TextNode(" here", TextType.TEXT),
+            ],
+        )
+
+    def test_text_to_textnodes_underscores_in_link(self):
+        self.assertListEqual(
+            text_to_textnodes("See [my_page](https://example.com/a_b_c) now"),
+            [
+                TextNode("See ", TextType.TEXT),
+                TextNode("my_page", TextType.LINK, "https://example.com/a_b_c"),
+                TextNode(" now", TextType.TEXT),
+            ],
+        )
+
+    def test_text_to_textnodes_matches_split_pipeline(self):
+        text = "**a** _b_ `c` ![d](e.png)[f](g) plain"
+        pipeline = split_nodes_link(split_nodes_image(split_nodes_delimiter(split_nodes_delimiter(split_nodes_delimiter(
+            [TextNode(text, TextType.TEXT)], "**", TextType.BOLD), "_", TextType.ITALIC), "`", TextType.CODE)))
+        self.assertListEqual(text_to_textnodes(text), pipeline)
+
+    def test_plain_text_prescan(self):
+        self.assertFalse(has_inline_markup("Plain prose, with punctuation! And (parentheses)."))
+        for marker in ("**b**", "_i_", "`c`", "[l](u)", "![i](u)", "a * b"):
+            self.assertTrue(has_inline_markup(marker))
+        text = "Line one\nline two!"
+        self.assertListEqual(text_to_textnodes(text), scan_inline(text.replace("\n", " ")))
+        self.assertListEqual(text_to_textnodes(text), [TextNode("Line one line two!", TextType.TEXT)])
+
+    def test_link_with_bold_text(self):
+        nodes = text_to_textnodes("[**Home**](/)")
+        self.assertListEqual(nodes, [TextNode("**Home**", TextType.LINK, "/")])
+        self.assertEqual(text_node_to_html_node(nodes[0]).to_html(), '<a href="/"><b>Home</b></a>')
+
+    def test_link_with_stray_underscore_text(self):
+        node = TextNode("snake_case", TextType.LINK, "/x")
+        self.assertEqual(text_node_to_html_node(node).to_html(), '<a href="/x">snake_case</a>')
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,5 +1,13 @@
+import re
 from enum import Enum
-from htmlnode import LeafNode
+from htmlnode import LeafNode, ParentNode
+from instrument import timed
+
+# Compiled once at import; re's internal cache is small and still costs a lookup per call
+IMAGE_PATTERN = re.compile(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)")
+LINK_PATTERN = re.compile(r"\[([^\[\]]*)\]\(([^\(\)]*)\)")
+MARKDOWN_LINK_PATTERN = re.compile(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)") # a link not preceded by ! (an image)
+INLINE_TOKEN = re.compile(r"\*\*|[_`]|!\[|\[")
 
 class TextType(Enum):
     TEXT = "text"
@@ -10,6 +18,8 @@ class TextType(Enum):
     IMAGE = "image"
 
 class TextNode():
+    __slots__ = ("text", "text_type", "url") # no per-instance __dict__ for these short-lived nodes
+
     def __init__(self, text, text_type, url=None):
         self.text = text
         self.text_type = text_type
@@ -27,7 +37,7 @@ class TextNode():
     def __repr__(self):
         return f"TextNode({self.text}, {self.text_type.value}, {self.url})"
 
-def text_node_to_html_node(text_node):
+def text_node_to_html_node(text_node, context=None):
     if text_node.text_type == TextType.TEXT:
         return LeafNode(None, text_node.text)
     elif text_node.text_type == TextType.BOLD:
@@ -39,11 +49,22 @@ def text_node_to_html_node(text_node):
     elif text_node.text_type == TextType.LINK:
         if text_node.url is None:
             raise ValueError("LINK type requires a URL.")
-        return LeafNode("a", text_node.text, {"href": text_node.url})
+        url = context.resolve_url(text_node.url) if context else text_node.url
+        if INLINE_TOKEN.search(text_node.text): # anchor text with its own markup, e.g. [**bold**](url)
+            try:
+                children = [text_node_to_html_node(node, context) for node in text_to_textnodes(text_node.text)]
+                return ParentNode("a", children, {"href": url})
+            except ValueError:
+                pass # stray delimiter such as [snake_case](url) stays literal
+        return LeafNode("a", text_node.text, {"href": url})
     elif text_node.text_type == TextType.IMAGE:
         if text_node.url is None:
             raise ValueError("IMAGE type requires a URL.")
-        return LeafNode("img", "", {"src": text_node.url, "alt": text_node.text})
+        if context is None:
+            return LeafNode("img", "", {"src": text_node.url, "alt": text_node.text})
+        props = {"src": context.resolve_url(text_node.url), "alt": text_node.text}
+        props.update(context.image_props(text_node.url))
+        return LeafNode("img", "", props)
     else:
         raise ValueError(f"Unsupported text type: {text_node.text_type}")
     
@@ -71,15 +92,12 @@ def split_nodes_delimiter(old_nodes, delimiter, text_type):
     return new_nodes
 
 # Using Regex to breakdown markdown text into tuples with alt text and url
-import re
 
 def extract_markdown_images(text):
-    pattern = r"!\[([^\[\]]*)\]\(([^\(\)]*)\)"
-    return re.findall(pattern, text)
+    return IMAGE_PATTERN.findall(text)
 
 def extract_markdown_links(text):
-    pattern = r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)"
-    return re.findall(pattern, text)
+    return MARKDOWN_LINK_PATTERN.findall(text)
 
 def split_nodes_image(old_nodes): # Splits raw markdown text into TextNodes based on images
     new_nodes = []
@@ -87,13 +105,12 @@ def split_nodes_image(old_nodes): # Splits raw markdown text into TextNodes base
         if node.text_type != TextType.TEXT:
             new_nodes.append(node)
             continue
-        # Extract images from the text
-        images = extract_markdown_images(node.text)
-        if not images:
+        # split text into parts for image capture groups; a single part means no images
+        text_parts = IMAGE_PATTERN.split(node.text)
+        if len(text_parts) == 1:
             new_nodes.append(node)
             continue
-        else: # split text into parts for image capture groups
-            text_parts = re.split(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)", node.text)
+        else:
             i = 0
             while i < len(text_parts):
                 text_part = text_parts[i]
@@ -113,13 +130,12 @@ def split_nodes_link(old_nodes):
         if node.text_type != TextType.TEXT:
             new_nodes.append(node)
             continue
-        # Extract links from the text
-        links = extract_markdown_links(node.text)
-        if not links:
+        # split text into parts for link capture groups; a single part means no links
+        text_parts = MARKDOWN_LINK_PATTERN.split(node.text)
+        if len(text_parts) == 1:
             new_nodes.append(node)
             continue
-        else: # split text into parts for link capture groups
-            text_parts = re.split(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)", node.text)
+        else:
             i = 0
             while i < len(text_parts):
                 text_part = text_parts[i]
@@ -133,14 +149,65 @@ def split_nodes_link(old_nodes):
                 i += 3
     return new_nodes
 
+# Single-pass inline scanner used by text_to_textnodes
+DELIMITERS = {"**": TextType.BOLD, "_": TextType.ITALIC, "`": TextType.CODE}
+
+def has_inline_markup(text):
+    # Cheap prescan: plain prose (most paragraphs) has none of the marker characters.
+    # Every inline construct contains one of them; "![" for images includes "[".
+    return "[" in text or "_" in text or "`" in text or "*" in text
+
+@timed("text_to_textnodes")
 def text_to_textnodes(text):
+    # Convert a line of inline markdown into TextNodes. Text without any marker character is
+    # a single TEXT node, without running the scanner.
     text = text.replace("\n", " ")
-    text_node = TextNode(text, TextType.TEXT)
-
-    return split_nodes_link(
-        split_nodes_image(
-            split_nodes_delimiter(
-                split_nodes_delimiter(
-                    split_nodes_delimiter([text_node], "**", TextType.BOLD), 
-                "_", TextType.ITALIC), 
-            "`", TextType.CODE)))
+    if not has_inline_markup(text):
+        return [TextNode(text, TextType.TEXT)]
+    return scan_inline(text)
+
+def scan_inline(text):
+    # Convert inline markdown into TextNodes in one left-to-right sweep.
+    # Whatever construct opens first wins, so underscores inside `code` or inside a link URL
+    # no longer get split as italics. Produces the same nodes as chaining split_nodes_delimiter
+    # (**, _, `), split_nodes_image and split_nodes_link on well-formed input.
+    nodes = []
+    segment = [] # text, link and image nodes since the last delimited span
+    start = 0 # start of plain text not yet emitted
+    match = INLINE_TOKEN.search(text)
+    while match:
+        token = match.group()
+        position = match.start()
+        text_type = DELIMITERS.get(token)
+        if text_type is not None:
+            close = text.find(token, position + len(token))
+            if close == -1:
+                raise ValueError(f"Invalid Markdown syntax: unmatched delimiter '{token}' in text '{text}'")
+            segment.append(TextNode(text[start:position], TextType.TEXT))
+            flush_segment(nodes, segment)
+            segment = []
+            nodes.append(TextNode(text[position + len(token):close], text_type))
+            start = next_position = close + len(token)
+        else:
+            if token == "![":
+                found, text_type = IMAGE_PATTERN.match(text, position), TextType.IMAGE
+            else:
+                found, text_type = LINK_PATTERN.match(text, position), TextType.LINK
+            if found:
+                segment.append(TextNode(text[start:position], TextType.TEXT))
+                segment.append(TextNode(found.group(1), text_type, found.group(2)))
+                start = next_position = found.end()
+            else:
+                next_position = position + len(token) # not a link after all, keep it as text
+        match = INLINE_TOKEN.search(text, next_position)
+    segment.append(TextNode(text[start:], TextType.TEXT))
+    flush_segment(nodes, segment)
+    return nodes
+
+def flush_segment(nodes, segment):
+    # Plain text between delimited spans is kept whole, even when empty. When it held links or
+    # images its empty text pieces are dropped, as split_nodes_image/split_nodes_link do.
+    if len(segment) == 1:
+        nodes.append(segment[0])
+    else:
+        nodes.extend(node for node in segment if node.text or node.text_type != TextType.TEXT)